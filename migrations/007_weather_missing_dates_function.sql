@@ -0,0 +1,84 @@
+-- =====================================================
+-- Migración: Detección de fechas faltantes de clima
+-- Fecha: 2026-10-18
+-- Descripción: Función weather_missing_dates() para
+--              calcular en Postgres los pares
+--              (fecha, comuna) sin datos en
+--              "3t_weather_data", paginada por keyset.
+--              La usa WeatherDBService.get_missing_dates
+--              (ml/src/weather_service.py) en vez de
+--              descargar todas las filas del rango.
+-- =====================================================
+
+-- ============================================
+-- PASO 1: Función de fechas faltantes
+-- ============================================
+
+CREATE OR REPLACE FUNCTION weather_missing_dates(
+  p_start_date DATE,
+  p_end_date DATE,
+  p_communes TEXT[],
+  p_after_date DATE DEFAULT NULL,
+  p_after_commune TEXT DEFAULT NULL,
+  p_limit INTEGER DEFAULT 1000
+)
+RETURNS TABLE (date DATE, commune TEXT)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT d::DATE AS date, c.commune
+  FROM generate_series(p_start_date, p_end_date, INTERVAL '1 day') AS d
+  CROSS JOIN unnest(p_communes) AS c(commune)
+  WHERE NOT EXISTS (
+    SELECT 1
+    FROM "3t_weather_data" w
+    WHERE w.date = d::DATE
+      AND w.commune = c.commune
+  )
+  AND (
+    p_after_date IS NULL
+    OR (d::DATE, c.commune) > (p_after_date, p_after_commune)
+  )
+  ORDER BY 1, 2
+  LIMIT p_limit;
+$$;
+
+COMMENT ON FUNCTION weather_missing_dates(DATE, DATE, TEXT[], DATE, TEXT, INTEGER) IS
+  'Pares (fecha, comuna) sin datos en 3t_weather_data. Paginación keyset con p_after_date/p_after_commune';
+
+-- ============================================
+-- PASO 2: Permisos para PostgREST
+-- ============================================
+
+GRANT EXECUTE ON FUNCTION weather_missing_dates(DATE, DATE, TEXT[], DATE, TEXT, INTEGER) TO service_role;
+
+-- ============================================
+-- VERIFICACIÓN
+-- ============================================
+
+DO $$
+BEGIN
+  IF EXISTS (
+    SELECT 1
+    FROM pg_proc
+    WHERE proname = 'weather_missing_dates'
+  ) THEN
+    RAISE NOTICE '✅ Función weather_missing_dates creada correctamente';
+  ELSE
+    RAISE EXCEPTION '❌ ERROR: Función weather_missing_dates no existe';
+  END IF;
+END $$;
+
+-- ============================================
+-- RESUMEN
+-- ============================================
+
+DO $$
+BEGIN
+  RAISE NOTICE '╔════════════════════════════════════════════════════╗';
+  RAISE NOTICE '║  ✅ MIGRACIÓN COMPLETADA EXITOSAMENTE             ║';
+  RAISE NOTICE '╠════════════════════════════════════════════════════╣';
+  RAISE NOTICE '║  🔧 Función creada: weather_missing_dates         ║';
+  RAISE NOTICE '║  📊 Uso: sync_historical_weather.py --incremental ║';
+  RAISE NOTICE '╚════════════════════════════════════════════════════╝';
+END $$;
@@ -8,11 +8,17 @@ FastAPI para servir predicciones de todos los modelos ML.
 
 Endpoints disponibles:
 - POST /predict/churn - Predecir probabilidad de churn
+- POST /predict/churn/all - Scoring de churn en lote (toda la base)
 - POST /predict/demand - Predecir demanda próximos días
+- POST /predict/demand/communes - Demanda por comuna (reconciliada con el total)
 - POST /predict/route-cost - Estimar costo de ruta
+- POST /predict/route-cost/batch - Costo de ruta de todas las paradas del día
+- POST /routes/optimize - Rutas ordenadas por camión (VRP con capacidad)
 - POST /predict/price - Sugerir precio óptimo
 - GET /segments - Obtener segmentación de clientes
 - GET /health - Health check
+- POST /admin/forecast-cache/refresh - Recalcular forecasts en cache
+- POST /admin/models/reload - Recargar modelos en caliente (sin reiniciar)
 
 Autor: Sistema ML Agua Tres Torres
 Fecha: 2025-11-03
@@ -20,21 +26,34 @@ Fecha: 2025-11-03
 
 import os
 import sys
-import pickle
+import json
 import pandas as pd
 import numpy as np
+import threading
 from datetime import datetime, timedelta
 from typing import List, Optional
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
 # Agregar path para imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from src.forecast_cache import ForecastCache
+from src.prophet_forecast import FORECAST_COLUMNS, predict_future
+from src.model_registry import MODEL_SPECS, DEFAULT_WATCH_INTERVAL, ModelRegistry, ModelUnavailableError
+from src.weather_adjustment import (adjustment_factors, aggregate_weather, align_days, commune_order_volumes,
+                                    commune_weights, forecast_array, round_values, weather_columns)
+from src.weather_regressors import RegressorForecastCache, regressor_frame
+from src.commune_forecast import slice_forecast
+from src.route_cost import route_features, score_stops
+from src.route_optimizer import (DEFAULT_TIME_LIMIT_SECONDS, DEFAULT_VEHICLE_CAPACITY, DEPOT_LAT, DEPOT_LON,
+                                 day_orders, plan_routes)
+
 # Importar servicios de clima
 try:
-    from src.weather_service import OpenMeteoClient, WeatherDBService
+    from src.weather_service import OpenMeteoClient, WeatherDBService, WeatherForecastCache, DEFAULT_PREFETCH_INTERVAL
     from src.communes_constants import VALID_COMMUNES, get_commune_coords
     WEATHER_ENABLED = True
 except ImportError:
@@ -43,6 +62,21 @@ except ImportError:
 
 # Configuración
 MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "models")
+DATA_PROCESSED_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "processed")
+
+# Niveles de riesgo de churn por recency: (límite días, nivel, recomendación, días para actuar)
+CHURN_RISK_LEVELS = [
+    (30, "bajo", "Cliente activo. Mantener comunicación regular.", 30),
+    (60, "medio", "Enviar campaña de engagement. Ofrecer promoción.", 7),
+    (90, "alto", "¡URGENTE! Contactar inmediatamente con oferta especial.", 1),
+    (np.inf, "crítico", "¡CRÍTICO! Cliente inactivo. Campaña de reactivación agresiva.", 0),
+]
+
+# Tamaño de bloque al serializar respuestas en streaming (NDJSON)
+STREAM_CHUNK_SIZE = 500
+
+# Token para endpoints /admin (si no se define, quedan abiertos como el resto de la API)
+ADMIN_TOKEN = os.getenv("ML_ADMIN_TOKEN")
 
 # ============================================
 # INICIALIZAR FASTAPI
@@ -69,52 +103,165 @@ app.add_middleware(
 # CARGAR MODELOS AL INICIO
 # ============================================
 
-print("🔄 Cargando modelos ML...")
-MODELS = {}
-
 # Inicializar cliente de clima
 if WEATHER_ENABLED:
     WEATHER_CLIENT = OpenMeteoClient()
+    WEATHER_CACHE = WeatherForecastCache(WEATHER_CLIENT)
     print("✓ Cliente Open-Meteo inicializado")
 else:
     WEATHER_CLIENT = None
+    WEATHER_CACHE = None
 
-try:
-    # XGBoost Churn
-    with open(os.path.join(MODELS_DIR, "xgboost_churn.pkl"), 'rb') as f:
-        MODELS['churn'] = pickle.load(f)
-    print("✓ XGBoost Churn cargado")
-    
-    # Prophet Demanda
-    with open(os.path.join(MODELS_DIR, "prophet_demand.pkl"), 'rb') as f:
-        MODELS['demand'] = pickle.load(f)
-    print("✓ Prophet Demanda cargado")
-    
-    # Prophet Revenue
-    with open(os.path.join(MODELS_DIR, "prophet_revenue.pkl"), 'rb') as f:
-        MODELS['revenue'] = pickle.load(f)
-    print("✓ Prophet Revenue cargado")
-    
-    # Random Forest Rutas
-    with open(os.path.join(MODELS_DIR, "random_forest_routes.pkl"), 'rb') as f:
-        MODELS['routes'] = pickle.load(f)
-    print("✓ Random Forest Rutas cargado")
-    
-    # Ridge Precios
-    with open(os.path.join(MODELS_DIR, "ridge_pricing.pkl"), 'rb') as f:
-        MODELS['pricing'] = pickle.load(f)
-    print("✓ Ridge Precios cargado")
-    
-    # KMeans Segmentación
-    with open(os.path.join(MODELS_DIR, "kmeans_segmentation.pkl"), 'rb') as f:
-        MODELS['segments'] = pickle.load(f)
-    print("✓ KMeans Segmentación cargado")
-    
-    print("✅ Todos los modelos cargados exitosamente\n")
-    
-except Exception as e:
-    print(f"❌ Error cargando modelos: {e}")
-    sys.exit(1)
+# Registro de modelos: carga paralela de los principales, lazy para routes/segments.
+# Un modelo que falla solo deja fuera de servicio su propio endpoint (503).
+print("🔄 Cargando modelos ML...")
+MODELS = ModelRegistry(MODELS_DIR, MODEL_SPECS)
+_load_start = datetime.now()
+_load_status = MODELS.load_eager()
+
+for _name, _status in MODELS.status().items():
+    _icon = {"loaded": "✓", "lazy": "⏳", "failed": "❌"}.get(_status, "•")
+    if _status == "failed" and MODEL_SPECS[_name].optional:
+        _icon, _status = "⚪", "no disponible (opcional)"
+    print(f"{_icon} {MODEL_SPECS[_name].label}: {_status}")
+
+if all(status == "loaded" or MODEL_SPECS[name].optional for name, status in _load_status.items()):
+    print(f"✅ Modelos cargados en {(datetime.now() - _load_start).total_seconds():.2f}s\n")
+else:
+    print("⚠️ API iniciada en modo degradado (ver /health)\n")
+
+def require_model(name: str):
+    """
+    Obtener modelo del registro o responder 503 si no está disponible.
+    
+    Args:
+        name: Nombre del modelo (churn, demand, revenue, routes, pricing, segments)
+    """
+    try:
+        return MODELS[name]
+    except ModelUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+# Cache de forecasts Prophet (se precalcula el horizonte completo una vez)
+FORECAST_CACHE = ForecastCache(horizon_days=90)
+
+def get_future_forecast(name: str, days: int, uncertainty_samples: Optional[int] = None) -> pd.DataFrame:
+    """
+    Forecast de los próximos `days` días para un modelo Prophet.
+    
+    Sin uncertainty_samples se sirve desde el cache; con un valor explícito se
+    predicen solo las fechas futuras con ese muestreo (costo según horizonte).
+    """
+    if uncertainty_samples is None:
+        return FORECAST_CACHE.get(name, require_model(name), days)
+    return predict_future(require_model(name), days, uncertainty_samples)[FORECAST_COLUMNS]
+
+# Forecasts de los modelos Prophet con regressors climáticos (por pronóstico en cache)
+WEATHER_MODEL_CACHE = RegressorForecastCache()
+
+def weather_model_forecast(dates: List[str], weather: dict, days: int,
+                           include_revenue: bool) -> Optional[dict]:
+    """
+    yhat de los modelos Prophet con clima (prophet_*_weather.pkl).
+    
+    Returns:
+        dict 'demand' (y 'revenue' si está cargado) → yhat por día, o None para
+        usar el método de factores (modelo no cargado, clima incompleto o error)
+    """
+    models = {'demand': MODELS.get('demand_weather')}
+    if include_revenue:
+        models['revenue'] = MODELS.get('revenue_weather')
+    models = {name: model for name, model in models.items() if model is not None}
+    if 'demand' not in models:
+        return None
+    try:
+        return WEATHER_MODEL_CACHE.predict_many(models, regressor_frame(dates, weather, days))
+    except Exception as e:
+        print(f"⚠️ Modelo con clima no disponible, se usan factores: {e}")
+        return None
+
+# Pedidos históricos por comuna (ponderación del clima en /predict/demand-weather)
+COMMUNE_VOLUMES = {}
+COMMUNE_VOLUMES_LOCK = threading.Lock()
+
+def get_commune_volumes() -> Optional[dict]:
+    """
+    Pedidos históricos por comuna, leídos una vez de dataset_completo.
+    
+    Returns:
+        dict comuna → pedidos, o None si el dataset no está disponible
+        (el clima se promedia con pesos iguales)
+    """
+    with COMMUNE_VOLUMES_LOCK:
+        if not COMMUNE_VOLUMES:
+            try:
+                COMMUNE_VOLUMES.update(commune_order_volumes(DATA_PROCESSED_DIR))
+            except (FileNotFoundError, KeyError) as e:
+                print(f"⚠️ Sin volúmenes por comuna, clima sin ponderar: {e}")
+                return None
+        return dict(COMMUNE_VOLUMES)
+
+def verify_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """Validar header X-Admin-Token si ML_ADMIN_TOKEN está configurado."""
+    if ADMIN_TOKEN and x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Token de administración inválido")
+
+# Resultado de la última recarga de modelos (visible en /health)
+LAST_MODEL_RELOAD = {}
+
+def on_models_reloaded(results: dict):
+    """Registrar recarga y recalcular forecasts si cambiaron los modelos Prophet."""
+    LAST_MODEL_RELOAD.clear()
+    LAST_MODEL_RELOAD.update({
+        "results": results,
+        "timestamp": datetime.now().isoformat()
+    })
+    if any(results.get(name) == 'reloaded' for name in ('demand_weather', 'revenue_weather')):
+        WEATHER_MODEL_CACHE.clear()
+    prophet_reloaded = [name for name in ('demand', 'revenue') if results.get(name) == 'reloaded']
+    if prophet_reloaded:
+        # Re-entrenamiento: el dataset también cambió
+        with COMMUNE_VOLUMES_LOCK:
+            COMMUNE_VOLUMES.clear()
+        FORECAST_CACHE.refresh({name: MODELS.get(name) for name in prophet_reloaded})
+
+def reload_models(names: Optional[List[str]] = None) -> dict:
+    """Recargar modelos (swap atómico) y refrescar caches dependientes."""
+    results = MODELS.reload(names)
+    on_models_reloaded(results)
+    return results
+
+@app.on_event("startup")
+async def warm_forecast_cache():
+    """Precalcular forecasts en segundo plano para no bloquear el arranque."""
+    threading.Thread(
+        target=FORECAST_CACHE.refresh,
+        args=({name: MODELS.get(name) for name in ('demand', 'revenue')},),
+        daemon=True
+    ).start()
+
+@app.on_event("startup")
+async def start_models_watcher():
+    """Recargar automáticamente los .pkl que cambien en models/ (re-entrenamiento)."""
+    if MODELS.start_watcher(DEFAULT_WATCH_INTERVAL, on_reload=on_models_reloaded):
+        print(f"👀 Watcher de modelos activo (cada {DEFAULT_WATCH_INTERVAL}s)")
+
+@app.on_event("startup")
+async def start_weather_prefetcher():
+    """Mantener en cache el pronóstico de 16 días de todas las comunas."""
+    if WEATHER_CACHE and WEATHER_CACHE.start_prefetcher(VALID_COMMUNES, DEFAULT_PREFETCH_INTERVAL):
+        print(f"🌤️ Prefetch de clima activo ({len(VALID_COMMUNES)} comunas, cada {DEFAULT_PREFETCH_INTERVAL}s)")
+
+@app.on_event("shutdown")
+async def stop_models_watcher():
+    """Detener watcher de modelos."""
+    MODELS.stop_watcher()
+
+@app.on_event("shutdown")
+async def stop_weather_prefetcher():
+    """Detener prefetch de clima."""
+    if WEATHER_CACHE:
+        WEATHER_CACHE.stop_prefetcher()
 
 # ============================================
 # MODELOS PYDANTIC (VALIDACIÓN)
@@ -146,10 +293,27 @@ class ChurnPredictionResponse(BaseModel):
     recommendation: str = Field(..., description="Recomendación de acción")
     days_until_action: int = Field(..., description="Días recomendados para contactar")
 
+class ChurnBatchRequest(BaseModel):
+    """Request para scoring de churn en lote."""
+    customers: Optional[List[ChurnPredictionRequest]] = Field(
+        None, description="Clientes a evaluar (None = toda la tabla RFM)"
+    )
+    threshold: float = Field(0.5, description="Umbral de probabilidad para alto riesgo", ge=0, le=1)
+    only_high_risk: bool = Field(False, description="Devolver solo clientes sobre el umbral")
+    stream: bool = Field(False, description="Responder en streaming (NDJSON)")
+
 class DemandForecastRequest(BaseModel):
     """Request para forecast de demanda."""
     days_ahead: int = Field(30, description="Días a predecir", ge=1, le=90)
     include_revenue: bool = Field(True, description="Incluir predicción de revenue")
+    uncertainty_samples: Optional[int] = Field(
+        None, description="Muestras de incertidumbre (None=cache, 0=sin intervalos)", ge=0, le=1000
+    )
+
+class CommuneDemandRequest(BaseModel):
+    """Request para forecast de demanda por comuna."""
+    days_ahead: int = Field(14, description="Días a predecir", ge=1, le=90)
+    communes: Optional[List[str]] = Field(None, description="Comunas específicas (None=todas)")
 
 class DemandForecastResponse(BaseModel):
     """Response de forecast de demanda."""
@@ -164,6 +328,25 @@ class RouteCostRequest(BaseModel):
     quantity: int = Field(..., description="Cantidad de unidades", ge=1)
     customer_type: str = Field("Hogar", description="Tipo: Hogar o Empresa")
 
+class RouteStop(RouteCostRequest):
+    """Parada de un lote de estimación de rutas."""
+    stop_id: Optional[str] = Field(None, description="Identificador de la parada (ej: order_id)")
+
+class RouteCostBatchRequest(BaseModel):
+    """Request para estimación de costo de ruta en lote."""
+    stops: List[RouteStop] = Field(..., description="Paradas del día", min_length=1, max_length=5000)
+
+class RouteOptimizeRequest(BaseModel):
+    """Request para optimización de rutas del día."""
+    date: Optional[str] = Field(None, description="Fecha de los pedidos (YYYY-MM-DD) si no se envían paradas")
+    stops: Optional[List[RouteStop]] = Field(None, description="Paradas a rutear", max_length=5000)
+    vehicle_capacity: float = Field(DEFAULT_VEHICLE_CAPACITY, description="Unidades por viaje", gt=0)
+    max_vehicles: Optional[int] = Field(None, description="Camiones disponibles (None=uno por viaje)", ge=1)
+    depot_latitude: float = Field(DEPOT_LAT, description="Latitud del depósito")
+    depot_longitude: float = Field(DEPOT_LON, description="Longitud del depósito")
+    improve: bool = Field(True, description="Mejorar con 2-opt / or-opt / relocate")
+    time_limit_seconds: float = Field(DEFAULT_TIME_LIMIT_SECONDS, description="Tiempo máximo de mejora", gt=0, le=60)
+
 class RouteCostResponse(BaseModel):
     """Response de estimación de ruta."""
     estimated_cost: float
@@ -188,12 +371,26 @@ class PriceSuggestionResponse(BaseModel):
     discount_recommended: float
     reasoning: str
 
+class ModelReloadRequest(BaseModel):
+    """Request para recarga de modelos en caliente."""
+    names: Optional[List[str]] = Field(None, description="Modelos a recargar (None=todos los cargados)")
+    wait: bool = Field(False, description="Esperar a que termine la recarga")
+
 # Modelos para endpoints de clima (Open-Meteo)
 class DemandWeatherRequest(BaseModel):
     """Request para predicción con clima."""
     days_ahead: int = Field(14, description="Días a predecir (máx 16)", ge=1, le=16)
     include_revenue: bool = Field(True, description="Incluir revenue")
     communes: Optional[List[str]] = Field(None, description="Comunas específicas (None=promedio)")
+    weight_by_volume: bool = Field(
+        False, description="Ponderar el clima de cada comuna por sus pedidos históricos"
+    )
+    use_weather_model: bool = Field(
+        True, description="Usar Prophet con regressors climáticos si está entrenado (False=factores)"
+    )
+    uncertainty_samples: Optional[int] = Field(
+        None, description="Muestras de incertidumbre (None=cache, 0=sin intervalos)", ge=0, le=1000
+    )
 
 # ============================================
 # ENDPOINTS
@@ -211,8 +408,12 @@ async def root():
             "docs": "/docs",
             "health": "/health",
             "predict_churn": "POST /predict/churn",
+            "predict_churn_all": "POST /predict/churn/all",
             "predict_demand": "POST /predict/demand",
+            "predict_demand_communes": "POST /predict/demand/communes",
             "predict_route_cost": "POST /predict/route-cost",
+            "predict_route_cost_batch": "POST /predict/route-cost/batch",
+            "routes_optimize": "POST /routes/optimize",
             "predict_price": "POST /predict/price",
             "segments": "GET /segments"
         }
@@ -222,11 +423,15 @@ async def root():
 async def health_check():
     """Health check del servicio."""
     return {
-        "status": "healthy",
+        "status": "healthy" if MODELS.is_healthy() else "degraded",
         "timestamp": datetime.now().isoformat(),
-        "models": {
-            name: "loaded" for name in MODELS.keys()
-        }
+        "models": MODELS.status(),
+        "model_details": MODELS.details(),
+        "models_watcher": MODELS.watching,
+        "last_model_reload": LAST_MODEL_RELOAD or None,
+        "forecast_cache": FORECAST_CACHE.status(),
+        "weather_model_cache": WEATHER_MODEL_CACHE.status(),
+        "weather_cache": WEATHER_CACHE.status() if WEATHER_CACHE else None
     }
 
 @app.post("/predict/churn", response_model=ChurnPredictionResponse)
@@ -247,27 +452,14 @@ async def predict_churn(request: ChurnPredictionRequest):
         }])
         
         # Predecir
-        model = MODELS['churn']
+        model = require_model('churn')
         churn_prob = model.predict_proba(X)[0][1]  # Probabilidad clase 1 (churn)
         is_churn = churn_prob > 0.5
         
         # Clasificar riesgo
-        if request.recency_days <= 30:
-            risk_level = "bajo"
-            recommendation = "Cliente activo. Mantener comunicación regular."
-            days_until_action = 30
-        elif request.recency_days <= 60:
-            risk_level = "medio"
-            recommendation = "Enviar campaña de engagement. Ofrecer promoción."
-            days_until_action = 7
-        elif request.recency_days <= 90:
-            risk_level = "alto"
-            recommendation = "¡URGENTE! Contactar inmediatamente con oferta especial."
-            days_until_action = 1
-        else:
-            risk_level = "crítico"
-            recommendation = "¡CRÍTICO! Cliente inactivo. Campaña de reactivación agresiva."
-            days_until_action = 0
+        for limit_days, risk_level, recommendation, days_until_action in CHURN_RISK_LEVELS:
+            if request.recency_days <= limit_days:
+                break
         
         return ChurnPredictionResponse(
             customer_id=request.customer_id,
@@ -278,9 +470,157 @@ async def predict_churn(request: ChurnPredictionRequest):
             days_until_action=days_until_action
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en predicción: {str(e)}")
 
+def load_rfm_table() -> pd.DataFrame:
+    """
+    Cargar tabla RFM procesada (rfm_segments.csv).
+    
+    Returns:
+        DataFrame con customer_id, recency_days, frequency, monetary
+    
+    Raises:
+        HTTPException: Si la tabla RFM no existe
+    """
+    rfm_path = os.path.join(DATA_PROCESSED_DIR, "rfm_segments.csv")
+    if not os.path.exists(rfm_path):
+        raise HTTPException(
+            status_code=404,
+            detail="Tabla RFM no disponible. Ejecutar análisis RFM primero"
+        )
+    
+    rfm = pd.read_csv(
+        rfm_path,
+        usecols=['customer_id', 'recency_days', 'frequency', 'monetary'],
+        dtype={'customer_id': str}
+    )
+    return rfm
+
+def score_churn_batch(customers: pd.DataFrame, threshold: float = 0.5) -> pd.DataFrame:
+    """
+    Scoring vectorizado de churn con una sola llamada a predict_proba.
+    
+    Args:
+        customers: DataFrame con customer_id, recency_days, frequency, monetary
+        threshold: Umbral de probabilidad para marcar alto riesgo
+    
+    Returns:
+        DataFrame con probabilidad, nivel de riesgo y recomendación por cliente,
+        ordenado por probabilidad descendente
+    """
+    features = customers[['recency_days', 'frequency', 'monetary']].fillna(0)
+    churn_prob = require_model('churn').predict_proba(features)[:, 1]
+    
+    # Nivel de riesgo por recency (mismos límites que /predict/churn)
+    limits = np.array([level[0] for level in CHURN_RISK_LEVELS])
+    level_idx = np.searchsorted(limits, features['recency_days'].to_numpy(), side='left')
+    
+    scored = pd.DataFrame({
+        'customer_id': customers['customer_id'].astype(str).to_numpy(),
+        'recency_days': features['recency_days'].astype(int).to_numpy(),
+        'frequency': features['frequency'].astype(int).to_numpy(),
+        'monetary': features['monetary'].astype(float).round(2).to_numpy(),
+        'churn_probability': churn_prob.astype(float).round(4),
+        'is_high_risk': churn_prob > threshold,
+        'risk_level': np.array([level[1] for level in CHURN_RISK_LEVELS])[level_idx],
+        'recommendation': np.array([level[2] for level in CHURN_RISK_LEVELS])[level_idx],
+        'days_until_action': np.array([level[3] for level in CHURN_RISK_LEVELS])[level_idx],
+    })
+    
+    return scored.sort_values('churn_probability', ascending=False, kind='stable')
+
+def summarize_churn_batch(scored: pd.DataFrame, threshold: float) -> dict:
+    """
+    Resumen del scoring en lote (formato consumido por el workflow n8n de alertas).
+    
+    Args:
+        scored: Resultado de score_churn_batch
+        threshold: Umbral utilizado
+    
+    Returns:
+        dict con conteos, valor en riesgo y top de clientes
+    """
+    high_risk = scored[scored['is_high_risk']]
+    top = high_risk.head(10)
+    
+    top_3_lines = [
+        f"• {row.customer_id}: {row.churn_probability * 100:.0f}% ({row.recency_days} días sin comprar)"
+        for row in top.head(3).itertuples()
+    ]
+    table_rows = [
+        f"<tr><td>{row.customer_id}</td><td>{row.churn_probability * 100:.0f}%</td>"
+        f"<td>${row.monetary:,.0f}</td><td>{row.recency_days}</td></tr>"
+        for row in top.itertuples()
+    ]
+    
+    return {
+        "total_customers": int(len(scored)),
+        "high_risk_customers": int(len(high_risk)),
+        "threshold": threshold,
+        "total_value_at_risk": round(float(high_risk['monetary'].sum()), 2),
+        "risk_level_counts": {k: int(v) for k, v in scored['risk_level'].value_counts().items()},
+        "top_3_customers": "\n".join(top_3_lines),
+        "top_customers_table": "\n".join(table_rows),
+    }
+
+def stream_churn_batch(scored: pd.DataFrame, summary: dict):
+    """
+    Generador NDJSON: una línea por cliente y una línea final con el resumen.
+    
+    Args:
+        scored: Resultado de score_churn_batch
+        summary: Resultado de summarize_churn_batch
+    """
+    for start in range(0, len(scored), STREAM_CHUNK_SIZE):
+        chunk = scored.iloc[start:start + STREAM_CHUNK_SIZE]
+        yield chunk.to_json(orient='records', lines=True, force_ascii=False).rstrip("\n") + "\n"
+    yield json.dumps({"summary": summary}, ensure_ascii=False) + "\n"
+
+@app.post("/predict/churn/all")
+async def predict_churn_all(request: ChurnBatchRequest):
+    """
+    Scoring de churn en lote para miles de clientes con una sola llamada al modelo.
+    
+    - **customers**: Lista de clientes (si se omite, se usa la tabla RFM completa)
+    - **threshold**: Umbral de probabilidad para alto riesgo
+    - **only_high_risk**: Filtrar solo clientes sobre el umbral
+    - **stream**: Responder como NDJSON (una línea por cliente + resumen final)
+    """
+    try:
+        if request.customers:
+            customers = pd.DataFrame([c.model_dump() for c in request.customers])
+        else:
+            customers = load_rfm_table()
+        
+        if customers.empty:
+            raise HTTPException(status_code=400, detail="No hay clientes para evaluar")
+        
+        scored = score_churn_batch(customers, request.threshold)
+        summary = summarize_churn_batch(scored, request.threshold)
+        
+        if request.only_high_risk:
+            scored = scored[scored['is_high_risk']]
+        
+        if request.stream:
+            return StreamingResponse(
+                stream_churn_batch(scored, summary),
+                media_type="application/x-ndjson"
+            )
+        
+        return {
+            **summary,
+            "predictions": scored.to_dict(orient='records'),
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en predicción batch: {str(e)}")
+
 @app.post("/predict/demand", response_model=DemandForecastResponse)
 async def predict_demand(request: DemandForecastRequest):
     """
@@ -290,28 +630,26 @@ async def predict_demand(request: DemandForecastRequest):
     - **include_revenue**: Incluir predicción de revenue
     """
     try:
-        # Forecast de pedidos
-        model_demand = MODELS['demand']
-        future = model_demand.make_future_dataframe(periods=request.days_ahead)
-        forecast = model_demand.predict(future)
-        forecast_future = forecast.tail(request.days_ahead)
+        # Forecast de pedidos (slice desde cache)
+        forecast_future = get_future_forecast('demand', request.days_ahead, request.uncertainty_samples)
+        
+        # Forecast de revenue: una sola vez para todo el horizonte
+        forecast_rev = None
+        if request.include_revenue:
+            forecast_rev = get_future_forecast('revenue', request.days_ahead, request.uncertainty_samples)
         
         predictions = []
-        for _, row in forecast_future.iterrows():
+        for i, row in enumerate(forecast_future.itertuples(index=False)):
             pred = {
-                "date": row['ds'].strftime('%Y-%m-%d'),
-                "predicted_orders": max(0, round(row['yhat'])),
-                "lower_bound": max(0, round(row['yhat_lower'])),
-                "upper_bound": max(0, round(row['yhat_upper']))
+                "date": row.ds.strftime('%Y-%m-%d'),
+                "predicted_orders": max(0, round(row.yhat)),
+                "lower_bound": max(0, round(row.yhat_lower)),
+                "upper_bound": max(0, round(row.yhat_upper))
             }
             
             # Agregar revenue si se solicita
-            if request.include_revenue:
-                model_revenue = MODELS['revenue']
-                future_rev = model_revenue.make_future_dataframe(periods=request.days_ahead)
-                forecast_rev = model_revenue.predict(future_rev)
-                forecast_future_rev = forecast_rev.tail(request.days_ahead)
-                rev_row = forecast_future_rev[forecast_future_rev['ds'] == row['ds']].iloc[0]
+            if forecast_rev is not None:
+                rev_row = forecast_rev.iloc[i]
                 pred["predicted_revenue"] = max(0, round(rev_row['yhat']))
                 pred["revenue_lower_bound"] = max(0, round(rev_row['yhat_lower']))
                 pred["revenue_upper_bound"] = max(0, round(rev_row['yhat_upper']))
@@ -340,9 +678,72 @@ async def predict_demand(request: DemandForecastRequest):
             summary=summary
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en forecast: {str(e)}")
 
+@app.post("/predict/demand/communes")
+async def predict_demand_communes(request: CommuneDemandRequest):
+    """
+    Forecast de pedidos por comuna para los próximos N días.
+    
+    Sirve slices del forecast precalculado (models/commune_forecasts.pkl,
+    generado por src/commune_forecast.py): un Prophet por comuna con
+    historial suficiente, reconciliado para que las comunas sumen el
+    forecast global de demanda.
+    
+    - **days_ahead**: Número de días a predecir (1-90)
+    - **communes**: Comunas a incluir (default: todas)
+    """
+    try:
+        forecasts = require_model('communes')
+        try:
+            forecast = slice_forecast(forecasts, request.days_ahead, request.communes)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        dates = forecast.index.strftime('%Y-%m-%d').tolist()
+        values = forecast.to_numpy(dtype=float)
+        methods = forecasts['methods']
+        communes = [
+            {
+                'commune': commune,
+                'method': methods.get(commune),
+                'total_predicted_orders': round(float(values[:, i].sum()), 1),
+                'predictions': [
+                    {'date': date, 'predicted_orders': orders}
+                    for date, orders in zip(dates, np.round(values[:, i], 2).tolist())
+                ],
+            }
+            for i, commune in enumerate(forecast.columns)
+        ]
+        daily_totals = [
+            {'date': date, 'predicted_orders': orders}
+            for date, orders in zip(dates, np.round(values.sum(axis=1), 1).tolist())
+        ]
+        top = max(communes, key=lambda c: c['total_predicted_orders']) if communes else None
+        
+        return {
+            'success': True,
+            'forecast_days': request.days_ahead,
+            'generated_at': forecasts['generated_at'],
+            'communes': communes,
+            'daily_totals': daily_totals,
+            'summary': {
+                'total_predicted_orders': round(float(values.sum()), 1),
+                'communes_count': len(communes),
+                'prophet_communes': sum(1 for c in communes if c['method'] == 'prophet'),
+                'top_commune': top['commune'] if top else None,
+            },
+            'timestamp': datetime.now().isoformat()
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en forecast por comuna: {str(e)}")
+
 @app.post("/predict/route-cost", response_model=RouteCostResponse)
 async def predict_route_cost(request: RouteCostRequest):
     """
@@ -353,49 +754,146 @@ async def predict_route_cost(request: RouteCostRequest):
     - **customer_type**: Hogar o Empresa
     """
     try:
-        # Calcular distancia desde centro (Santiago: -33.45, -70.65)
-        distance_from_center = np.sqrt(
-            (request.latitude + 33.45)**2 + 
-            (request.longitude + 70.65)**2
-        )
+        features = route_features([request.latitude], [request.longitude],
+                                  [request.quantity], [request.customer_type])
+        stop = score_stops(require_model('routes'), features).iloc[0]
         
-        # Preparar features
-        customer_type_encoded = 1 if request.customer_type == "Empresa" else 0
-        X = pd.DataFrame([{
-            'latitude': request.latitude,
-            'longitude': request.longitude,
-            'quantity': request.quantity,
-            'customer_type_encoded': customer_type_encoded,
-            'distance_from_center': distance_from_center
-        }])
+        return RouteCostResponse(
+            estimated_cost=round(float(stop['estimated_cost']), 2),
+            distance_from_center_km=round(float(stop['distance_from_center_km']), 2),
+            delivery_time_estimate_hours=round(float(stop['delivery_time_estimate_hours']), 2),
+            priority_level=stop['priority_level']
+        )
         
-        # Predecir
-        model = MODELS['routes']
-        estimated_cost = float(model.predict(X)[0])
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en estimación de ruta: {str(e)}")
+
+@app.post("/predict/route-cost/batch")
+async def predict_route_cost_batch(request: RouteCostBatchRequest):
+    """
+    Estimar costo de entrega de todas las paradas en una sola llamada.
+    
+    Construye las features de todas las paradas juntas y llama una sola vez
+    a `model.predict` (mismo cálculo que /predict/route-cost por parada).
+    
+    - **stops**: Lista de paradas (latitude, longitude, quantity, customer_type, stop_id opcional)
+    """
+    try:
+        model = require_model('routes')
+        stops = request.stops
+        features = route_features(
+            [s.latitude for s in stops], [s.longitude for s in stops],
+            [s.quantity for s in stops], [s.customer_type for s in stops]
+        )
+        scored = score_stops(model, features)
         
-        # Calcular distancia en km (aproximado)
-        distance_km = distance_from_center * 111  # 1 grado ≈ 111 km
+        results = pd.DataFrame({
+            'stop_id': [s.stop_id for s in stops],
+            'latitude': features['latitude'],
+            'longitude': features['longitude'],
+            'quantity': features['quantity'],
+            'estimated_cost': scored['estimated_cost'].round(2),
+            'distance_from_center_km': scored['distance_from_center_km'].round(2),
+            'delivery_time_estimate_hours': scored['delivery_time_estimate_hours'].round(2),
+            'priority_level': scored['priority_level'],
+        })
         
-        # Estimar tiempo de entrega
-        delivery_time_hours = max(0.5, distance_km / 40)  # 40 km/h promedio
+        return {
+            'success': True,
+            'stops': results.to_dict(orient='records'),
+            'summary': {
+                'total_stops': len(results),
+                'total_quantity': int(results['quantity'].sum()),
+                'total_estimated_cost': round(float(scored['estimated_cost'].sum()), 2),
+                'avg_distance_km': round(float(scored['distance_from_center_km'].mean()), 2),
+                'max_distance_km': round(float(scored['distance_from_center_km'].max()), 2),
+                'priority_counts': {k: int(v) for k, v in scored['priority_level'].value_counts().items()},
+            },
+            'timestamp': datetime.now().isoformat()
+        }
         
-        # Prioridad
-        if distance_km < 10:
-            priority = "alta"
-        elif distance_km < 30:
-            priority = "media"
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en estimación de ruta en lote: {str(e)}")
+
+# def (no async): lectura del día y búsqueda local son CPU/IO bloqueantes y
+# pueden durar hasta time_limit_seconds; FastAPI las corre en su threadpool
+# para no detener el event loop (/health, /predict/*, recarga de modelos).
+@app.post("/routes/optimize")
+def optimize_routes(request: RouteOptimizeRequest):
+    """
+    Planificar las rutas del día: paradas ordenadas por camión y viaje.
+    
+    Rutas iniciales por vecino más cercano con capacidad, mejoradas con
+    2-opt / or-opt / relocate sobre distancias haversine. Si el modelo de
+    rutas está disponible, cada parada incluye su estimated_cost.
+    
+    - **date**: Fecha de los pedidos (usa dataset_completo, coordenadas de 3t_addresses)
+    - **stops**: Paradas explícitas (alternativa a date)
+    - **vehicle_capacity**: Unidades por viaje
+    - **max_vehicles**: Camiones disponibles (los viajes se reparten entre ellos)
+    
+    Cada viaje trae vehicle, trip (orden de ejecución en el camión),
+    start_minutes/end_minutes y sus paradas con arrival_minutes. Los minutos
+    se cuentan desde la salida del camión en la mañana: incluyen sus viajes
+    anteriores y la recarga en el depósito (ROUTE_RELOAD_MINUTES).
+    """
+    if bool(request.stops) == bool(request.date):
+        raise HTTPException(status_code=400, detail="Enviar 'stops' o 'date' (uno de los dos)")
+    
+    try:
+        skipped = 0
+        if request.stops:
+            stops = pd.DataFrame([s.model_dump() for s in request.stops])
         else:
-            priority = "baja"
+            try:
+                stops, skipped = day_orders(pd.Timestamp(request.date).date())
+            except (ValueError, FileNotFoundError) as e:
+                raise HTTPException(status_code=400, detail=f"No se pudieron leer los pedidos de {request.date}: {e}")
+        if stops.empty:
+            raise HTTPException(status_code=400, detail=f"No hay pedidos con coordenadas para {request.date}")
         
-        return RouteCostResponse(
-            estimated_cost=round(estimated_cost, 2),
-            distance_from_center_km=round(distance_km, 2),
-            delivery_time_estimate_hours=round(delivery_time_hours, 2),
-            priority_level=priority
-        )
+        try:
+            plan = plan_routes(
+                stops,
+                depot=(request.depot_latitude, request.depot_longitude),
+                capacity=request.vehicle_capacity,
+                vehicles=request.max_vehicles,
+                improve=request.improve,
+                time_limit=request.time_limit_seconds
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        # Costo estimado por parada (opcional: el plan no depende del modelo)
+        model = MODELS.get('routes')
+        if model is not None:
+            ordered = [stop for route in plan['routes'] for stop in route['stops']]
+            features = route_features(
+                [s['latitude'] for s in ordered], [s['longitude'] for s in ordered],
+                [s['quantity'] for s in ordered], [s.get('customer_type') or "Hogar" for s in ordered]
+            )
+            costs = score_stops(model, features)['estimated_cost'].round(2).tolist()
+            for stop, cost in zip(ordered, costs):
+                stop['estimated_cost'] = cost
+            plan['summary']['total_estimated_cost'] = round(float(sum(costs)), 2)
+        
+        plan['summary']['skipped_without_coordinates'] = skipped
+        return {
+            'success': True,
+            'date': request.date,
+            'routes': plan['routes'],
+            'summary': plan['summary'],
+            'timestamp': datetime.now().isoformat()
+        }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error en estimación de ruta: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error en optimización de rutas: {str(e)}")
 
 @app.post("/predict/price", response_model=PriceSuggestionResponse)
 async def suggest_price(request: PriceSuggestionRequest):
@@ -418,7 +916,7 @@ async def suggest_price(request: PriceSuggestionRequest):
         }])
         
         # Predecir
-        model_data = MODELS['pricing']
+        model_data = require_model('pricing')
         model = model_data['model']
         scaler = model_data['scaler']
         
@@ -454,6 +952,8 @@ async def suggest_price(request: PriceSuggestionRequest):
             reasoning=reasoning
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en sugerencia de precio: {str(e)}")
 
@@ -464,8 +964,7 @@ async def get_segments():
     """
     try:
         # Cargar datos RFM si están disponibles
-        data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "processed")
-        rfm_path = os.path.join(data_dir, "rfm_segments.csv")
+        rfm_path = os.path.join(DATA_PROCESSED_DIR, "rfm_segments.csv")
         
         if os.path.exists(rfm_path):
             rfm = pd.read_csv(rfm_path)
@@ -508,6 +1007,66 @@ async def get_segments():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo segmentos: {str(e)}")
 
+# ============================================
+# ENDPOINTS DE ADMINISTRACIÓN
+# ============================================
+
+@app.post("/admin/forecast-cache/refresh", dependencies=[Depends(verify_admin_token)])
+async def refresh_forecast_cache():
+    """
+    Recalcular los forecasts de demanda y revenue en cache.
+    
+    Útil después de re-entrenar o para forzar un forecast fresco antes del TTL.
+    """
+    try:
+        result = FORECAST_CACHE.refresh({name: MODELS.get(name) for name in ('demand', 'revenue')})
+        return {
+            "success": all(v == "refreshed" for v in result.values()),
+            "models": result,
+            "cache": FORECAST_CACHE.status(),
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error refrescando cache: {str(e)}")
+
+@app.post("/admin/models/reload", dependencies=[Depends(verify_admin_token)])
+async def reload_models_endpoint(request: ModelReloadRequest):
+    """
+    Recargar modelos desde models/ sin reiniciar la API.
+    
+    Los pickles nuevos se cargan en segundo plano y se publican con un swap
+    atómico; los requests en curso terminan con la versión anterior.
+    
+    - **names**: Modelos a recargar (por defecto todos los ya cargados)
+    - **wait**: Esperar el resultado en vez de recargar en background
+    """
+    if request.names:
+        invalid = [name for name in request.names if name not in MODEL_SPECS]
+        if invalid:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Modelos inválidos: {invalid}. Válidos: {list(MODEL_SPECS)}"
+            )
+    
+    try:
+        if request.wait:
+            results = reload_models(request.names)
+            return {
+                "success": all(v == "reloaded" for v in results.values()),
+                "models": results,
+                "timestamp": datetime.now().isoformat()
+            }
+        
+        threading.Thread(target=reload_models, args=(request.names,), daemon=True).start()
+        return {
+            "success": True,
+            "status": "scheduled",
+            "message": "Recarga en segundo plano. Ver /health → last_model_reload",
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error recargando modelos: {str(e)}")
+
 # ============================================
 # ENDPOINTS DE CLIMA (Open-Meteo)
 # ============================================
@@ -518,7 +1077,9 @@ async def predict_demand_weather(request: DemandWeatherRequest):
     Predecir demanda con pronóstico climático.
     
     Integra forecast de Open-Meteo con modelos Prophet para mejorar precisión.
-    Considera temperatura, humedad y precipitación como regressors.
+    Con prophet_*_weather.pkl entrenados (train_models_weather.py) usa
+    temperatura, humedad y precipitación como regressors; si no, ajusta el
+    forecast base con factores climáticos.
     """
     try:
         if not WEATHER_ENABLED or WEATHER_CLIENT is None:
@@ -542,120 +1103,86 @@ async def predict_demand_weather(request: DemandWeatherRequest):
         
         print(f"📊 Predicción clima: {len(communes)} comunas, {request.days_ahead} días")
         
-        # 1. Obtener forecast de clima para cada comuna
+        # 1. Obtener forecast de clima de todas las comunas (cache local,
+        #    las faltantes se piden en una sola llamada)
         weather_forecasts = {}
-        for commune in communes:
-            try:
-                forecast_data = WEATHER_CLIENT.get_forecast_for_commune(commune, request.days_ahead)
-                weather_forecasts[commune] = WEATHER_CLIENT.parse_daily_data(forecast_data, commune)
-            except Exception as e:
-                print(f"⚠️ Error obteniendo forecast de {commune}: {e}")
-                continue
+        try:
+            weather_forecasts = WEATHER_CACHE.get_forecast(communes, request.days_ahead)
+        except Exception as e:
+            print(f"⚠️ Error obteniendo forecast climático: {e}")
         
         if not weather_forecasts:
             raise HTTPException(status_code=500, detail="No se pudo obtener forecast climático")
         
-        # 2. Agregar forecast climático promedio
-        dates = weather_forecasts[list(weather_forecasts.keys())[0]]
-        avg_weather = []
-        
-        for i, date_info in enumerate(dates):
-            temps_max = [weather_forecasts[c][i]['temp_max_c'] for c in weather_forecasts if weather_forecasts[c][i]['temp_max_c']]
-            temps_min = [weather_forecasts[c][i]['temp_min_c'] for c in weather_forecasts if weather_forecasts[c][i]['temp_min_c']]
-            humidity = [weather_forecasts[c][i]['humidity'] for c in weather_forecasts if weather_forecasts[c][i]['humidity']]
-            precip = [weather_forecasts[c][i]['precip_mm'] for c in weather_forecasts if weather_forecasts[c][i]['precip_mm'] is not None]
-            
-            avg_temp_max = np.mean(temps_max) if temps_max else 20
-            avg_temp_min = np.mean(temps_min) if temps_min else 10
-            avg_humidity = int(np.mean(humidity)) if humidity else 50
-            avg_precip = np.mean(precip) if precip else 0
-            
-            avg_weather.append({
-                'date': date_info['date'],
-                'temp_max_c': round(avg_temp_max, 1),
-                'temp_min_c': round(avg_temp_min, 1),
-                'temp_c': round((avg_temp_max + avg_temp_min) / 2, 1),
-                'humidity': avg_humidity,
-                'precip_mm': round(avg_precip, 1),
-                'is_hot_day': bool(avg_temp_max > 28),
-                'is_rainy_day': bool(avg_precip > 5)
-            })
-        
-        # 3. Predicción base con Prophet (sin clima)
-        # NOTA: En producción, usar modelo Prophet entrenado con regressors
-        # Por ahora usamos el modelo existente y ajustamos con factores climáticos
-        
-        model_demand = MODELS.get('demand')
-        if not model_demand:
-            raise HTTPException(status_code=500, detail="Modelo de demanda no cargado")
+        # 2. Clima promedio por día: array comuna × día reducido sobre las comunas
+        #    (ponderado por pedidos históricos de cada comuna si se pide)
+        forecast_communes, weather_dates, weather_values = forecast_array(weather_forecasts)
+        volumes = get_commune_volumes() if request.weight_by_volume else None
+        weather = aggregate_weather(weather_values, commune_weights(forecast_communes, volumes))
         
-        # Crear dataframe para predicción
-        future = model_demand.make_future_dataframe(periods=request.days_ahead)
-        forecast_base = model_demand.predict(future)
+        # 3. Predicción base con Prophet (sin clima), desde cache (solo días futuros)
+        require_model('demand')
+        forecast_base = get_future_forecast('demand', request.days_ahead, request.uncertainty_samples)
+        base_orders = np.maximum(forecast_base['yhat'].to_numpy(dtype=float), 0)
+        day_weather = align_days(weather, len(forecast_base))
+        hot_days = int(day_weather['is_hot_day'].sum())
+        rainy_days = int(day_weather['is_rainy_day'].sum())
         
-        # Tomar solo los días futuros
-        forecast_base = forecast_base.tail(request.days_ahead)
+        # 4. Predicción con clima: modelos con regressors (demanda y revenue sobre
+        #    el mismo frame futuro) o, como fallback, factores climáticos
+        model_forecast = None
+        if request.use_weather_model:
+            model_forecast = weather_model_forecast(
+                weather_dates, weather, len(forecast_base), request.include_revenue
+            )
         
-        # 4. Ajustar predicción según clima
-        predictions = []
-        hot_days = 0
-        rainy_days = 0
+        if model_forecast is not None:
+            method = 'weather_regressors'
+            dates = weather_dates[:len(forecast_base)]
+            orders = np.maximum(model_forecast['demand'], 0)
+            # Base sobre las mismas fechas del clima: el cache empieza el día
+            # siguiente al entrenamiento, que no tiene por qué ser hoy
+            same_days = pd.DataFrame({'ds': pd.to_datetime(dates)})
+            forecast_base = predict_future(require_model('demand'), len(dates),
+                                           uncertainty_samples=0, future=same_days)
+            base_orders = np.maximum(forecast_base['yhat'].to_numpy(dtype=float), 0)
+            # Factor informado = modelo con clima / modelo base
+            orders_factor = np.divide(orders, base_orders, out=np.ones_like(orders), where=base_orders > 0)
+        else:
+            method = 'climate_factors'
+            dates = forecast_base['ds'].dt.strftime('%Y-%m-%d').tolist()
+            orders_factor = adjustment_factors(day_weather)['orders']
+            orders = base_orders * orders_factor
         
-        for i, (idx, row) in enumerate(forecast_base.iterrows()):
-            weather = avg_weather[i] if i < len(avg_weather) else {'temp_c': 20, 'is_hot_day': False, 'is_rainy_day': False}
-            
-            # Factor de ajuste por temperatura (días calurosos = más demanda)
-            temp_factor = 1.0
-            if weather.get('is_hot_day'):
-                temp_factor = 1.15  # +15% en días calurosos
-                hot_days += 1
-            elif weather.get('temp_c', 20) > 25:
-                temp_factor = 1.08  # +8% en días cálidos
-            elif weather.get('temp_c', 20) < 15:
-                temp_factor = 0.95  # -5% en días fríos
-            
-            # Factor de ajuste por lluvia (días lluviosos = menos demanda)
-            rain_factor = 1.0
-            if weather.get('is_rainy_day'):
-                rain_factor = 0.90  # -10% en días lluviosos
-                rainy_days += 1
-            
-            # Predicción ajustada
-            base_pred = max(0, row['yhat'])
-            adjusted_pred = base_pred * temp_factor * rain_factor
-            
-            predictions.append({
-                'date': row['ds'].strftime('%Y-%m-%d'),
-                'predicted_orders': round(adjusted_pred),
-                'predicted_orders_base': round(base_pred),
-                'temp_max_c': weather.get('temp_max_c'),
-                'temp_min_c': weather.get('temp_min_c'),
-                'humidity': weather.get('humidity'),
-                'precip_mm': weather.get('precip_mm'),
-                'is_hot_day': weather.get('is_hot_day', False),
-                'is_rainy_day': weather.get('is_rainy_day', False),
-                'adjustment_factor': round(temp_factor * rain_factor, 2)
-            })
+        columns = {
+            'date': dates,
+            'predicted_orders': np.round(orders).astype(int).tolist(),
+            'predicted_orders_base': np.round(base_orders).astype(int).tolist(),
+            **weather_columns(day_weather),
+            'adjustment_factor': round_values(orders_factor, 2),
+        }
+        predictions = [dict(zip(columns, row)) for row in zip(*columns.values())]
         
         # 5. Revenue (opcional)
         revenue_predictions = []
-        if request.include_revenue and MODELS.get('revenue'):
-            model_revenue = MODELS['revenue']
-            future_rev = model_revenue.make_future_dataframe(periods=request.days_ahead)
-            forecast_rev = model_revenue.predict(future_rev).tail(request.days_ahead)
-            
-            for i, (idx, row) in enumerate(forecast_rev.iterrows()):
-                weather = avg_weather[i] if i < len(avg_weather) else {}
-                temp_factor = 1.15 if weather.get('is_hot_day') else 1.0
-                rain_factor = 0.90 if weather.get('is_rainy_day') else 1.0
-                
-                base_rev = max(0, row['yhat'])
-                adjusted_rev = base_rev * temp_factor * rain_factor
-                
-                revenue_predictions.append({
-                    'date': row['ds'].strftime('%Y-%m-%d'),
-                    'predicted_revenue': round(adjusted_rev, 2)
-                })
+        revenue_method = None
+        if model_forecast is not None and 'revenue' in model_forecast:
+            revenue_method = 'weather_regressors'
+            adjusted_rev = np.maximum(model_forecast['revenue'], 0)
+            revenue_predictions = [
+                {'date': date, 'predicted_revenue': revenue}
+                for date, revenue in zip(dates, round_values(adjusted_rev, 2))
+            ]
+        elif request.include_revenue and MODELS.get('revenue') is not None:
+            revenue_method = 'climate_factors'
+            forecast_rev = get_future_forecast('revenue', request.days_ahead, request.uncertainty_samples)
+            revenue_factor = adjustment_factors(align_days(weather, len(forecast_rev)))['revenue']
+            adjusted_rev = np.maximum(forecast_rev['yhat'].to_numpy(dtype=float), 0) * revenue_factor
+            revenue_predictions = [
+                {'date': date, 'predicted_revenue': revenue}
+                for date, revenue in zip(forecast_rev['ds'].dt.strftime('%Y-%m-%d').tolist(),
+                                         round_values(adjusted_rev, 2))
+            ]
         
         # 6. Resumen
         total_orders = sum(p['predicted_orders'] for p in predictions)
@@ -666,6 +1193,9 @@ async def predict_demand_weather(request: DemandWeatherRequest):
             'success': True,
             'days_ahead': request.days_ahead,
             'communes_analyzed': len(weather_forecasts),
+            'method': method,
+            'revenue_method': revenue_method,
+            'weather_forecast_fetched_at': WEATHER_CACHE.fetched_at(list(weather_forecasts)),
             'predictions': predictions,
             'revenue_predictions': revenue_predictions if revenue_predictions else None,
             'summary': {
@@ -700,9 +1230,8 @@ async def get_current_weather(commune: str):
                 detail=f"Comuna inválida: {commune}. Válidas: {VALID_COMMUNES[:10]}..."
             )
         
-        # Obtener forecast (incluye datos de hoy)
-        forecast_data = WEATHER_CLIENT.get_forecast_for_commune(commune, days=7)
-        forecast_parsed = WEATHER_CLIENT.parse_daily_data(forecast_data, commune)
+        # Obtener forecast desde cache (incluye datos de hoy)
+        forecast_parsed = WEATHER_CACHE.get_forecast([commune], days=7).get(commune, [])
         
         coords = get_commune_coords(commune)
         
@@ -712,6 +1241,7 @@ async def get_current_weather(commune: str):
             'coordinates': coords,
             'current': forecast_parsed[0] if forecast_parsed else None,
             'forecast_7_days': forecast_parsed,
+            'forecast_fetched_at': WEATHER_CACHE.fetched_at([commune]),
             'timestamp': datetime.now().isoformat()
         }
         
@@ -43,6 +43,26 @@ def test_churn_prediction():
     assert response.status_code == 200
     print("✅ PASSED")
 
+def test_churn_batch():
+    """Test scoring de churn en lote"""
+    print("\n" + "="*70)
+    print("🔍 TEST 2b: Churn en Lote (tabla RFM completa)")
+    print("="*70)
+    
+    data = {
+        "threshold": 0.7,
+        "only_high_risk": True
+    }
+    
+    response = requests.post(f"{BASE_URL}/predict/churn/all", json=data)
+    print(f"Status: {response.status_code}")
+    result = response.json()
+    print(f"Clientes evaluados: {result['total_customers']}")
+    print(f"Alto riesgo: {result['high_risk_customers']}")
+    print(f"Valor en riesgo: ${result['total_value_at_risk']:,.0f}")
+    assert response.status_code == 200
+    print("✅ PASSED")
+
 def test_demand_forecast():
     """Test forecast de demanda"""
     print("\n" + "="*70)
@@ -64,6 +84,32 @@ def test_demand_forecast():
     assert response.status_code == 200
     print("✅ PASSED")
 
+def test_demand_communes():
+    """Test forecast de demanda por comuna"""
+    print("\n" + "="*70)
+    print("🔍 TEST 3b: Forecast de Demanda por Comuna")
+    print("="*70)
+    
+    data = {
+        "days_ahead": 7
+    }
+    
+    response = requests.post(f"{BASE_URL}/predict/demand/communes", json=data)
+    print(f"Status: {response.status_code}")
+    assert response.status_code == 200
+    result = response.json()
+    print(f"Comunas: {result['summary']['communes_count']} "
+          f"({result['summary']['prophet_communes']} con Prophet propio)")
+    print(f"Total orders: {result['summary']['total_predicted_orders']}")
+    print(f"Top comuna: {result['summary']['top_commune']}")
+    assert result['forecast_days'] == 7
+    assert len(result['daily_totals']) == 7
+    assert all(len(commune['predictions']) == 7 for commune in result['communes'])
+    # Las comunas suman el total diario (forecast reconciliado)
+    commune_total = sum(commune['total_predicted_orders'] for commune in result['communes'])
+    assert abs(commune_total - result['summary']['total_predicted_orders']) < 1
+    print("✅ PASSED")
+
 def test_route_cost():
     """Test estimación de ruta"""
     print("\n" + "="*70)
@@ -84,6 +130,85 @@ def test_route_cost():
     assert response.status_code == 200
     print("✅ PASSED")
 
+def test_route_cost_batch():
+    """Test estimación de costo de ruta en lote"""
+    print("\n" + "="*70)
+    print("🔍 TEST 4b: Costo de Ruta en Lote (paradas del día)")
+    print("="*70)
+    
+    # Quilicura, Providencia y Puente Alto
+    stops = [
+        {"stop_id": "o1", "latitude": -33.36, "longitude": -70.74, "quantity": 25, "customer_type": "Empresa"},
+        {"stop_id": "o2", "latitude": -33.43, "longitude": -70.61, "quantity": 3, "customer_type": "Hogar"},
+        {"stop_id": "o3", "latitude": -33.61, "longitude": -70.58, "quantity": 6, "customer_type": "Hogar"}
+    ]
+    
+    response = requests.post(f"{BASE_URL}/predict/route-cost/batch", json={"stops": stops})
+    print(f"Status: {response.status_code}")
+    assert response.status_code == 200
+    result = response.json()
+    print(json.dumps(result['summary'], indent=2))
+    assert [stop['stop_id'] for stop in result['stops']] == ["o1", "o2", "o3"]
+    assert result['summary']['total_stops'] == 3
+    assert result['summary']['total_quantity'] == 34
+    
+    # Mismo resultado que el endpoint de una parada
+    single = requests.post(f"{BASE_URL}/predict/route-cost", json={
+        key: value for key, value in stops[0].items() if key != "stop_id"
+    }).json()
+    assert result['stops'][0]['estimated_cost'] == single['estimated_cost']
+    assert result['stops'][0]['priority_level'] == single['priority_level']
+    print("✅ PASSED")
+
+def test_routes_optimize():
+    """Test optimización de rutas del día"""
+    print("\n" + "="*70)
+    print("🔍 TEST 4c: Optimización de Rutas (varios viajes por camión)")
+    print("="*70)
+    
+    # 8 paradas de 10 unidades, capacidad 25 → al menos 4 viajes para 2 camiones
+    coords = [(-33.36, -70.74), (-33.43, -70.61), (-33.61, -70.58), (-33.45, -70.66),
+              (-33.52, -70.76), (-33.40, -70.55), (-33.49, -70.60), (-33.57, -70.70)]
+    stops = [
+        {"stop_id": f"o{i}", "latitude": lat, "longitude": lon, "quantity": 10, "customer_type": "Hogar"}
+        for i, (lat, lon) in enumerate(coords, start=1)
+    ]
+    capacity = 25
+    
+    response = requests.post(f"{BASE_URL}/routes/optimize", json={
+        "stops": stops,
+        "vehicle_capacity": capacity,
+        "max_vehicles": 2
+    })
+    print(f"Status: {response.status_code}")
+    assert response.status_code == 200
+    result = response.json()
+    print(json.dumps(result['summary'], indent=2))
+    routes = result['routes']
+    
+    # Cada parada se visita exactamente una vez
+    visited = [stop['stop_id'] for route in routes for stop in route['stops']]
+    assert sorted(visited) == sorted(stop['stop_id'] for stop in stops)
+    assert result['summary']['stops'] == len(stops)
+    
+    # Ningún viaje supera la capacidad del camión
+    for route in routes:
+        assert route['load'] <= capacity
+        assert route['load'] == 10 * len(route['stops'])
+    assert result['summary']['trips'] == len(routes)
+    assert result['summary']['vehicles_used'] <= 2
+    
+    # Viajes numerados 1..k por camión y ETAs dentro de su viaje
+    for vehicle in {route['vehicle'] for route in routes}:
+        trips = sorted((r for r in routes if r['vehicle'] == vehicle), key=lambda r: r['trip'])
+        assert [r['trip'] for r in trips] == list(range(1, len(trips) + 1))
+        for previous, current in zip(trips, trips[1:]):
+            assert current['start_minutes'] >= previous['end_minutes']
+        for route in trips:
+            for stop in route['stops']:
+                assert route['start_minutes'] <= stop['arrival_minutes'] <= route['end_minutes']
+    print("✅ PASSED")
+
 def test_price_suggestion():
     """Test sugerencia de precio"""
     print("\n" + "="*70)
@@ -128,8 +253,12 @@ if __name__ == "__main__":
     try:
         test_health()
         test_churn_prediction()
+        test_churn_batch()
         test_demand_forecast()
+        test_demand_communes()
         test_route_cost()
+        test_route_cost_batch()
+        test_routes_optimize()
         test_price_suggestion()
         test_segments()
         
@@ -28,6 +28,10 @@ plt.rcParams['font.size'] = 10
 
 # Rutas
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from src.dataset_store import read_dataset, write_dataset
+from src.rfm import calculate_rfm
 DATA_DIR = os.path.join(BASE_DIR, "data", "processed")
 OUTPUT_DIR = os.path.join(BASE_DIR, "reports", "figures")
 os.makedirs(OUTPUT_DIR, exist_ok=True)
@@ -40,10 +44,9 @@ print("\n" + "="*70)
 print(" "*20 + "📊 EDA - AGUA TRES TORRES")
 print("="*70)
 
-dataset_path = os.path.join(DATA_DIR, "dataset_completo.csv")
-print(f"\n📂 Cargando dataset: {dataset_path}")
+print(f"\n📂 Cargando dataset: {os.path.join(DATA_DIR, 'dataset_completo')}")
 
-df = pd.read_csv(dataset_path, parse_dates=['order_date', 'delivered_date', 'payment_date'])
+df = read_dataset('dataset_completo', data_dir=DATA_DIR)
 print(f"✓ Cargados {len(df):,} registros")
 
 # ============================================
@@ -87,19 +90,11 @@ print("\n" + "="*70)
 print("👥 ANÁLISIS RFM (Recency, Frequency, Monetary)")
 print("="*70)
 
-# Calcular RFM por cliente
+# Calcular RFM por cliente (reducciones nativas + recency vectorizada)
 max_date = df['order_date'].max()
-rfm = df.groupby('customer_id').agg({
-    'order_date': lambda x: (max_date - x.max()).days,  # Recency
-    'order_id': 'count',  # Frequency
-    'final_price': 'sum',  # Monetary
-    'customer_name': 'first',
-    'customer_type': 'first'
-}).rename(columns={
-    'order_date': 'recency_days',
-    'order_id': 'frequency',
-    'final_price': 'monetary'
-})
+rfm = calculate_rfm(df, max_date, monetary_name='monetary').join(
+    df.groupby('customer_id')[['customer_name', 'customer_type']].first()
+)
 
 # Segmentación RFM simple
 rfm['rfm_score'] = 0
@@ -159,7 +154,7 @@ print("📦 ANÁLISIS DE PRODUCTOS")
 print("="*70)
 
 # Ventas por producto
-product_sales = df.groupby('product_name').agg({
+product_sales = df.groupby('product_name', observed=True).agg({
     'order_id': 'count',
     'final_price': 'sum',
     'quantity': 'sum'
@@ -179,7 +174,7 @@ print("🗺️ ANÁLISIS GEOGRÁFICO")
 print("="*70)
 
 # Ventas por comuna
-geo_sales = df.groupby('delivery_commune').agg({
+geo_sales = df.groupby('delivery_commune', observed=True).agg({
     'order_id': 'count',
     'final_price': 'sum',
     'customer_id': pd.Series.nunique
@@ -216,7 +211,7 @@ print(f"   • Mínimo:    {df['quantity'].min():.0f} unidades")
 print(f"   • Máximo:    {df['quantity'].max():.0f} unidades")
 
 # Tipo de cliente (Hogar vs Empresa)
-customer_type_analysis = df.groupby('customer_type').agg({
+customer_type_analysis = df.groupby('customer_type', observed=True).agg({
     'order_id': 'count',
     'final_price': ['sum', 'mean'],
     'quantity': 'mean'
@@ -287,7 +282,6 @@ print("\n🚀 SIGUIENTE PASO: Feature Engineering y Entrenamiento de Modelos")
 print("="*70 + "\n")
 
 # Guardar RFM para uso posterior
-rfm_path = os.path.join(DATA_DIR, "rfm_segments.csv")
-rfm.to_csv(rfm_path)
+rfm_path = write_dataset(rfm.reset_index(), 'rfm_segments', csv_copy=True, data_dir=DATA_DIR)
 print(f"💾 Segmentos RFM guardados en: {rfm_path}\n")
 
@@ -26,6 +26,8 @@ warnings.filterwarnings('ignore')
 # Agregar path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from src.dataset_store import dataset_exists, read_dataset
+
 # Configurar estilo de gráficos
 sns.set_style("whitegrid")
 plt.rcParams['figure.figsize'] = (14, 8)
@@ -36,11 +38,7 @@ def load_data():
     print("📂 Cargando datos...")
     
     # Cargar dataset de pedidos
-    dataset_path = "data/processed/dataset_completo.csv"
-    if not os.path.exists(dataset_path):
-        raise FileNotFoundError(f"Dataset no encontrado: {dataset_path}")
-    
-    df_orders = pd.read_csv(dataset_path, parse_dates=['order_date'])
+    df_orders = read_dataset('dataset_completo')
     print(f"  ✓ Pedidos cargados: {len(df_orders):,} registros")
     
     # TODO: Cargar datos de clima desde Supabase
@@ -51,9 +49,8 @@ def load_data():
     print("   Archivo esperado: data/processed/dataset_weather.csv\n")
     
     # Verificar si existe dataset consolidado con clima
-    weather_dataset_path = "data/processed/dataset_weather.csv"
-    if os.path.exists(weather_dataset_path):
-        df = pd.read_csv(weather_dataset_path, parse_dates=['order_date'])
+    if dataset_exists('dataset_weather'):
+        df = read_dataset('dataset_weather')
         print(f"  ✓ Dataset con clima cargado: {len(df):,} registros")
         return df
     else:
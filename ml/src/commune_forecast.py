@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================
+FORECAST DE DEMANDA POR COMUNA (JERÁRQUICO)
+Sistema ML Agua Tres Torres
+============================================
+Pedidos diarios por comuna de despacho para la planificación de rutas:
+
+1. commune_daily_orders: serie diaria por comuna (días sin pedidos = 0)
+2. Un Prophet liviano por comuna de VALID_COMMUNES (sin estacionalidad
+   diaria, menos changepoints, sin muestreo de incertidumbre), entrenados
+   en paralelo con TrainingScheduler (un job por comuna)
+3. Comunas con poco historial: participación histórica del total
+4. reconcile: los forecasts por comuna se escalan día a día para que
+   sumen el forecast global (prophet_demand.pkl) × la participación de
+   las comunas válidas en el historial
+5. El resultado (horizonte completo) se guarda en
+   models/commune_forecasts.pkl y la API sirve slices desde memoria
+
+Uso:
+    python src/commune_forecast.py                 # entrenar y precalcular
+    python src/commune_forecast.py --workers 4 --horizon 90
+"""
+
+import os
+import re
+import sys
+import time
+import pickle
+import logging
+import argparse
+import unicodedata
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from prophet import Prophet
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from src.communes_constants import VALID_COMMUNES
+    from src.model_registry import save_model
+    from src.prophet_forecast import future_dates, predict_future
+    from src.training_scheduler import (DEFAULT_MEMORY_BUDGET_MB, DEFAULT_TRAINING_WORKERS,
+                                        TrainingJob, TrainingScheduler, estimate_memory_mb)
+except ImportError:
+    from communes_constants import VALID_COMMUNES
+    from model_registry import save_model
+    from prophet_forecast import future_dates, predict_future
+    from training_scheduler import (DEFAULT_MEMORY_BUDGET_MB, DEFAULT_TRAINING_WORKERS,
+                                    TrainingJob, TrainingScheduler, estimate_memory_mb)
+
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+COMMUNE_MODELS_SUBDIR = "communes"
+COMMUNE_FORECASTS_FILE = "commune_forecasts.pkl"
+GLOBAL_MODEL_FILE = "prophet_demand.pkl"
+
+# Configuración por variables de entorno
+DEFAULT_HORIZON_DAYS = int(os.getenv("COMMUNE_FORECAST_HORIZON_DAYS", "90"))
+# Días con pedidos necesarios para entrenar un Prophet propio
+MIN_ACTIVE_DAYS = int(os.getenv("COMMUNE_MIN_ACTIVE_DAYS", "60"))
+# Ventana (días) para la participación histórica de cada comuna
+SHARE_WINDOW_DAYS = int(os.getenv("COMMUNE_SHARE_WINDOW_DAYS", "90"))
+
+COMMUNE_COLUMN = 'delivery_commune'
+
+
+def commune_slug(commune: str) -> str:
+    """Nombre de archivo para una comuna ('Ñuñoa' → 'nunoa')."""
+    ascii_name = unicodedata.normalize('NFKD', commune).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', '_', ascii_name.lower()).strip('_')
+
+
+def commune_daily_orders(df: pd.DataFrame, communes: List[str] = VALID_COMMUNES) -> Tuple[pd.DataFrame, float]:
+    """
+    Pedidos diarios por comuna en formato ancho.
+
+    Args:
+        df: Pedidos con order_date, order_id y delivery_commune
+        communes: Comunas a incluir (columnas del resultado)
+
+    Returns:
+        Tupla (DataFrame índice ds × comunas con días sin pedidos en 0,
+        participación de `communes` en los pedidos del historial)
+    """
+    orders = df[['order_date', 'order_id', COMMUNE_COLUMN]].dropna(subset=['order_date'])
+    orders = orders.assign(order_date=pd.to_datetime(orders['order_date']).dt.normalize())
+    in_communes = orders[COMMUNE_COLUMN].isin(communes)
+    total = orders['order_id'].nunique()
+    coverage = orders.loc[in_communes, 'order_id'].nunique() / total if total else 0.0
+
+    daily = (orders[in_communes]
+             .groupby(['order_date', COMMUNE_COLUMN], observed=True)['order_id'].nunique()
+             .unstack(COMMUNE_COLUMN, fill_value=0))
+    if orders.empty:
+        dates = pd.DatetimeIndex([], name='ds')
+    else:
+        dates = pd.date_range(orders['order_date'].min(), orders['order_date'].max(), freq='D', name='ds')
+    daily.columns = daily.columns.astype(str).rename('commune')
+    daily = daily.reindex(index=dates, columns=list(communes), fill_value=0)
+    return daily.astype('int32'), coverage
+
+
+def commune_shares(daily: pd.DataFrame, window_days: int = SHARE_WINDOW_DAYS) -> pd.Series:
+    """
+    Participación de cada comuna en los pedidos de los últimos `window_days` días.
+
+    Si la ventana no tiene pedidos se usa todo el historial; sin pedidos, partes iguales.
+    """
+    for recent in (daily.tail(window_days), daily):
+        totals = recent.sum()
+        if totals.sum() > 0:
+            return totals / totals.sum()
+    return pd.Series(1 / max(len(daily.columns), 1), index=daily.columns)
+
+
+def train_commune_model(commune: str, series: pd.DataFrame, models_dir: str = MODELS_DIR) -> Any:
+    """
+    Entrenar el Prophet liviano de una comuna y guardarlo en models/communes/.
+
+    Función top-level (picklable) para correr en un worker del scheduler.
+
+    Args:
+        commune: Nombre de la comuna
+        series: DataFrame con ds e y (pedidos diarios)
+        models_dir: Directorio de modelos
+
+    Returns:
+        Modelo entrenado
+    """
+    logging.getLogger('cmdstanpy').setLevel(logging.WARNING)
+
+    model = Prophet(
+        yearly_seasonality=len(series) >= 365,
+        weekly_seasonality=True,
+        daily_seasonality=False,
+        n_changepoints=10,
+        changepoint_prior_scale=0.05,
+        uncertainty_samples=0,
+    )
+    model.fit(series)
+
+    path = os.path.join(models_dir, COMMUNE_MODELS_SUBDIR, f"prophet_{commune_slug(commune)}.pkl")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    save_model(model, path)
+    return model
+
+
+def commune_jobs(daily: pd.DataFrame, models_dir: str = MODELS_DIR,
+                 min_active_days: int = MIN_ACTIVE_DAYS) -> List[TrainingJob]:
+    """
+    Un TrainingJob por comuna con historial suficiente.
+
+    Args:
+        daily: Resultado de commune_daily_orders
+        models_dir: Directorio de modelos
+        min_active_days: Días con pedidos mínimos para entrenar
+
+    Returns:
+        Lista de jobs (las comunas más activas primero)
+    """
+    active_days = (daily > 0).sum().sort_values(ascending=False)
+    jobs = []
+    for commune, days in active_days.items():
+        if days < min_active_days:
+            continue
+        series = pd.DataFrame({'ds': daily.index, 'y': daily[commune].to_numpy()})
+        jobs.append(TrainingJob(
+            f"commune:{commune}", train_commune_model, (commune, series, models_dir),
+            memory_mb=estimate_memory_mb(series, base_mb=300), priority=int(days)
+        ))
+    return jobs
+
+
+def load_commune_models(communes: List[str], models_dir: str = MODELS_DIR) -> Dict[str, Any]:
+    """Cargar los modelos por comuna existentes en models/communes/."""
+    models = {}
+    for commune in communes:
+        path = os.path.join(models_dir, COMMUNE_MODELS_SUBDIR, f"prophet_{commune_slug(commune)}.pkl")
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                models[commune] = pickle.load(f)
+    return models
+
+
+def reconcile(raw: pd.DataFrame, total: pd.Series, shares: pd.Series) -> pd.DataFrame:
+    """
+    Escalar los forecasts por comuna para que sumen el total de cada día.
+
+    Un día en que las comunas suman 0 se reparte según `shares`.
+
+    Args:
+        raw: Forecasts por comuna (índice ds × comunas, no negativos)
+        total: Total objetivo por día (mismo índice)
+        shares: Participación por comuna (suma 1)
+
+    Returns:
+        DataFrame reconciliado (misma forma que raw)
+    """
+    values = raw.to_numpy(dtype=float)
+    target = np.maximum(total.to_numpy(dtype=float), 0)[:, None]
+    sums = values.sum(axis=1, keepdims=True)
+    fallback = shares.reindex(raw.columns).fillna(0).to_numpy()[None, :]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        reconciled = np.where(sums > 0, values / sums, fallback) * target
+    return pd.DataFrame(reconciled, index=raw.index, columns=raw.columns)
+
+
+def build_commune_forecasts(daily: pd.DataFrame, coverage: float, global_model: Any,
+                            commune_models: Dict[str, Any],
+                            horizon_days: int = DEFAULT_HORIZON_DAYS) -> Dict[str, Any]:
+    """
+    Precalcular el forecast reconciliado por comuna para todo el horizonte.
+
+    Las fechas son las mismas del forecast global (desde el fin de su
+    entrenamiento), así los totales cuadran con /predict/demand.
+
+    Args:
+        daily: Resultado de commune_daily_orders
+        coverage: Participación de las comunas en el historial
+        global_model: Prophet global de demanda (prophet_demand.pkl)
+        commune_models: comuna → Prophet entrenado
+        horizon_days: Días a precalcular
+
+    Returns:
+        dict con forecast (reconciliado), forecast_raw, total, methods,
+        shares, coverage, horizon_days y generated_at
+    """
+    future = future_dates(global_model, horizon_days)
+    yhat = predict_future(global_model, horizon_days, uncertainty_samples=0, future=future)['yhat']
+    total = pd.Series(np.maximum(yhat.to_numpy(), 0) * coverage,
+                      index=pd.DatetimeIndex(future['ds'], name='ds'))
+
+    shares = commune_shares(daily)
+    raw = pd.DataFrame(index=total.index, columns=daily.columns, dtype=float)
+    methods = {}
+    for commune in daily.columns:
+        model = commune_models.get(commune)
+        if model is not None:
+            yhat = predict_future(model, horizon_days, uncertainty_samples=0, future=future)['yhat']
+            raw[commune] = np.maximum(yhat.to_numpy(), 0)
+            methods[commune] = 'prophet'
+        else:
+            raw[commune] = total.to_numpy() * shares[commune]
+            methods[commune] = 'share'
+
+    return {
+        'forecast': reconcile(raw, total, shares),
+        'forecast_raw': raw,
+        'total': total,
+        'methods': methods,
+        'shares': shares.to_dict(),
+        'coverage': coverage,
+        'horizon_days': horizon_days,
+        'generated_at': datetime.now().isoformat(),
+    }
+
+
+def train_commune_forecasts(df: pd.DataFrame, models_dir: str = MODELS_DIR,
+                            horizon_days: int = DEFAULT_HORIZON_DAYS,
+                            max_workers: int = DEFAULT_TRAINING_WORKERS,
+                            memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB) -> Dict[str, Any]:
+    """
+    Entrenar los modelos por comuna en paralelo y guardar models/commune_forecasts.pkl.
+
+    Requiere el modelo global (models/prophet_demand.pkl) ya entrenado.
+
+    Args:
+        df: Pedidos con order_date, order_id y delivery_commune
+        models_dir: Directorio de modelos
+        horizon_days: Días a precalcular
+        max_workers: Procesos concurrentes
+        memory_budget_mb: Presupuesto de memoria del scheduler
+
+    Returns:
+        dict resumen: status, seconds, prophet (modelos), share (comunas por
+        participación), failed (comunas con error)
+    """
+    start = time.perf_counter()
+    daily, coverage = commune_daily_orders(df)
+    with open(os.path.join(models_dir, GLOBAL_MODEL_FILE), 'rb') as f:
+        global_model = pickle.load(f)
+
+    jobs = commune_jobs(daily, models_dir)
+    logger.info(f"🏘️ Forecast por comuna: {len(jobs)} modelos Prophet, "
+                f"{len(daily.columns) - len(jobs)} comunas por participación")
+    results = TrainingScheduler(max_workers=max_workers, memory_budget_mb=memory_budget_mb).run(jobs)
+    trained = [job.args[0] for job in jobs if results[job.name]['status'] == 'ok']
+    failed = [job.args[0] for job in jobs if results[job.name]['status'] != 'ok']
+
+    forecasts = build_commune_forecasts(daily, coverage, global_model,
+                                        load_commune_models(trained, models_dir), horizon_days)
+    path = os.path.join(models_dir, COMMUNE_FORECASTS_FILE)
+    save_model(forecasts, path)
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"✓ Forecast por comuna guardado: {path} ({elapsed:.1f}s)")
+    return {
+        'status': 'ok' if not failed else 'partial',
+        'seconds': round(elapsed, 2),
+        'peak_rss_mb': max((info.get('peak_rss_mb', 0) for info in results.values()), default=0),
+        'prophet': len(trained),
+        'share': len(daily.columns) - len(trained),
+        'failed': failed,
+    }
+
+
+def slice_forecast(forecasts: Dict[str, Any], days: int,
+                   communes: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Forecast reconciliado de los próximos `days` días.
+
+    Args:
+        forecasts: Contenido de commune_forecasts.pkl
+        days: Días a devolver (<= horizon_days)
+        communes: Comunas (None = todas)
+
+    Returns:
+        DataFrame índice ds × comunas
+
+    Raises:
+        ValueError: Si days excede el horizonte o hay comunas desconocidas
+    """
+    if days > forecasts['horizon_days']:
+        raise ValueError(f"days={days} excede el horizonte precalculado ({forecasts['horizon_days']})")
+    forecast = forecasts['forecast']
+    if communes is None:
+        return forecast.iloc[:days]
+    unknown = [c for c in communes if c not in forecast.columns]
+    if unknown:
+        raise ValueError(f"Comunas sin forecast: {unknown}")
+    return forecast.iloc[:days][communes]
+
+
+if __name__ == "__main__":
+    try:
+        from src.dataset_store import read_dataset
+    except ImportError:
+        from dataset_store import read_dataset
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    parser = argparse.ArgumentParser(description="Forecast de demanda por comuna (reconciliado)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_TRAINING_WORKERS, help="Procesos de entrenamiento")
+    parser.add_argument("--horizon", type=int, default=DEFAULT_HORIZON_DAYS, help="Días a precalcular")
+    args = parser.parse_args()
+
+    print("\n" + "=" * 60)
+    print("🏘️ FORECAST DE DEMANDA POR COMUNA")
+    print("=" * 60)
+    orders = read_dataset('dataset_completo', columns=['order_date', 'order_id', COMMUNE_COLUMN])
+    summary = train_commune_forecasts(orders, horizon_days=args.horizon, max_workers=args.workers)
+    print(f"\n✅ {summary['prophet']} modelos Prophet, {summary['share']} comunas por participación "
+          f"({summary['seconds']}s)")
+    if summary['failed']:
+        print(f"⚠️ Comunas con error: {summary['failed']}")
@@ -6,51 +6,115 @@ Consolidación de Datos - Sistema ML 3T
 ============================================
 Script para combinar los CSVs exportados de Supabase en un dataset unificado.
 
+Modo incremental (--incremental): guarda un high-water mark (updated_at u
+order_date) y en cada corrida extrae de Supabase solo los pedidos desde el
+watermark (since=), procesa solo los pedidos nuevos o modificados,
+recalcula el RFM solo de los clientes afectados y reescribe solo las
+particiones mensuales que cambiaron.
+
+El RFM (recency_days, frequency, monetary_total) NO se guarda por fila en
+dataset_completo: vive por cliente en rfm_customers y read_consolidated()
+lo une al leer con una sola fecha de corte. Así una corrida incremental
+deja el mismo dataset que una consolidación completa (--check lo verifica).
+
 Autor: Sistema ML Agua Tres Torres
 Fecha: 2025-11-03
 """
 
 import os
 import sys
+import json
+import argparse
 import pandas as pd
 import numpy as np
 from datetime import datetime
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from src.dataset_store import (PARTITION_COLUMN, dataset_exists, is_partitioned,
+                                   read_dataset, replace_partitions, write_dataset)
+    from src.supabase_extract import (DEFAULT_TABLE_TIMEOUT, TABLE_SPECS, extract_tables_concurrent,
+                                      get_supabase_client)
+    from src.rfm import aggregate_customers, join_rfm, replace_customers
+    from src.dataset_schema import optimize_dtypes
+except ImportError:
+    from dataset_store import (PARTITION_COLUMN, dataset_exists, is_partitioned,
+                               read_dataset, replace_partitions, write_dataset)
+    from supabase_extract import (DEFAULT_TABLE_TIMEOUT, TABLE_SPECS, extract_tables_concurrent,
+                                  get_supabase_client)
+    from rfm import aggregate_customers, join_rfm, replace_customers
+    from dataset_schema import optimize_dtypes
+
 # Configuración de rutas
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 RAW_DIR = os.path.join(DATA_DIR, "raw")
 PROCESSED_DIR = os.path.join(DATA_DIR, "processed")
+# Extracción incremental (pedidos desde el watermark): no pisa las tablas completas de raw/
+INCREMENTAL_RAW_DIR = os.path.join(RAW_DIR, "incremental")
+
+# Consolidación incremental
+STATE_FILENAME = "consolidation_state.json"
+# 2: RFM fuera de dataset_completo (un estado anterior obliga a consolidación completa)
+STATE_VERSION = 2
+RFM_STATE_DATASET = "rfm_customers"          # agregados RFM por cliente
+RFM_COLUMNS = ['order_id', 'customer_id', 'order_date', 'final_price']
+WATERMARK_COLUMNS = ['updated_at', 'order_date']  # en orden de preferencia
+# Días que se re-procesan hacia atrás cuando el watermark es order_date
+# (captura pedidos modificados días después de creados)
+OVERLAP_DAYS = int(os.getenv("CONSOLIDATION_OVERLAP_DAYS", "3"))
 
 # Crear directorios si no existen
 os.makedirs(RAW_DIR, exist_ok=True)
 os.makedirs(PROCESSED_DIR, exist_ok=True)
 
+# CSVs exportados de Supabase (en el directorio ml/)
+CSV_FILES = {
+    'orders': '3t_orders_rows.csv',
+    'customers': '3t_customers_rows.csv',
+    'addresses': '3t_addresses_rows.csv',
+    'products': '3t_products_rows.csv'
+}
+
+def load_local_table(name):
+    """
+    Cargar una tabla local completa (Parquet de data/raw/ o CSV).
+    
+    Args:
+        name: Nombre de la tabla (orders, customers, addresses, products)
+    
+    Returns:
+        DataFrame o None si no existe
+    """
+    filename = CSV_FILES[name]
+    filepath = os.path.join(BASE_DIR, filename)
+    # Preferir el Parquet tipado de supabase_extract.py (data/raw/3t_<tabla>.parquet)
+    parquet_path = os.path.join(RAW_DIR, TABLE_SPECS[name].filename)
+    if os.path.exists(parquet_path):
+        print(f"\n✓ Cargando {name}: {parquet_path}")
+        df = pd.read_parquet(parquet_path)
+    elif os.path.exists(filepath):
+        print(f"\n✓ Cargando {name}: {filename}")
+        df = pd.read_csv(filepath, low_memory=False)
+    else:
+        print(f"\n✗ ERROR: No se encontró {filename}")
+        return None
+    print(f"  → {len(df):,} registros | {len(df.columns)} columnas")
+    return df
+
 def load_csv_files():
-    """Cargar todos los CSVs exportados de Supabase."""
+    """Cargar las tablas exportadas de Supabase (Parquet de data/raw/ o CSVs)."""
     print("\n" + "="*60)
     print("📊 CARGANDO DATOS DESDE CSVs")
     print("="*60)
     
-    # Buscar CSVs en el directorio ml/
-    csv_files = {
-        'orders': '3t_orders_rows.csv',
-        'customers': '3t_customers_rows.csv',
-        'addresses': '3t_addresses_rows.csv',
-        'products': '3t_products_rows.csv'
-    }
-    
     data = {}
-    for name, filename in csv_files.items():
-        filepath = os.path.join(BASE_DIR, filename)
-        if os.path.exists(filepath):
-            print(f"\n✓ Cargando {name}: {filename}")
-            df = pd.read_csv(filepath, low_memory=False)
-            print(f"  → {len(df):,} registros | {len(df.columns)} columnas")
-            data[name] = df
-        else:
-            print(f"\n✗ ERROR: No se encontró {filename}")
+    for name in CSV_FILES:
+        df = load_local_table(name)
+        if df is None:
             sys.exit(1)
+        data[name] = df
     
     return data
 
@@ -149,8 +213,16 @@ def merge_data(data):
     
     return df
 
-def create_features(df):
-    """Crear features adicionales para ML."""
+def create_features(df, first_order_date=None):
+    """
+    Crear features adicionales para ML (solo las que dependen de cada pedido).
+    
+    El RFM por cliente no se guarda por fila: ver read_consolidated().
+    
+    Args:
+        df: Dataset combinado
+        first_order_date: Fecha base de days_since_first_order (default: mínimo de df)
+    """
     print("\n" + "="*60)
     print("⚙️ CREANDO FEATURES")
     print("="*60)
@@ -165,46 +237,55 @@ def create_features(df):
     
     # Días desde primer pedido (para análisis de churn)
     if 'order_date' in df.columns:
-        df['days_since_first_order'] = (df['order_date'] - df['order_date'].min()).dt.days
+        if first_order_date is None:
+            first_order_date = df['order_date'].min()
+        df['days_since_first_order'] = (df['order_date'] - first_order_date).dt.days
         print("✓ Days since first order calculado")
     
-    # Recency, Frequency, Monetary (RFM) por cliente
-    if 'customer_id' in df.columns and 'order_date' in df.columns:
-        max_date = df['order_date'].max()
-        rfm = df.groupby('customer_id').agg({
-            'order_date': lambda x: (max_date - x.max()).days,  # Recency
-            'order_id': 'count',  # Frequency
-            'final_price': 'sum'  # Monetary
-        }).rename(columns={
-            'order_date': 'recency_days',
-            'order_id': 'frequency',
-            'final_price': 'monetary_total'
-        })
-        
-        df = df.merge(rfm, on='customer_id', how='left', suffixes=('', '_rfm'))
-        print("✓ RFM features agregados")
+    return df
+
+def read_consolidated(columns=None, data_dir=PROCESSED_DIR, **kwargs):
+    """
+    Leer dataset_completo con el RFM de cada cliente (recency_days,
+    frequency, monetary_total).
+    
+    El RFM sale de rfm_customers con una sola fecha de corte (la última
+    compra registrada), igual para consolidaciones completas e incrementales.
     
+    Args:
+        columns: Columnas de dataset_completo a leer (None = todas)
+        data_dir: Directorio de datasets procesados
+        **kwargs: Filtros de read_dataset (start_date, end_date, filters)
+    
+    Returns:
+        DataFrame con una fila por pedido y las columnas RFM
+    """
+    read_columns = None if columns is None else list(dict.fromkeys([*columns, 'customer_id']))
+    df = read_dataset('dataset_completo', columns=read_columns, data_dir=data_dir, **kwargs)
+    if dataset_exists(RFM_STATE_DATASET, data_dir):
+        aggregates = read_dataset(RFM_STATE_DATASET, data_dir=data_dir).set_index('customer_id')
+    else:
+        aggregates = aggregate_customers(read_dataset('dataset_completo', columns=RFM_COLUMNS, data_dir=data_dir))
+    df = join_rfm(df, aggregates)
+    if columns is not None and 'customer_id' not in columns:
+        df = df.drop(columns=['customer_id'])
     return df
 
-def save_dataset(df):
+def save_dataset(df, data_dir=PROCESSED_DIR):
     """Guardar el dataset consolidado."""
     print("\n" + "="*60)
     print("💾 GUARDANDO DATASET CONSOLIDADO")
     print("="*60)
     
-    # Guardar en processed/
-    output_path = os.path.join(PROCESSED_DIR, 'dataset_completo.csv')
-    df.to_csv(output_path, index=False)
-    print(f"\n✓ Guardado en: {output_path}")
+    # Guardar en processed/: Parquet particionado por mes (lo leen todas las etapas)
+    # + copia CSV para lectores externos
+    output_path = write_dataset(df, 'dataset_completo', partition_by='order_date',
+                                csv_copy=True, data_dir=data_dir)
+    csv_path = os.path.join(data_dir, 'dataset_completo.csv')
+    print(f"\n✓ Guardado en Parquet: {output_path}")
     print(f"  → {len(df):,} registros")
     print(f"  → {len(df.columns)} columnas")
-    print(f"  → Tamaño: {os.path.getsize(output_path) / 1024 / 1024:.2f} MB")
-    
-    # Guardar versión Parquet (más eficiente)
-    parquet_path = os.path.join(PROCESSED_DIR, 'dataset_completo.parquet')
-    df.to_parquet(parquet_path, index=False, compression='snappy')
-    print(f"\n✓ Guardado también en Parquet: {parquet_path}")
-    print(f"  → Tamaño: {os.path.getsize(parquet_path) / 1024 / 1024:.2f} MB")
+    print(f"✓ Copia CSV: {csv_path} ({os.path.getsize(csv_path) / 1024 / 1024:.2f} MB)")
     
     return output_path
 
@@ -254,8 +335,318 @@ def print_summary(df):
     
     print("\n" + "="*60)
 
+# ============================================
+# CONSOLIDACIÓN INCREMENTAL
+# ============================================
+
+def load_state(data_dir=PROCESSED_DIR):
+    """Leer el estado de la última consolidación (None si no existe)."""
+    path = os.path.join(data_dir, STATE_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_state(state, data_dir=PROCESSED_DIR):
+    """Guardar el estado de consolidación de forma atómica."""
+    path = os.path.join(data_dir, STATE_FILENAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def watermark_column(orders):
+    """Columna usada como high-water mark: updated_at si existe, si no order_date."""
+    for column in WATERMARK_COLUMNS:
+        if column in orders.columns:
+            return column
+    raise ValueError(f"Orders sin columna de watermark ({', '.join(WATERMARK_COLUMNS)})")
+
+def _watermark_values(orders, column):
+    """Valores de la columna de watermark como datetime (UTC si trae zona horaria)."""
+    return pd.to_datetime(orders[column], errors='coerce', utc=(column == 'updated_at'))
+
+def build_state(orders, df_final, column, previous=None):
+    """
+    Construir el estado tras una consolidación.
+
+    Args:
+        orders: Pedidos crudos procesados en esta corrida
+        df_final: Filas consolidadas de esta corrida
+        column: Columna de watermark
+        previous: Estado anterior (modo incremental)
+    """
+    previous = previous or {}
+    watermark = _watermark_values(orders, column).max()
+    if pd.notna(previous.get('watermark')):
+        watermark = max(watermark, pd.Timestamp(previous['watermark'])) if pd.notna(watermark) \
+            else pd.Timestamp(previous['watermark'])
+    max_order_date = df_final['order_date'].max()
+    if previous.get('max_order_date'):
+        max_order_date = max(max_order_date, pd.Timestamp(previous['max_order_date']))
+    return {
+        'version': STATE_VERSION,
+        'watermark_column': column,
+        'watermark': watermark.isoformat() if pd.notna(watermark) else None,
+        'first_order_date': previous.get('first_order_date') or df_final['order_date'].min().isoformat(),
+        'max_order_date': max_order_date.isoformat(),
+        'last_run': datetime.now().isoformat(),
+        'last_run_mode': 'incremental' if previous else 'full',
+        'last_run_rows': int(len(df_final)),
+    }
+
+def filter_new_orders(orders, state):
+    """
+    Pedidos nuevos o modificados desde el último watermark.
+
+    Con updated_at se toma todo lo modificado desde el watermark; con
+    order_date se re-procesan además OVERLAP_DAYS días hacia atrás.
+    """
+    column = state['watermark_column']
+    if not state.get('watermark'):
+        return orders
+    watermark = pd.Timestamp(state['watermark'])
+    if column == 'order_date':
+        watermark -= pd.Timedelta(days=OVERLAP_DAYS)
+    values = _watermark_values(orders, column)
+    return orders[values >= watermark]
+
+def incremental_since(data_dir=PROCESSED_DIR):
+    """
+    Fecha desde la que extraer pedidos en modo incremental.
+    
+    Es el watermark menos OVERLAP_DAYS, como fecha YYYY-MM-DD (el filtro
+    `since` de supabase_extract es sobre order_date; filter_new_orders
+    vuelve a filtrar con la hora exacta).
+    
+    Returns:
+        str o None si no hay estado vigente o el watermark no es order_date
+        (updated_at no se extrae: se carga la tabla completa)
+    """
+    state = load_state(data_dir)
+    if not state or state.get('version') != STATE_VERSION or not state.get('watermark') \
+            or state['watermark_column'] != 'order_date' or not is_partitioned('dataset_completo', data_dir):
+        return None
+    since = pd.Timestamp(state['watermark']) - pd.Timedelta(days=OVERLAP_DAYS)
+    return since.strftime('%Y-%m-%d')
+
+def extract_new_orders(since, raw_dir=INCREMENTAL_RAW_DIR):
+    """
+    Extraer de Supabase solo los pedidos desde `since` (y las tablas de
+    clientes, direcciones y productos, que no tienen fecha).
+    
+    Se escriben en data/raw/incremental/ para no reemplazar las tablas
+    completas de data/raw/. Una tabla que falla usa su copia local completa
+    (filter_new_orders filtra los pedidos en memoria).
+    
+    Args:
+        since: Fecha mínima de order_date (incremental_since)
+        raw_dir: Directorio de salida
+    
+    Returns:
+        dict tabla → DataFrame, o None si Supabase no está disponible
+    """
+    try:
+        import supabase  # noqa: F401
+    except ImportError:
+        print("\n⚠️ Módulo 'supabase' no instalado: se cargan las tablas locales completas")
+        return None
+    
+    print("\n" + "="*60)
+    print(f"📊 EXTRAYENDO PEDIDOS DESDE {since} (INCREMENTAL)")
+    print("="*60)
+    data, report = extract_tables_concurrent(
+        lambda: get_supabase_client(timeout=DEFAULT_TABLE_TIMEOUT),
+        since=since,
+        raw_dir=raw_dir,
+        fallback=load_local_table
+    )
+    for name, info in report.items():
+        print(f"  {name:<10} {info['status']:<8} {info['rows']:>10,} filas  {info['seconds']:>7.2f}s")
+    missing = [name for name in CSV_FILES if name not in data]
+    if missing:
+        raise RuntimeError(f"Tablas no disponibles (ni Supabase ni local): {', '.join(missing)}")
+    return data
+
+def consolidate_full(data, data_dir=PROCESSED_DIR):
+    """Consolidación completa: reconstruye dataset, RFM por cliente y estado."""
+    data_clean = clean_data(data)
+    df_merged = merge_data(data_clean)
+    customer_rfm = aggregate_customers(df_merged)
+    df_final = create_features(df_merged)
+    df_final, memory = optimize_dtypes(df_final, 'dataset_completo')
+    print(f"\n💾 Memoria: {memory['mb_before'].sum():,.1f} MB → {memory['mb_after'].sum():,.1f} MB "
+          f"(dtypes compactos, src/dataset_schema.py)")
+    
+    output_path = save_dataset(df_final, data_dir)
+    write_dataset(customer_rfm.reset_index(), RFM_STATE_DATASET, data_dir=data_dir)
+    save_state(build_state(data['orders'], df_final, watermark_column(data['orders'])), data_dir)
+    
+    return df_final, output_path
+
+def consolidate_incremental(data, data_dir=PROCESSED_DIR):
+    """
+    Consolidar solo pedidos nuevos o modificados desde el último watermark.
+
+    1. Filtra los pedidos crudos por el high-water mark
+    2. Limpia, combina y crea features solo para esas filas
+    3. Recalcula los agregados RFM (rfm_customers) solo de los clientes
+       afectados, con su historial (4 columnas filtradas por customer_id)
+    4. Reescribe solo las particiones mensuales tocadas (las filas no
+       guardan RFM, así que las demás particiones siguen vigentes)
+
+    Returns:
+        Tupla (filas consolidadas en esta corrida, ruta del dataset), o None si
+        se requiere consolidación completa (sin estado previo, sin Parquet
+        particionado o pedidos anteriores al inicio del histórico)
+    """
+    state = load_state(data_dir)
+    if state is None or not is_partitioned('dataset_completo', data_dir) \
+            or not dataset_exists(RFM_STATE_DATASET, data_dir):
+        print("\n⚠️ Sin estado previo de consolidación: se hará consolidación completa")
+        return None
+    if state.get('version') != STATE_VERSION:
+        print("\n⚠️ Estado de una versión anterior (RFM por fila): se hará consolidación completa")
+        return None
+    if state['watermark_column'] not in data['orders'].columns:
+        print(f"\n⚠️ Orders sin columna {state['watermark_column']}: se hará consolidación completa")
+        return None
+    
+    output_path = os.path.join(data_dir, 'dataset_completo')
+    new_orders = filter_new_orders(data['orders'], state)
+    print(f"\n🔖 Watermark: {state['watermark_column']} >= {state['watermark']}")
+    print(f"   → {len(new_orders):,} pedidos nuevos o modificados (de {len(data['orders']):,})")
+    if new_orders.empty:
+        print("\n✓ Sin cambios desde la última consolidación")
+        return new_orders, output_path
+    
+    data_clean = clean_data({**data, 'orders': new_orders})
+    delta = merge_data(data_clean)
+    
+    first_order_date = pd.Timestamp(state['first_order_date'])
+    if delta['order_date'].min() < first_order_date:
+        print("\n⚠️ Hay pedidos anteriores al inicio del histórico: se hará consolidación completa")
+        return None
+    
+    # Versión anterior de los pedidos modificados: su cliente y su mes también cambian
+    previous = read_dataset(
+        'dataset_completo',
+        columns=['order_id', 'customer_id', PARTITION_COLUMN],
+        filters=[('order_id', 'in', delta['order_id'].dropna().unique().tolist() or [''])],
+        data_dir=data_dir
+    )
+    customers = sorted(set(delta['customer_id'].dropna()) | set(previous['customer_id'].dropna()))
+    months = set(delta['order_date'].dt.strftime('%Y-%m').dropna()) | set(previous[PARTITION_COLUMN])
+    
+    # Historial de los clientes afectados (solo columnas necesarias para RFM)
+    history = read_dataset('dataset_completo', columns=RFM_COLUMNS,
+                           filters=[('customer_id', 'in', customers or [''])], data_dir=data_dir)
+    history = history[~history['order_id'].isin(delta['order_id'])]
+    
+    # Agregados RFM por cliente: solo se recalculan los clientes afectados (con su historial completo)
+    rfm_state = read_dataset(RFM_STATE_DATASET, data_dir=data_dir).set_index('customer_id')
+    rfm_state = replace_customers(rfm_state, pd.concat([history, delta[RFM_COLUMNS]], ignore_index=True),
+                                  customers=customers)
+    print(f"\n👥 RFM recalculado para {len(customers):,} clientes afectados")
+    
+    delta_final = create_features(delta, first_order_date=first_order_date)
+    
+    # Particiones tocadas: filas existentes (menos las reemplazadas) + filas nuevas
+    existing = read_dataset('dataset_completo', filters=[(PARTITION_COLUMN, 'in', sorted(months))],
+                            data_dir=data_dir)
+    existing = existing[~existing['order_id'].isin(delta['order_id'])]
+    partition_df = pd.concat([existing, delta_final[existing.columns.intersection(delta_final.columns)]],
+                             ignore_index=True)
+    
+    print("\n" + "="*60)
+    print("💾 ACTUALIZANDO DATASET CONSOLIDADO (INCREMENTAL)")
+    print("="*60)
+    replaced = replace_partitions(partition_df, 'dataset_completo', partition_by='order_date',
+                                  partitions=months, data_dir=data_dir)
+    print(f"\n✓ Particiones reescritas: {', '.join(replaced)}")
+    print(f"  → {len(delta_final):,} filas nuevas o modificadas")
+    
+    # Agregados RFM por cliente (solo cambiaron las filas de clientes afectados)
+    write_dataset(rfm_state.reset_index(), RFM_STATE_DATASET, data_dir=data_dir)
+    
+    save_state(build_state(new_orders, delta_final, state['watermark_column'], previous=state), data_dir)
+    print("⚠️ La copia CSV (dataset_completo.csv) se actualiza solo en consolidaciones completas")
+    
+    return delta_final, output_path
+
+def consolidate(data, incremental=False, data_dir=PROCESSED_DIR, load_full=None):
+    """
+    Consolidar datos en modo completo o incremental.
+
+    Args:
+        data: Tablas crudas (orders, customers, addresses, products)
+        incremental: Procesar solo pedidos nuevos/modificados (fallback a completo)
+        data_dir: Directorio de datasets procesados
+        load_full: Función que carga las tablas completas si el modo
+            incremental cae a completo y `data` trae solo pedidos recientes
+            (extract_new_orders)
+
+    Returns:
+        Tupla (filas consolidadas en esta corrida, ruta del dataset, modo)
+    """
+    if incremental:
+        result = consolidate_incremental(data, data_dir)
+        if result is not None:
+            return result[0], result[1], 'incremental'
+        if load_full is not None:
+            data = load_full()
+    df_final, output_path = consolidate_full(data, data_dir)
+    return df_final, output_path, 'full'
+
+def check_incremental(data, data_dir=PROCESSED_DIR):
+    """
+    Verificar que el dataset actual sea igual a una consolidación completa de `data`.
+    
+    Consolida `data` completo en un directorio temporal y compara ambos
+    datasets con su RFM (read_consolidated), fila por fila según order_id.
+    
+    Args:
+        data: Tablas crudas con el historial completo (las mismas de la corrida)
+        data_dir: Directorio del dataset a verificar
+    
+    Returns:
+        list: Diferencias encontradas (vacía si coinciden)
+    """
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        consolidate_full(data, tmp_dir)
+        expected = read_consolidated(data_dir=tmp_dir)
+    actual = read_consolidated(data_dir=data_dir)
+    
+    differences = []
+    if len(actual) != len(expected):
+        differences.append(f"filas: {len(actual):,} vs {len(expected):,} (completa)")
+    if set(actual.columns) != set(expected.columns):
+        differences.append(f"columnas distintas: {sorted(set(actual.columns) ^ set(expected.columns))}")
+    if differences:
+        return differences
+    
+    actual = actual.sort_values('order_id', ignore_index=True)
+    expected = expected.sort_values('order_id', ignore_index=True)
+    for column in expected.columns:
+        try:
+            pd.testing.assert_series_equal(actual[column], expected[column], check_dtype=False,
+                                           check_categorical=False, check_names=False)
+        except AssertionError:
+            mismatched = (actual[column].astype(object) != expected[column].astype(object)) \
+                & ~(actual[column].isna() & expected[column].isna())
+            differences.append(f"{column}: {int(mismatched.sum()):,} filas distintas")
+    return differences
+
 def main():
     """Función principal."""
+    parser = argparse.ArgumentParser(description='Consolidar CSVs de Supabase en dataset_completo')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Procesar solo pedidos nuevos o modificados desde la última corrida')
+    parser.add_argument('--check', action='store_true',
+                        help='Comparar el resultado con una consolidación completa de los mismos datos')
+    args = parser.parse_args()
+    
     print("\n")
     print("╔" + "="*58 + "╗")
     print("║" + " "*18 + "CONSOLIDACIÓN DE DATOS" + " "*18 + "║")
@@ -263,27 +654,35 @@ def main():
     print("╚" + "="*58 + "╝")
     
     try:
-        # 1. Cargar CSVs
-        data = load_csv_files()
+        # 1. Cargar datos: en modo incremental solo los pedidos desde el watermark
+        #    (--check necesita el historial completo para comparar)
+        data = None
+        since = incremental_since() if args.incremental and not args.check else None
+        if since:
+            data = extract_new_orders(since)
+        load_full = load_csv_files if data is not None else None
+        if data is None:
+            data = load_csv_files()
         
-        # 2. Limpiar datos
-        data_clean = clean_data(data)
-        
-        # 3. Combinar tablas
-        df_merged = merge_data(data_clean)
-        
-        # 4. Crear features
-        df_final = create_features(df_merged)
-        
-        # 5. Guardar
-        output_path = save_dataset(df_final)
+        # 2-5. Limpiar, combinar, crear features y guardar
+        df_final, output_path, mode = consolidate(data, incremental=args.incremental, load_full=load_full)
         
         # 6. Resumen
-        print_summary(df_final)
+        if mode == 'full':
+            print_summary(df_final)
         
-        print("\n✅ PROCESO COMPLETADO EXITOSAMENTE")
+        print(f"\n✅ PROCESO COMPLETADO EXITOSAMENTE ({'incremental' if mode == 'incremental' else 'completo'})")
         print(f"📁 Dataset disponible en: {output_path}")
         
+        if args.check:
+            differences = check_incremental(data)
+            if differences:
+                print("\n❌ El dataset difiere de una consolidación completa:")
+                for difference in differences:
+                    print(f"   • {difference}")
+                return 1
+            print("\n✅ Dataset idéntico a una consolidación completa")
+        
         return 0
         
     except Exception as e:
@@ -294,4 +693,3 @@ def main():
 
 if __name__ == "__main__":
     sys.exit(main())
-
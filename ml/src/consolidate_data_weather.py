@@ -8,12 +8,19 @@ Sistema ML Agua Tres Torres
 Merge de dataset_completo.csv con datos climáticos de Supabase
 para crear dataset_weather.csv enriquecido con features climáticos.
 
+Las features rolling se calculan en una pasada para todas las comunas
+(src/weather_features.py). Con --incremental se reutiliza el clima ya
+procesado (weather_features) y solo se descargan y calculan las fechas
+nuevas.
+
 Uso:
     python src/consolidate_data_weather.py
+    python src/consolidate_data_weather.py --incremental
 """
 
 import os
 import sys
+import argparse
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
@@ -22,6 +29,16 @@ from tqdm import tqdm
 # Agregar path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from src.weather_service import WeatherDBService
+from src.dataset_store import dataset_exists, read_dataset, write_dataset
+from src.dataset_schema import optimize_dtypes
+from src.weather_features import append_rolling_features, compute_rolling_features, rolling_state
+
+# Días de clima previos al primer pedido (ventanas rolling de hasta 14 días)
+ROLLING_LOOKBACK_DAYS = 14
+# Clima por comuna/fecha con features rolling (estado del modo incremental)
+WEATHER_FEATURES_DATASET = "weather_features"
+
 try:
     from supabase import create_client, Client
     SUPABASE_URL = os.getenv("SUPABASE_URL", "http://supabase-kong:8000")
@@ -36,11 +53,7 @@ def load_orders_data():
     """Cargar dataset de pedidos."""
     print("\n📂 Cargando dataset de pedidos...")
     
-    dataset_path = "data/processed/dataset_completo.csv"
-    if not os.path.exists(dataset_path):
-        raise FileNotFoundError(f"Dataset no encontrado: {dataset_path}")
-    
-    df = pd.read_csv(dataset_path, parse_dates=['order_date'])
+    df = read_dataset('dataset_completo')
     print(f"  ✓ Pedidos cargados: {len(df):,} registros")
     print(f"  Rango de fechas: {df['order_date'].min()} → {df['order_date'].max()}")
     print(f"  Comunas únicas: {df['delivery_commune'].nunique()}")
@@ -48,26 +61,31 @@ def load_orders_data():
     return df
 
 
-def load_weather_data():
-    """Cargar datos climáticos desde Supabase."""
+def load_weather_data(start_date, end_date):
+    """
+    Cargar datos climáticos desde Supabase para el rango de los pedidos.
+    
+    Lectura paginada (keyset) y tipada: solo las columnas que usa la
+    consolidación, sin el límite de filas por respuesta de PostgREST.
+    """
     print("\n🌤️  Cargando datos climáticos desde Supabase...")
     
     try:
         supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        db_service = WeatherDBService(supabase)
         
-        # Obtener todos los datos climáticos
-        response = supabase.table("3t_weather_data")\
-            .select("*")\
-            .order("date", desc=False)\
-            .execute()
+        chunks = list(tqdm(
+            db_service.iter_weather_range(start_date, end_date),
+            desc="Páginas clima",
+            unit="pág"
+        ))
         
-        if not response.data:
+        if not chunks:
             print("  ⚠️ No hay datos climáticos en Supabase.")
             print("  💡 Ejecutar primero: python src/sync_historical_weather.py --days 365")
             return None
         
-        df_weather = pd.DataFrame(response.data)
-        df_weather['date'] = pd.to_datetime(df_weather['date'])
+        df_weather = pd.concat(chunks, ignore_index=True)
         
         print(f"  ✓ Datos climáticos cargados: {len(df_weather):,} registros")
         print(f"  Rango de fechas: {df_weather['date'].min()} → {df_weather['date'].max()}")
@@ -133,34 +151,53 @@ def create_derived_features(df):
 
 
 def create_rolling_features(df, weather_df):
-    """Crear features de ventana temporal (rolling)."""
+    """Crear features de ventana temporal (rolling) para todas las comunas en una pasada."""
     print("\n📊 Creando features de ventana temporal...")
     
-    # Ordenar por comuna y fecha
-    weather_df = weather_df.sort_values(['commune', 'date'])
+    df_rolling = compute_rolling_features(weather_df)
     
-    # Features de ventana por comuna
-    rolling_features = []
+    print(f"  ✓ Features rolling creados para {df_rolling['commune'].nunique()} comunas")
     
-    for commune in tqdm(weather_df['commune'].unique(), desc="Comunas"):
-        df_commune = weather_df[weather_df['commune'] == commune].copy()
-        
-        # Rolling windows de 3, 7 y 14 días
-        for window in [3, 7, 14]:
-            df_commune[f'temp_max_{window}d_avg'] = df_commune['temp_max_c'].rolling(window=window, min_periods=1).mean()
-            df_commune[f'humidity_{window}d_avg'] = df_commune['humidity'].rolling(window=window, min_periods=1).mean()
-            df_commune[f'precip_{window}d_sum'] = df_commune['precip_mm'].rolling(window=window, min_periods=1).sum()
-        
-        # Diferencia con día anterior
-        df_commune['temp_diff'] = df_commune['temp_max_c'].diff()
-        
-        rolling_features.append(df_commune)
+    return df_rolling
+
+
+def update_rolling_features(df_orders):
+    """
+    Modo incremental: features rolling solo para las fechas de clima nuevas.
+    
+    Usa el dataset weather_features de la corrida anterior como estado
+    (últimos 14 días por comuna) y descarga de Supabase solo las fechas
+    posteriores a su última fecha.
+    
+    Returns:
+        DataFrame de clima con features (histórico + fechas nuevas), o None
+        si no hay estado previo o no se pudo cargar el clima
+    """
+    if not dataset_exists(WEATHER_FEATURES_DATASET):
+        print("\n⚠️ Sin weather_features previo: se calcularán todas las fechas")
+        return None
     
-    df_rolling = pd.concat(rolling_features, ignore_index=True)
+    previous = read_dataset(WEATHER_FEATURES_DATASET)
+    last_date = previous['date'].max()
+    end_date = df_orders['order_date'].max()
+    print(f"\n🔖 Clima procesado hasta {last_date.date()}")
     
-    print(f"  ✓ Features rolling creados para {len(weather_df['commune'].unique())} comunas")
+    if last_date >= end_date:
+        print("  ✓ Sin fechas nuevas de clima")
+        return previous
     
-    return df_rolling
+    df_new = load_weather_data(
+        (last_date + timedelta(days=1)).strftime('%Y-%m-%d'),
+        end_date.strftime('%Y-%m-%d')
+    )
+    if df_new is None:
+        return previous
+    
+    print("\n📊 Creando features de ventana temporal (fechas nuevas)...")
+    new_features = append_rolling_features(rolling_state(previous), df_new)
+    print(f"  ✓ {len(new_features):,} filas nuevas de clima")
+    
+    return pd.concat([previous, new_features], ignore_index=True)
 
 
 def merge_orders_weather(df_orders, df_weather):
@@ -202,15 +239,11 @@ def merge_orders_weather(df_orders, df_weather):
     return df_merged
 
 
-def save_consolidated_dataset(df, output_path="data/processed/dataset_weather.csv"):
-    """Guardar dataset consolidado."""
+def save_consolidated_dataset(df, name="dataset_weather"):
+    """Guardar dataset consolidado (Parquet + copia CSV)."""
     print(f"\n💾 Guardando dataset consolidado...")
     
-    # Crear directorio si no existe
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    
-    # Guardar
-    df.to_csv(output_path, index=False)
+    output_path = write_dataset(df, name, csv_copy=True)
     
     print(f"  ✓ Guardado: {output_path}")
     print(f"  Tamaño: {os.path.getsize(output_path) / 1024 / 1024:.2f} MB")
@@ -257,8 +290,13 @@ def generate_summary_stats(df):
     print("\n" + "="*70)
 
 
-def main():
-    """Main entry point."""
+def main(incremental=False):
+    """
+    Main entry point.
+    
+    Args:
+        incremental: Calcular features rolling solo para fechas de clima nuevas
+    """
     print("\n" + "="*70)
     print(" "*10 + "🔄 CONSOLIDACIÓN DE DATOS: PEDIDOS + CLIMA")
     print(" "*10 + "Sistema ML Agua Tres Torres")
@@ -268,22 +306,33 @@ def main():
         # 1. Cargar pedidos
         df_orders = load_orders_data()
         
-        # 2. Cargar clima
-        df_weather = load_weather_data()
+        # 2-3. Clima + features rolling (incremental: solo fechas nuevas)
+        df_weather_enriched = update_rolling_features(df_orders) if incremental else None
         
-        if df_weather is None:
-            print("\n❌ No se pueden consolidar datos sin información climática")
-            print("💡 Ejecutar primero: python src/sync_historical_weather.py --days 365")
-            sys.exit(1)
+        if df_weather_enriched is None:
+            # Rango de pedidos + días previos para rolling
+            weather_start = df_orders['order_date'].min() - timedelta(days=ROLLING_LOOKBACK_DAYS)
+            df_weather = load_weather_data(
+                weather_start.strftime('%Y-%m-%d'),
+                df_orders['order_date'].max().strftime('%Y-%m-%d')
+            )
+            
+            if df_weather is None:
+                print("\n❌ No se pueden consolidar datos sin información climática")
+                print("💡 Ejecutar primero: python src/sync_historical_weather.py --days 365")
+                sys.exit(1)
+            
+            df_weather_enriched = create_rolling_features(df_orders, df_weather)
         
-        # 3. Crear features rolling
-        df_weather_enriched = create_rolling_features(df_orders, df_weather)
+        write_dataset(df_weather_enriched, WEATHER_FEATURES_DATASET)
         
         # 4. Merge
         df_merged = merge_orders_weather(df_orders, df_weather_enriched)
         
         # 5. Crear features derivados
         df_final = create_derived_features(df_merged)
+        df_final, memory = optimize_dtypes(df_final, 'dataset_weather')
+        print(f"\n💾 Memoria: {memory['mb_before'].sum():,.1f} MB → {memory['mb_after'].sum():,.1f} MB")
         
         # 6. Guardar
         output_path = save_consolidated_dataset(df_final)
@@ -311,5 +360,9 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Consolidación de pedidos + clima")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Features rolling solo para fechas de clima nuevas")
+    args = parser.parse_args()
+    main(incremental=args.incremental)
 
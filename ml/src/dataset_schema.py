@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================
+SCHEMA DE DTYPES DE LOS DATASETS
+Sistema ML Agua Tres Torres
+============================================
+Tipos compactos por columna para dataset_completo, dataset_weather,
+weather_features y RFM (el contenedor de re-entrenamiento tiene RAM
+limitada):
+
+- category: textos de baja cardinalidad (tipo de cliente, comuna, producto…)
+- string respaldado por Arrow: ids, nombres, emails, teléfonos
+- enteros reducidos (int8/int16/int32) y nullable (Int16/boolean) donde
+  la columna puede traer nulos
+- float32 para clima y sus features rolling
+
+Los montos (final_price, monetary_total) y las coordenadas quedan en 64
+bits: se suman por día/cliente y se usan para distancias.
+
+El schema es explícito por columna (no depende de los datos), así todas las
+particiones Parquet de un dataset comparten tipos. dataset_store lo aplica
+al escribir (Parquet guarda categorías como diccionario y los enteros
+reducidos) y al leer (Arrow devuelve strings como object).
+
+Uso:
+    >>> df = apply_schema(df)
+    >>> df, report = optimize_dtypes(df, name='dataset_completo')
+    python src/dataset_schema.py dataset_completo     # reporte de memoria
+"""
+
+import os
+import sys
+import logging
+import argparse
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow  # noqa: F401
+    STRING_DTYPE = pd.StringDtype("pyarrow")
+except ImportError:
+    STRING_DTYPE = pd.StringDtype("python")
+
+_CATEGORY = 'category'
+_FLOAT32 = 'float32'
+
+# columna → dtype (solo se convierten las columnas presentes)
+COLUMN_DTYPES: Dict[str, object] = {
+    # Identificadores y texto libre (alta cardinalidad)
+    'order_id': STRING_DTYPE,
+    'customer_id': STRING_DTYPE,
+    'delivery_address_id': STRING_DTYPE,
+    'address_id': STRING_DTYPE,
+    'product_id': STRING_DTYPE,
+    'customer_name': STRING_DTYPE,
+    'business_name': STRING_DTYPE,
+    'email': STRING_DTYPE,
+    'phone': STRING_DTYPE,
+    'updated_at': STRING_DTYPE,
+
+    # Textos de baja cardinalidad
+    'product_type': _CATEGORY,
+    'status': _CATEGORY,
+    'payment_status': _CATEGORY,
+    'payment_type': _CATEGORY,
+    'order_type': _CATEGORY,
+    'customer_type': _CATEGORY,
+    'customer_commune': _CATEGORY,
+    'delivery_commune': _CATEGORY,
+    'commune': _CATEGORY,
+    'region': _CATEGORY,
+    'product_name': _CATEGORY,
+    'category': _CATEGORY,
+    'day_name': _CATEGORY,
+
+    # Enteros
+    'quantity': 'Int16',
+    'year': 'int16',
+    'month': 'int8',
+    'day_of_week': 'int8',
+    'week_of_year': 'UInt8',
+    'days_since_first_order': 'int32',
+    'recency_days': 'int32',
+    'frequency': 'int32',
+
+    # Clima
+    'temp_max_c': _FLOAT32,
+    'temp_min_c': _FLOAT32,
+    'temp_avg_c': _FLOAT32,
+    'temp_range_c': _FLOAT32,
+    'humidity': _FLOAT32,
+    'precip_mm': _FLOAT32,
+    'temp_diff': _FLOAT32,
+    'is_hot_day': 'boolean',
+    'is_rainy_day': 'boolean',
+    'is_weekend': 'boolean',
+}
+# Features rolling de clima (src/weather_features.py)
+for _window in (3, 7, 14):
+    for _prefix, _suffix in (('temp_max', 'avg'), ('humidity', 'avg'), ('precip', 'sum')):
+        COLUMN_DTYPES[f"{_prefix}_{_window}d_{_suffix}"] = _FLOAT32
+
+
+def _nullable(dtype: str) -> str:
+    """int8 → Int8 (para columnas enteras con nulos)."""
+    return dtype.capitalize() if dtype.startswith(('int', 'uint')) else dtype
+
+
+def apply_schema(df: pd.DataFrame, dtypes: Optional[Dict[str, object]] = None) -> pd.DataFrame:
+    """
+    Convertir las columnas presentes al dtype del schema.
+
+    Un entero sin nulos usa el dtype numpy; con nulos, su versión nullable.
+    Una columna que no se puede convertir queda como estaba (con warning).
+
+    Args:
+        df: DataFrame a tipar
+        dtypes: Schema columna → dtype (default: COLUMN_DTYPES)
+
+    Returns:
+        DataFrame con los dtypes aplicados
+    """
+    dtypes = COLUMN_DTYPES if dtypes is None else dtypes
+    converted = {}
+    for column in df.columns.intersection(list(dtypes)):
+        dtype = dtypes[column]
+        series = df[column]
+        if isinstance(dtype, str) and dtype.startswith(('int', 'uint')) and series.isna().any():
+            dtype = _nullable(dtype)
+        if series.dtype == dtype:
+            continue
+        try:
+            if dtype == 'boolean' and series.dtype == object:
+                # Tras un merge left los flags quedan como object con NaN
+                series = series.astype(object).where(series.notna(), None)
+            converted[column] = series.astype(dtype)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"⚠️ {column}: no se pudo convertir a {dtype} ({e})")
+    if not converted:
+        return df
+    return df.assign(**converted)
+
+
+def memory_mb(df: pd.DataFrame) -> float:
+    """Memoria del DataFrame en MB (deep: incluye strings)."""
+    return df.memory_usage(deep=True, index=False).sum() / 1024 / 1024
+
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame) -> pd.DataFrame:
+    """
+    Memoria por columna antes y después de aplicar el schema.
+
+    Returns:
+        DataFrame con column, dtype_before, dtype_after, mb_before, mb_after y
+        mb_saved (ordenado por ahorro)
+    """
+    mb_before = before.memory_usage(deep=True, index=False) / 1024 / 1024
+    mb_after = after.memory_usage(deep=True, index=False) / 1024 / 1024
+    report = pd.DataFrame({
+        'column': before.columns,
+        'dtype_before': before.dtypes.astype(str).to_numpy(),
+        'dtype_after': after[before.columns].dtypes.astype(str).to_numpy(),
+        'mb_before': mb_before[before.columns].round(2).to_numpy(),
+        'mb_after': mb_after[before.columns].round(2).to_numpy(),
+    })
+    report['mb_saved'] = report['mb_before'] - report['mb_after']
+    return report.sort_values('mb_saved', ascending=False).reset_index(drop=True)
+
+
+def optimize_dtypes(df: pd.DataFrame, name: str = "dataset") -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Aplicar el schema y registrar la memoria antes/después.
+
+    Args:
+        df: DataFrame a tipar
+        name: Nombre para el log
+
+    Returns:
+        Tupla (DataFrame tipado, reporte por columna)
+    """
+    optimized = apply_schema(df)
+    report = memory_report(df, optimized)
+    before, after = report['mb_before'].sum(), report['mb_after'].sum()
+    saved = (1 - after / before) * 100 if before else 0.0
+    logger.info(f"💾 {name}: {before:,.1f} MB → {after:,.1f} MB en memoria (-{saved:.0f}%)")
+    return optimized, report
+
+
+if __name__ == "__main__":
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    try:
+        from src.dataset_store import read_dataset
+    except ImportError:
+        from dataset_store import read_dataset
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    parser = argparse.ArgumentParser(description="Reporte de memoria del schema de dtypes")
+    parser.add_argument("name", nargs="?", default="dataset_completo", help="Dataset de data/processed")
+    args = parser.parse_args()
+
+    raw = read_dataset(args.name, optimize=False)
+    _, report = optimize_dtypes(raw, args.name)
+    print("\n" + report.to_string(index=False))
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================
+ACCESO A DATASETS (PARQUET)
+Sistema ML Agua Tres Torres
+============================================
+Capa única de lectura/escritura de los datasets de data/processed/:
+
+- Lectura en Parquet tipado (sin re-parsear CSV ni inferir dtypes)
+- Proyección de columnas (solo se leen las columnas pedidas)
+- Memory-map opcional de los archivos Parquet
+- Particionado opcional por mes (data/processed/<nombre>/partition_month=YYYY-MM/)
+  con filtro por rango de fechas que descarta particiones completas
+- Fallback a <nombre>.csv (con parse_dates) si aún no existe el Parquet
+- Escritura atómica (archivo/directorio temporal + rename)
+- Reemplazo de particiones sueltas (consolidación incremental: solo se
+  reescriben los meses que cambiaron)
+- Dtypes compactos (src/dataset_schema.py) al escribir y al leer
+
+Uso:
+    >>> df = read_dataset('dataset_completo', columns=['order_date', 'final_price'])
+    >>> df = read_dataset('dataset_completo', start_date='2025-01-01')
+    >>> write_dataset(df, 'dataset_completo', partition_by='order_date', csv_copy=True)
+    >>> replace_partitions(df_meses, 'dataset_completo', partition_by='order_date')
+"""
+
+import os
+import shutil
+import logging
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_ENABLED = True
+except ImportError:
+    PARQUET_ENABLED = False
+
+try:
+    from src.dataset_schema import apply_schema
+except ImportError:
+    from dataset_schema import apply_schema
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROCESSED_DIR = os.path.join(BASE_DIR, "data", "processed")
+
+# Columna de partición (hive): partition_month=YYYY-MM
+PARTITION_COLUMN = "partition_month"
+
+# Columnas de fecha por dataset (para leer los CSV legados con tipos correctos)
+DATE_COLUMNS: Dict[str, List[str]] = {
+    'dataset_completo': ['order_date', 'delivered_date', 'payment_date', 'invoice_date', 'delivery_datetime'],
+    'dataset_weather': ['order_date', 'delivered_date', 'payment_date', 'date'],
+    'rfm_segments': [],
+}
+
+# Columna de fecha usada para filtros por rango (y particionado por defecto)
+DEFAULT_DATE_COLUMN = "order_date"
+
+
+def _paths(name: str, data_dir: Optional[str] = None) -> Dict[str, str]:
+    """Rutas posibles de un dataset: directorio particionado, Parquet y CSV."""
+    base = os.path.join(data_dir or PROCESSED_DIR, name)
+    return {
+        'partitioned': base,
+        'parquet': f"{base}.parquet",
+        'csv': f"{base}.csv",
+    }
+
+
+def dataset_exists(name: str, data_dir: Optional[str] = None) -> bool:
+    """True si el dataset existe en cualquiera de sus formatos."""
+    paths = _paths(name, data_dir)
+    return os.path.isdir(paths['partitioned']) or any(
+        os.path.exists(paths[fmt]) for fmt in ('parquet', 'csv')
+    )
+
+
+def is_partitioned(name: str, data_dir: Optional[str] = None) -> bool:
+    """True si el dataset está guardado como directorio particionado por mes."""
+    return os.path.isdir(_paths(name, data_dir)['partitioned'])
+
+
+def _apply_filters(df: pd.DataFrame, filters: List[tuple]) -> pd.DataFrame:
+    """Aplicar filtros estilo pyarrow (columna, op, valor) sobre un DataFrame (fallback CSV)."""
+    ops = {
+        '==': lambda s, v: s == v,
+        '!=': lambda s, v: s != v,
+        '>': lambda s, v: s > v,
+        '>=': lambda s, v: s >= v,
+        '<': lambda s, v: s < v,
+        '<=': lambda s, v: s <= v,
+        'in': lambda s, v: s.isin(v),
+        'not in': lambda s, v: ~s.isin(v),
+    }
+    for column, op, value in filters:
+        if column in df.columns:
+            df = df[ops[op](df[column], value)]
+    return df
+
+
+def _month_filters(date_column: str, start_date, end_date, partitioned: bool) -> List[tuple]:
+    """Filtros pyarrow (DNF) por rango de fechas + poda de particiones por mes."""
+    filters = []
+    if start_date is not None:
+        start = pd.Timestamp(start_date)
+        filters.append((date_column, '>=', start))
+        if partitioned:
+            filters.append((PARTITION_COLUMN, '>=', start.strftime('%Y-%m')))
+    if end_date is not None:
+        end = pd.Timestamp(end_date)
+        filters.append((date_column, '<=', end))
+        if partitioned:
+            filters.append((PARTITION_COLUMN, '<=', end.strftime('%Y-%m')))
+    return filters
+
+
+def read_dataset(name: str,
+                 columns: Optional[List[str]] = None,
+                 start_date=None,
+                 end_date=None,
+                 date_column: str = DEFAULT_DATE_COLUMN,
+                 memory_map: bool = True,
+                 filters: Optional[List[tuple]] = None,
+                 optimize: bool = True,
+                 data_dir: Optional[str] = None) -> pd.DataFrame:
+    """
+    Leer un dataset de data/processed/.
+
+    Orden de búsqueda: directorio particionado → <nombre>.parquet → <nombre>.csv.
+
+    Args:
+        name: Nombre del dataset (ej: 'dataset_completo', 'dataset_weather', 'rfm_segments')
+        columns: Columnas a leer (None = todas)
+        start_date: Fecha mínima (inclusive) en `date_column`
+        end_date: Fecha máxima (inclusive) en `date_column`
+        date_column: Columna de fecha para el filtro por rango
+        memory_map: Usar memory-map al leer Parquet
+        filters: Filtros adicionales (columna, op, valor), ej:
+            [('customer_id', 'in', ids)] o [(PARTITION_COLUMN, 'in', ['2025-01'])]
+        optimize: Aplicar el schema de dtypes compactos (dataset_schema)
+        data_dir: Directorio de datasets (default: data/processed)
+
+    Returns:
+        DataFrame tipado
+
+    Raises:
+        FileNotFoundError: Si el dataset no existe en ningún formato
+    """
+    paths = _paths(name, data_dir)
+    partitioned = os.path.isdir(paths['partitioned'])
+
+    if PARQUET_ENABLED and (partitioned or os.path.exists(paths['parquet'])):
+        source = paths['partitioned'] if partitioned else paths['parquet']
+        filters = _month_filters(date_column, start_date, end_date, partitioned) + list(filters or [])
+        table = pq.read_table(
+            source,
+            columns=columns,
+            filters=filters or None,
+            memory_map=memory_map,
+            partitioning='hive' if partitioned else None
+        )
+        df = table.to_pandas()
+        if PARTITION_COLUMN in df.columns and (columns is None or PARTITION_COLUMN not in columns):
+            df = df.drop(columns=[PARTITION_COLUMN])
+        if optimize:
+            df = apply_schema(df)
+        logger.info(f"✓ {name}: {len(df):,} registros desde Parquet ({source})")
+        return df
+
+    if os.path.exists(paths['csv']):
+        logger.warning(f"⚠️ {name}: leyendo CSV ({paths['csv']}); regenerar para usar Parquet")
+        header = pd.read_csv(paths['csv'], nrows=0).columns
+        usecols = columns if columns is None else [c for c in columns if c in header]
+        parse_dates = [c for c in DATE_COLUMNS.get(name, [date_column]) if c in header
+                       and (usecols is None or c in usecols)]
+        df = pd.read_csv(paths['csv'], usecols=usecols, parse_dates=parse_dates, low_memory=False)
+        if date_column in df.columns:
+            if start_date is not None:
+                df = df[df[date_column] >= pd.Timestamp(start_date)]
+            if end_date is not None:
+                df = df[df[date_column] <= pd.Timestamp(end_date)]
+        if filters:
+            df = _apply_filters(df, filters)
+        if optimize:
+            df = apply_schema(df)
+        return df.reset_index(drop=True)
+
+    raise FileNotFoundError(f"Dataset no encontrado: {name} (buscado en {paths['partitioned']}[.parquet|.csv])")
+
+
+def write_dataset(df: pd.DataFrame,
+                  name: str,
+                  partition_by: Optional[str] = None,
+                  csv_copy: bool = False,
+                  data_dir: Optional[str] = None) -> str:
+    """
+    Escribir un dataset en Parquet de forma atómica.
+
+    Args:
+        df: DataFrame a guardar
+        name: Nombre del dataset
+        partition_by: Columna de fecha para particionar por mes (None = un solo archivo)
+        csv_copy: Escribir además <nombre>.csv (compatibilidad con lectores externos)
+        data_dir: Directorio de datasets (default: data/processed)
+
+    Returns:
+        str: Ruta del dataset Parquet (archivo o directorio)
+    """
+    paths = _paths(name, data_dir)
+    os.makedirs(os.path.dirname(paths['parquet']), exist_ok=True)
+    # El schema queda guardado en el Parquet (diccionarios, enteros reducidos)
+    df = apply_schema(df)
+
+    if partition_by:
+        target = paths['partitioned']
+        tmp_dir = f"{target}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        df_out = df.copy()
+        df_out[PARTITION_COLUMN] = pd.to_datetime(df_out[partition_by]).dt.strftime('%Y-%m')
+        df_out.to_parquet(tmp_dir, index=False, compression='snappy', partition_cols=[PARTITION_COLUMN])
+
+        # Swap del directorio completo; el archivo único anterior queda obsoleto
+        old_dir = f"{target}.old-{os.getpid()}"
+        if os.path.isdir(target):
+            os.rename(target, old_dir)
+        os.rename(tmp_dir, target)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if os.path.exists(paths['parquet']):
+            os.remove(paths['parquet'])
+    else:
+        target = paths['parquet']
+        tmp_path = f"{target}.tmp-{os.getpid()}"
+        df.to_parquet(tmp_path, index=False, compression='snappy')
+        os.replace(tmp_path, target)
+        # Un directorio particionado antiguo tendría prioridad al leer
+        if os.path.isdir(paths['partitioned']):
+            shutil.rmtree(paths['partitioned'])
+
+    if csv_copy:
+        tmp_csv = f"{paths['csv']}.tmp-{os.getpid()}"
+        df.to_csv(tmp_csv, index=False)
+        os.replace(tmp_csv, paths['csv'])
+
+    logger.info(f"✓ {name}: {len(df):,} registros guardados en {target}")
+    return target
+
+
+def _cast_to_existing(table: "pa.Table", target: str) -> "pa.Table":
+    """
+    Castear las columnas nuevas a los tipos de las particiones existentes.
+
+    Todas las particiones de un dataset deben compartir tipos (Arrow no lee
+    un directorio con string en un mes y diccionario en otro). Aplica a
+    datasets escritos antes de un cambio de schema hasta la próxima
+    consolidación completa.
+    """
+    existing = next((os.path.join(root, f) for root, _, files in os.walk(target)
+                     for f in files if f.endswith('.parquet')), None)
+    if existing is None:
+        return table
+    schema = pq.read_schema(existing)
+    for field in schema:
+        index = table.schema.get_field_index(field.name)
+        if index >= 0 and not table.schema.field(index).type.equals(field.type):
+            table = table.set_column(index, field.name, table.column(index).cast(field.type))
+    return table
+
+
+def replace_partitions(df: pd.DataFrame,
+                       name: str,
+                       partition_by: str,
+                       partitions: Optional[Iterable[str]] = None,
+                       data_dir: Optional[str] = None) -> List[str]:
+    """
+    Reemplazar solo algunas particiones mensuales de un dataset particionado.
+
+    Cada partición presente en `df` se escribe en un directorio temporal y
+    luego reemplaza a la anterior con rename; el resto del dataset no se toca.
+    `df` debe traer el contenido COMPLETO de cada mes que se reemplaza.
+
+    Args:
+        df: Filas de los meses a reemplazar
+        name: Nombre del dataset (debe existir particionado)
+        partition_by: Columna de fecha que define el mes
+        partitions: Meses ('YYYY-MM') a reemplazar; los que no tengan filas en
+            `df` se eliminan (None = los meses presentes en `df`)
+        data_dir: Directorio de datasets (default: data/processed)
+
+    Returns:
+        list: Meses reescritos o eliminados
+
+    Raises:
+        FileNotFoundError: Si el dataset no está particionado
+    """
+    target = _paths(name, data_dir)['partitioned']
+    if not os.path.isdir(target):
+        raise FileNotFoundError(f"Dataset particionado no encontrado: {target}")
+
+    df_out = apply_schema(df)
+    df_out[PARTITION_COLUMN] = pd.to_datetime(df_out[partition_by]).dt.strftime('%Y-%m')
+    months = set(df_out[PARTITION_COLUMN].dropna().unique())
+    if partitions is not None:
+        months |= set(partitions)
+
+    tmp_dir = f"{target}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    if not df_out.empty:
+        table = _cast_to_existing(pa.Table.from_pandas(df_out, preserve_index=False), target)
+        pq.write_to_dataset(table, tmp_dir, partition_cols=[PARTITION_COLUMN], compression='snappy')
+
+    for month in sorted(months):
+        part = f"{PARTITION_COLUMN}={month}"
+        new_path = os.path.join(tmp_dir, part)
+        old_path = os.path.join(target, part)
+        trash_path = f"{old_path}.old-{os.getpid()}"
+        if os.path.isdir(old_path):
+            os.rename(old_path, trash_path)
+        if os.path.isdir(new_path):
+            os.rename(new_path, old_path)
+        shutil.rmtree(trash_path, ignore_errors=True)
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    logger.info(f"✓ {name}: {len(df):,} registros en {len(months)} particiones reemplazadas")
+    return sorted(months)
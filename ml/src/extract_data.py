@@ -9,7 +9,8 @@ Uso:
     python extract_data.py
 
 Output:
-    - ml/data/raw/orders_complete.csv (~1,004 registros)
+    - ml/data/raw/orders_complete.csv (todos los pedidos, sin límite de filas)
+    - ml/data/raw/3t_<tabla>.parquet (tablas base, escritas página a página)
 """
 
 import os
@@ -18,8 +19,16 @@ from pathlib import Path
 import pandas as pd
 from supabase import create_client, Client
 from datetime import datetime
+from typing import Optional
 import logging
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from src.supabase_extract import extract_table, extract_tables, read_table
+except ImportError:
+    from supabase_extract import extract_table, extract_tables, read_table
+
 # Configurar logging
 logging.basicConfig(
     level=logging.INFO,
@@ -57,52 +66,42 @@ def get_supabase_client() -> Client:
     return create_client(url, key)
 
 
-def extract_orders_data(supabase: Client, limit: int = 10000) -> pd.DataFrame:
+def extract_orders_data(supabase: Client, limit: Optional[int] = None) -> pd.DataFrame:
     """
     Extraer pedidos y hacer merge manual con clientes, direcciones y productos.
     
+    Las tablas se recorren con paginación keyset y se guardan en
+    data/raw/<tabla>.parquet (ver supabase_extract.py), sin límite de filas.
+    
     Args:
         supabase: Cliente de Supabase
-        limit: Límite de registros a extraer (default: 10000)
+        limit: Quedarse solo con los N pedidos más recientes (default: todos)
     
     Returns:
         DataFrame con pedidos completos
     """
-    logger.info(f"Extrayendo pedidos (límite: {limit})...")
+    logger.info("Extrayendo pedidos (paginación keyset)...")
+    
+    data = extract_tables(supabase, raw_dir=str(DATA_RAW))
     
-    # Extraer pedidos (sin comillas dobles en el nombre de la tabla)
-    response = supabase.table('3t_orders') \
-        .select('*') \
-        .not_.is_('order_date', 'null') \
-        .order('order_date', desc=True) \
-        .limit(limit) \
-        .execute()
+    orders_df = data['orders']
+    orders_df = orders_df[orders_df['order_date'].notna()]
+    if limit:
+        orders_df = orders_df.nlargest(limit, 'order_date')
     
-    if not response.data:
+    if orders_df.empty:
         logger.warning("No se encontraron datos")
         return pd.DataFrame()
     
-    logger.info(f"✓ Extraídos {len(response.data)} pedidos")
+    logger.info(f"✓ Extraídos {len(orders_df)} pedidos")
     
-    # Convertir a DataFrame
-    orders_df = pd.DataFrame(response.data)
-    
-    # Extraer clientes
-    logger.info("Extrayendo clientes...")
-    customers_response = supabase.table('3t_customers').select('*').execute()
-    customers_df = pd.DataFrame(customers_response.data)
+    customers_df = data['customers']
     logger.info(f"✓ Extraídos {len(customers_df)} clientes")
     
-    # Extraer direcciones
-    logger.info("Extrayendo direcciones...")
-    addresses_response = supabase.table('3t_addresses').select('*').execute()
-    addresses_df = pd.DataFrame(addresses_response.data)
+    addresses_df = data['addresses']
     logger.info(f"✓ Extraídas {len(addresses_df)} direcciones")
     
-    # Extraer productos
-    logger.info("Extrayendo productos...")
-    products_response = supabase.table('3t_products').select('*').execute()
-    products_df = pd.DataFrame(products_response.data)
+    products_df = data['products']
     logger.info(f"✓ Extraídos {len(products_df)} productos")
     
     # Hacer merge con prefijos para evitar colisiones
@@ -155,16 +154,14 @@ def extract_customers_data(supabase: Client) -> pd.DataFrame:
     """
     logger.info("Extrayendo clientes...")
     
-    response = supabase.table('3t_customers') \
-        .select('*') \
-        .execute()
+    _, rows = extract_table(supabase, 'customers', raw_dir=str(DATA_RAW))
     
-    if not response.data:
+    if not rows:
         logger.warning("No se encontraron clientes")
         return pd.DataFrame()
     
-    logger.info(f"✓ Extraídos {len(response.data)} clientes")
-    return pd.DataFrame(response.data)
+    logger.info(f"✓ Extraídos {rows} clientes")
+    return read_table('customers', raw_dir=str(DATA_RAW))
 
 
 def extract_products_data(supabase: Client) -> pd.DataFrame:
@@ -179,16 +176,14 @@ def extract_products_data(supabase: Client) -> pd.DataFrame:
     """
     logger.info("Extrayendo productos...")
     
-    response = supabase.table('3t_products') \
-        .select('*') \
-        .execute()
+    _, rows = extract_table(supabase, 'products', raw_dir=str(DATA_RAW))
     
-    if not response.data:
+    if not rows:
         logger.warning("No se encontraron productos")
         return pd.DataFrame()
     
-    logger.info(f"✓ Extraídos {len(response.data)} productos")
-    return pd.DataFrame(response.data)
+    logger.info(f"✓ Extraídos {rows} productos")
+    return read_table('products', raw_dir=str(DATA_RAW))
 
 
 def save_dataset(df: pd.DataFrame, filename: str, description: str = ""):
@@ -254,7 +249,7 @@ def main():
         
         # Extraer datos
         logger.info("Fase 1: Extracción y combinación de datos...")
-        orders_df = extract_orders_data(supabase, limit=10000)
+        orders_df = extract_orders_data(supabase)
         
         if orders_df.empty:
             logger.error("❌ No se pudieron extraer pedidos. Abortando.")
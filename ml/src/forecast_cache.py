@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================
+CACHE DE FORECASTS PROPHET
+Sistema ML Agua Tres Torres
+============================================
+Precalcula el forecast completo (horizonte máximo) de cada modelo
+Prophet una sola vez y sirve slices desde memoria.
+
+- Invalidación por TTL (por defecto 24 horas)
+- Invalidación automática si el modelo cambia (re-entrenamiento / recarga)
+- Hook de refresco manual (refresh)
+
+Uso:
+    >>> cache = ForecastCache(horizon_days=90)
+    >>> forecast = cache.get('demand', MODELS['demand'], days=30)
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from src.prophet_forecast import FORECAST_COLUMNS, predict_future
+except ImportError:
+    from prophet_forecast import FORECAST_COLUMNS, predict_future
+
+logger = logging.getLogger(__name__)
+
+# Configuración por variables de entorno
+DEFAULT_HORIZON_DAYS = int(os.getenv("FORECAST_CACHE_HORIZON_DAYS", "90"))
+DEFAULT_TTL_SECONDS = int(os.getenv("FORECAST_CACHE_TTL_SECONDS", str(24 * 3600)))
+_uncertainty_env = os.getenv("FORECAST_UNCERTAINTY_SAMPLES")
+DEFAULT_UNCERTAINTY_SAMPLES = int(_uncertainty_env) if _uncertainty_env else None
+
+
+class ForecastCache:
+    """
+    Cache en memoria de forecasts Prophet por nombre de modelo.
+
+    Cada entrada guarda el forecast de los próximos `horizon_days` días,
+    la identidad del modelo que lo generó y la hora de cálculo.
+    """
+
+    def __init__(self, horizon_days: int = DEFAULT_HORIZON_DAYS,
+                 ttl_seconds: int = DEFAULT_TTL_SECONDS,
+                 uncertainty_samples: Optional[int] = DEFAULT_UNCERTAINTY_SAMPLES):
+        """
+        Inicializar cache.
+
+        Args:
+            horizon_days: Días futuros a precalcular (máximo servible)
+            ttl_seconds: Segundos de validez de cada forecast
+            uncertainty_samples: Muestras de incertidumbre (None = las del modelo)
+        """
+        self.horizon_days = horizon_days
+        self.ttl_seconds = ttl_seconds
+        self.uncertainty_samples = uncertainty_samples
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._compute_locks: Dict[str, threading.Lock] = {}
+
+    def _is_valid(self, entry: Optional[Dict[str, Any]], model: Any) -> bool:
+        """Verificar si una entrada sigue vigente para el modelo dado."""
+        if entry is None:
+            return False
+        if entry['model_id'] != id(model):
+            return False
+        return (time.monotonic() - entry['computed_monotonic']) < self.ttl_seconds
+
+    def _compute(self, model: Any) -> pd.DataFrame:
+        """Calcular forecast completo del horizonte (solo fechas futuras)."""
+        forecast = predict_future(model, self.horizon_days, self.uncertainty_samples)
+        return forecast[FORECAST_COLUMNS]
+
+    def get(self, name: str, model: Any, days: int) -> pd.DataFrame:
+        """
+        Obtener forecast de los próximos `days` días desde cache.
+
+        Args:
+            name: Nombre del modelo (ej: 'demand', 'revenue')
+            model: Modelo Prophet entrenado
+            days: Días a devolver (<= horizon_days)
+
+        Returns:
+            DataFrame con columnas ds, yhat, yhat_lower, yhat_upper
+
+        Raises:
+            ValueError: Si days excede el horizonte del cache
+        """
+        if days > self.horizon_days:
+            raise ValueError(f"days={days} excede el horizonte del cache ({self.horizon_days})")
+
+        with self._lock:
+            entry = self._entries.get(name)
+            if self._is_valid(entry, model):
+                return entry['forecast'].head(days)
+            compute_lock = self._compute_locks.setdefault(name, threading.Lock())
+
+        # Un solo cálculo concurrente por modelo; el resto espera el resultado
+        with compute_lock:
+            with self._lock:
+                entry = self._entries.get(name)
+                if self._is_valid(entry, model):
+                    return entry['forecast'].head(days)
+
+            start = time.perf_counter()
+            forecast = self._compute(model)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+            with self._lock:
+                self._entries[name] = {
+                    'forecast': forecast,
+                    'model_id': id(model),
+                    'computed_at': datetime.now(),
+                    'computed_monotonic': time.monotonic(),
+                    'compute_ms': round(elapsed_ms, 1),
+                }
+            logger.info(f"✓ Forecast '{name}' precalculado ({self.horizon_days} días, {elapsed_ms:.0f} ms)")
+
+        return forecast.head(days)
+
+    def invalidate(self, name: Optional[str] = None):
+        """
+        Invalidar una entrada (o todas si name es None).
+
+        Args:
+            name: Nombre del modelo a invalidar
+        """
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+    def refresh(self, models: Dict[str, Any], names: Optional[List[str]] = None) -> Dict[str, str]:
+        """
+        Recalcular forecasts (hook de refresco).
+
+        Args:
+            models: Diccionario nombre → modelo Prophet
+            names: Modelos a refrescar (None = todos los de `models`)
+
+        Returns:
+            dict: Estado por modelo ('refreshed' o mensaje de error)
+        """
+        result = {}
+        for name in names or list(models.keys()):
+            model = models.get(name)
+            if model is None:
+                result[name] = "not_loaded"
+                continue
+            self.invalidate(name)
+            try:
+                self.get(name, model, days=1)
+                result[name] = "refreshed"
+            except Exception as e:
+                logger.error(f"Error refrescando forecast '{name}': {e}")
+                result[name] = f"error: {e}"
+        return result
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Estado del cache para health checks.
+
+        Returns:
+            dict con horizonte, TTL y edad de cada entrada
+        """
+        now = time.monotonic()
+        with self._lock:
+            entries = {
+                name: {
+                    'computed_at': entry['computed_at'].isoformat(),
+                    'age_seconds': round(now - entry['computed_monotonic'], 1),
+                    'compute_ms': entry['compute_ms'],
+                    'expired': (now - entry['computed_monotonic']) >= self.ttl_seconds,
+                }
+                for name, entry in self._entries.items()
+            }
+        return {
+            'horizon_days': self.horizon_days,
+            'ttl_seconds': self.ttl_seconds,
+            'uncertainty_samples': self.uncertainty_samples,
+            'entries': entries,
+        }
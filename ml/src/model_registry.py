@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================
+REGISTRO DE MODELOS ML
+Sistema ML Agua Tres Torres
+============================================
+Carga de modelos (.pkl) para la API:
+
+- Modelos principales se cargan en paralelo (threads) al inicio
+- Modelos poco usados (lazy) se cargan en el primer uso
+- Un modelo que falla solo degrada su propio endpoint
+- Modelos opcionales (ej: Prophet con clima): si faltan, el endpoint usa
+  su método alternativo y la API no queda "degraded"
+- Métricas por modelo: tiempo de carga, tamaño y estado
+- Recarga en caliente: los modelos nuevos se cargan aparte y se
+  reemplaza el diccionario completo en una sola asignación, así los
+  requests en curso terminan con la versión anterior
+- Watcher del directorio models/ (polling de mtime) para recargar
+  automáticamente después de re-entrenar
+
+Uso:
+    >>> registry = ModelRegistry(MODELS_DIR, MODEL_SPECS)
+    >>> registry.load_eager()
+    >>> model = registry['churn']
+    >>> registry.reload()                       # recarga en caliente
+    >>> registry.start_watcher(interval=30)     # recarga automática
+"""
+
+import os
+import time
+import pickle
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Threads para la carga paralela inicial
+DEFAULT_LOAD_WORKERS = int(os.getenv("MODEL_LOAD_WORKERS", "4"))
+
+# Intervalo del watcher de models/ en segundos (0 = desactivado)
+DEFAULT_WATCH_INTERVAL = int(os.getenv("MODEL_WATCH_INTERVAL_SECONDS", "30"))
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    """Definición de un modelo servido por la API."""
+    filename: str
+    label: str
+    lazy: bool = False
+    optional: bool = False
+
+
+# Modelos de la API: nombre → archivo en models/
+MODEL_SPECS: Dict[str, ModelSpec] = {
+    'churn': ModelSpec("xgboost_churn.pkl", "XGBoost Churn"),
+    'demand': ModelSpec("prophet_demand.pkl", "Prophet Demanda"),
+    'revenue': ModelSpec("prophet_revenue.pkl", "Prophet Revenue"),
+    'routes': ModelSpec("random_forest_routes.pkl", "Random Forest Rutas", lazy=True),
+    'pricing': ModelSpec("ridge_pricing.pkl", "Ridge Precios"),
+    'segments': ModelSpec("kmeans_segmentation.pkl", "KMeans Segmentación", lazy=True),
+    'demand_weather': ModelSpec("prophet_demand_weather.pkl", "Prophet Demanda + Clima", optional=True),
+    'revenue_weather': ModelSpec("prophet_revenue_weather.pkl", "Prophet Revenue + Clima", optional=True),
+    'communes': ModelSpec("commune_forecasts.pkl", "Forecast por Comuna", lazy=True, optional=True),
+}
+
+
+def save_model(obj: Any, model_path: str) -> None:
+    """
+    Guardar modelo de forma atómica (archivo temporal + os.replace).
+
+    La API recarga los .pkl en caliente; así nunca lee un archivo a medio
+    escribir. El temporal lleva el pid para que dos procesos que publican el
+    mismo archivo (ej: retrain y forecast por comuna) no se pisen.
+    """
+    tmp_path = f"{model_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(obj, f)
+        os.replace(tmp_path, model_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class ModelUnavailableError(LookupError):
+    """El modelo no está cargado (archivo faltante o error al deserializar)."""
+
+
+class ModelRegistry:
+    """
+    Registro de modelos con carga paralela, lazy loading y estado por modelo.
+
+    Se comporta como un diccionario de solo lectura: `registry['churn']`,
+    `registry.get('demand')`, `registry.keys()`.
+    """
+
+    def __init__(self, models_dir: str, specs: Dict[str, ModelSpec] = MODEL_SPECS,
+                 max_workers: int = DEFAULT_LOAD_WORKERS):
+        """
+        Inicializar registro.
+
+        Args:
+            models_dir: Directorio con los archivos .pkl
+            specs: Definición de modelos (nombre → ModelSpec)
+            max_workers: Threads para la carga paralela
+        """
+        self.models_dir = models_dir
+        self.specs = specs
+        self.max_workers = max_workers
+        self._models: Dict[str, Any] = {}
+        self._info: Dict[str, Dict[str, Any]] = {
+            name: {'status': 'lazy' if spec.lazy else 'not_loaded'}
+            for name, spec in specs.items()
+        }
+        self._locks = {name: threading.Lock() for name in specs}
+        self._reload_lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._watcher_stop = threading.Event()
+
+    def _path(self, name: str) -> str:
+        """Ruta al archivo .pkl del modelo."""
+        return os.path.join(self.models_dir, self.specs[name].filename)
+
+    def _mtime(self, name: str) -> Optional[float]:
+        """mtime del archivo del modelo (None si no existe)."""
+        try:
+            return os.path.getmtime(self._path(name))
+        except OSError:
+            return None
+
+    def _read_file(self, name: str) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Deserializar un modelo sin publicarlo en el registro.
+
+        Args:
+            name: Nombre del modelo
+
+        Returns:
+            Tupla (modelo o None si falló, info de carga)
+        """
+        path = self._path(name)
+        mtime = self._mtime(name)
+        start = time.perf_counter()
+        try:
+            with open(path, 'rb') as f:
+                model = pickle.load(f)
+        except Exception as e:
+            logger.error(f"❌ Error cargando {self.specs[name].label}: {e}")
+            return None, {
+                'status': 'failed',
+                'error': str(e),
+                'file': self.specs[name].filename,
+                'file_mtime': mtime,
+            }
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"✓ {self.specs[name].label} cargado ({elapsed_ms:.0f} ms)")
+        return model, {
+            'status': 'loaded',
+            'file': self.specs[name].filename,
+            'file_mtime': mtime,
+            'load_ms': round(elapsed_ms, 1),
+            'size_kb': round(os.path.getsize(path) / 1024, 1),
+            'loaded_at': datetime.now().isoformat(),
+        }
+
+    def _load(self, name: str) -> Optional[Any]:
+        """Cargar un modelo y publicarlo en el registro."""
+        with self._locks[name]:
+            if name in self._models:
+                return self._models[name]
+            model, info = self._read_file(name)
+            self._info[name] = info
+            if model is not None:
+                # Copia + reemplazo: nunca se muta el dict que leen otros requests
+                with self._swap_lock:
+                    self._models = {**self._models, name: model}
+            return model
+
+    def load_eager(self, names: Optional[List[str]] = None) -> Dict[str, str]:
+        """
+        Cargar en paralelo los modelos no-lazy.
+
+        Args:
+            names: Modelos a cargar (None = todos los no-lazy)
+
+        Returns:
+            dict: Estado final por modelo
+        """
+        names = names or [name for name, spec in self.specs.items() if not spec.lazy]
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="model-load") as pool:
+            list(pool.map(self._load, names))
+        return {name: self._info[name]['status'] for name in names}
+
+    def reload(self, names: Optional[List[str]] = None) -> Dict[str, str]:
+        """
+        Recargar modelos en caliente con swap atómico.
+
+        Los modelos se deserializan en paralelo fuera del registro; luego se
+        publica un diccionario nuevo en una sola asignación. Los requests en
+        curso conservan la referencia al modelo anterior. Si un archivo nuevo
+        falla, se mantiene la versión anterior.
+
+        Args:
+            names: Modelos a recargar (None = cargados, fallidos y no-lazy)
+
+        Returns:
+            dict: Resultado por modelo ('reloaded', 'kept_previous', 'failed')
+        """
+        with self._reload_lock:
+            if names is None:
+                names = [
+                    name for name, spec in self.specs.items()
+                    if not spec.lazy or self._info[name]['status'] != 'lazy'
+                ]
+
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="model-reload") as pool:
+                loaded = dict(zip(names, pool.map(self._read_file, names)))
+
+            results = {}
+            with self._swap_lock:
+                new_models = dict(self._models)
+                for name, (model, info) in loaded.items():
+                    if model is not None:
+                        new_models[name] = model
+                        self._info[name] = info
+                        results[name] = 'reloaded'
+                    elif name in new_models:
+                        self._info[name] = {
+                            **self._info[name],
+                            'last_reload_error': info['error'],
+                            'last_reload_failed_mtime': info['file_mtime'],
+                        }
+                        results[name] = 'kept_previous'
+                    else:
+                        self._info[name] = info
+                        results[name] = 'failed'
+
+                # Swap atómico del diccionario de modelos
+                self._models = new_models
+
+        logger.info(f"🔄 Recarga de modelos: {results}")
+        return results
+
+    def changed_models(self) -> Dict[str, Optional[float]]:
+        """
+        Modelos cuyo archivo cambió desde la última carga.
+
+        Los modelos lazy aún no cargados se ignoran (cargarán la versión nueva
+        en su primer uso).
+
+        Returns:
+            dict: nombre → mtime actual del archivo
+        """
+        changed = {}
+        for name, info in self._info.items():
+            if info['status'] == 'lazy':
+                continue
+            mtime = self._mtime(name)
+            if mtime is None:
+                continue
+            known = {info.get('file_mtime'), info.get('last_reload_failed_mtime')}
+            if mtime not in known:
+                changed[name] = mtime
+        return changed
+
+    def _watch_loop(self, interval: int, on_reload: Optional[Callable[[Dict[str, str]], None]]):
+        """Loop del watcher: recarga archivos cuyo mtime se mantuvo estable un ciclo."""
+        pending: Dict[str, Optional[float]] = {}
+        while not self._watcher_stop.wait(interval):
+            try:
+                changed = self.changed_models()
+                # Esperar un ciclo sin cambios para no leer un pickle a medio escribir
+                stable = [name for name, mtime in changed.items() if pending.get(name) == mtime]
+                pending = {name: mtime for name, mtime in changed.items() if name not in stable}
+                if stable:
+                    results = self.reload(stable)
+                    if on_reload:
+                        on_reload(results)
+            except Exception as e:
+                logger.error(f"Error en watcher de modelos: {e}")
+
+    def start_watcher(self, interval: int = DEFAULT_WATCH_INTERVAL,
+                      on_reload: Optional[Callable[[Dict[str, str]], None]] = None) -> bool:
+        """
+        Iniciar watcher del directorio de modelos en un thread daemon.
+
+        Args:
+            interval: Segundos entre revisiones (0 = no iniciar)
+            on_reload: Callback con el resultado de cada recarga
+
+        Returns:
+            bool: True si el watcher quedó corriendo
+        """
+        if interval <= 0 or (self._watcher and self._watcher.is_alive()):
+            return bool(self._watcher and self._watcher.is_alive())
+
+        self._watcher_stop.clear()
+        self._watcher = threading.Thread(
+            target=self._watch_loop,
+            args=(interval, on_reload),
+            name="model-watcher",
+            daemon=True
+        )
+        self._watcher.start()
+        logger.info(f"👀 Watcher de modelos activo ({self.models_dir}, cada {interval}s)")
+        return True
+
+    def stop_watcher(self):
+        """Detener watcher del directorio de modelos."""
+        self._watcher_stop.set()
+
+    @property
+    def watching(self) -> bool:
+        """True si el watcher está corriendo."""
+        return bool(self._watcher and self._watcher.is_alive())
+
+    def __getitem__(self, name: str) -> Any:
+        """
+        Obtener modelo (carga lazy si corresponde).
+
+        Raises:
+            ModelUnavailableError: Si el modelo no existe o no se pudo cargar
+        """
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        if name not in self.specs:
+            raise ModelUnavailableError(f"Modelo desconocido: {name}")
+        if self._info[name]['status'] == 'failed':
+            raise ModelUnavailableError(f"Modelo '{name}' no disponible: {self._info[name].get('error')}")
+
+        model = self._load(name)
+        if model is None:
+            raise ModelUnavailableError(f"Modelo '{name}' no disponible: {self._info[name].get('error')}")
+        return model
+
+    def get(self, name: str, default: Any = None) -> Any:
+        """Obtener modelo o `default` si no está disponible."""
+        try:
+            return self[name]
+        except ModelUnavailableError:
+            return default
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._models
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+    def keys(self):
+        """Nombres de modelos cargados."""
+        return self._models.keys()
+
+    def status(self) -> Dict[str, str]:
+        """Estado resumido por modelo (loaded, lazy, failed, not_loaded)."""
+        return {name: info['status'] for name, info in self._info.items()}
+
+    def details(self) -> Dict[str, Dict[str, Any]]:
+        """Detalle por modelo: estado, archivo, tiempo de carga y tamaño."""
+        return {name: dict(info) for name, info in self._info.items()}
+
+    def is_healthy(self) -> bool:
+        """True si ningún modelo obligatorio falló al cargar."""
+        return all(info['status'] != 'failed' or self.specs[name].optional
+                   for name, info in self._info.items())
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================
+FORECAST PROPHET SOLO FUTURO
+Sistema ML Agua Tres Torres
+============================================
+Helper para predecir únicamente las fechas futuras solicitadas,
+sin recalcular todo el histórico de entrenamiento.
+
+`make_future_dataframe(periods=N)` incluye cada día histórico y luego
+se hacía `.tail(N)`: el costo crecía con los años de historia. Aquí el
+costo depende solo del horizonte. Además permite desactivar (0) o
+reducir el muestreo de incertidumbre por request.
+
+Uso:
+    >>> forecast = predict_future(model, days=30)
+    >>> forecast = predict_future(model, days=30, uncertainty_samples=0)  # sin intervalos
+"""
+
+import copy
+from typing import Any, Optional
+
+import pandas as pd
+
+# Columnas estándar que devuelven los forecasts del sistema
+FORECAST_COLUMNS = ['ds', 'yhat', 'yhat_lower', 'yhat_upper']
+
+
+def future_dates(model: Any, days: int) -> pd.DataFrame:
+    """
+    Construir DataFrame con solo las fechas futuras (sin histórico).
+
+    Args:
+        model: Modelo Prophet entrenado
+        days: Días a predecir desde el último día de entrenamiento
+
+    Returns:
+        DataFrame con columna 'ds'
+    """
+    return model.make_future_dataframe(periods=days, include_history=False)
+
+
+def predict_future(model: Any, days: int,
+                   uncertainty_samples: Optional[int] = None,
+                   future: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Predecir solo los próximos `days` días.
+
+    Args:
+        model: Modelo Prophet entrenado
+        days: Horizonte en días
+        uncertainty_samples: Muestras para intervalos de incertidumbre.
+            None = usar la configuración del modelo, 0 = sin intervalos
+            (yhat_lower/yhat_upper se igualan a yhat)
+        future: DataFrame futuro ya construido (ej: con regressors);
+            si se omite se generan las fechas con future_dates()
+
+    Returns:
+        DataFrame de forecast con al menos ds, yhat, yhat_lower, yhat_upper
+    """
+    if future is None:
+        future = future_dates(model, days)
+
+    if uncertainty_samples is not None and uncertainty_samples != model.uncertainty_samples:
+        # Copia superficial: no se modifica el modelo compartido entre requests
+        model = copy.copy(model)
+        model.uncertainty_samples = uncertainty_samples
+
+    forecast = model.predict(future)
+
+    if 'yhat_lower' not in forecast.columns:
+        forecast['yhat_lower'] = forecast['yhat']
+        forecast['yhat_upper'] = forecast['yhat']
+
+    return forecast.reset_index(drop=True)
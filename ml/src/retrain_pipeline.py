@@ -6,7 +6,7 @@ Actualiza modelos ML mensualmente con datos nuevos de Supabase
 import pandas as pd
 import numpy as np
 import os
-import pickle
+import sys
 from datetime import datetime, timedelta
 import logging
 import shutil
@@ -25,6 +25,31 @@ import xgboost as xgb
 # Prophet
 from prophet import Prophet
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from src.dataset_store import read_dataset, write_dataset
+    from src.supabase_extract import (DEFAULT_TABLE_TIMEOUT, TABLE_SPECS, extract_tables_concurrent,
+                                      get_supabase_client)
+    from src.training_scheduler import (DEFAULT_MEMORY_BUDGET_MB, DEFAULT_TRAINING_WORKERS,
+                                        TrainingJob, TrainingScheduler, estimate_memory_mb)
+    from src.rfm import aggregate_customers, rfm_at
+    from src.dataset_schema import memory_mb
+    from src.commune_forecast import train_commune_forecasts
+    from src.consolidate_data import incremental_since
+    from src.model_registry import save_model
+except ImportError:
+    from dataset_store import read_dataset, write_dataset
+    from supabase_extract import (DEFAULT_TABLE_TIMEOUT, TABLE_SPECS, extract_tables_concurrent,
+                                  get_supabase_client)
+    from training_scheduler import (DEFAULT_MEMORY_BUDGET_MB, DEFAULT_TRAINING_WORKERS,
+                                    TrainingJob, TrainingScheduler, estimate_memory_mb)
+    from rfm import aggregate_customers, rfm_at
+    from dataset_schema import memory_mb
+    from commune_forecast import train_commune_forecasts
+    from consolidate_data import incremental_since
+    from model_registry import save_model
+
 # Configuración de logging
 logging.basicConfig(
     level=logging.INFO,
@@ -43,6 +68,10 @@ MODELS_DIR = os.path.join(BASE_DIR, "models")
 MODELS_BACKUP_DIR = os.path.join(BASE_DIR, "models_backup")
 REPORTS_DIR = os.path.join(BASE_DIR, "reports")
 
+# API ML (para recargar modelos en caliente al terminar)
+ML_API_URL = os.getenv("ML_API_URL", "http://localhost:8001")
+ML_ADMIN_TOKEN = os.getenv("ML_ADMIN_TOKEN")
+
 # Crear directorios si no existen
 os.makedirs(MODELS_BACKUP_DIR, exist_ok=True)
 os.makedirs(REPORTS_DIR, exist_ok=True)
@@ -67,86 +96,110 @@ def backup_models():
         logging.error(f"❌ Error al crear backup: {e}")
         raise
 
-def extract_data_from_supabase():
+def notify_api_reload():
+    """Pedir a la API ML que recargue los modelos (sin reiniciar)."""
+    try:
+        import requests
+        headers = {"X-Admin-Token": ML_ADMIN_TOKEN} if ML_ADMIN_TOKEN else {}
+        response = requests.post(
+            f"{ML_API_URL}/admin/models/reload",
+            json={"wait": False},
+            headers=headers,
+            timeout=10
+        )
+        response.raise_for_status()
+        logging.info(f"✓ API ML notificada: recarga de modelos en segundo plano ({ML_API_URL})")
+        return True
+    except Exception as e:
+        logging.warning(f"⚠️ No se pudo notificar a la API ML ({e}). El watcher de models/ la recargará automáticamente")
+        return False
+
+def extract_data_from_supabase(since=None, raw_dir=DATA_RAW_DIR):
     """
     Extrae datos actualizados desde Supabase
     Similar a consolidate_data.py pero conectando a BD
+    
+    Las tablas se extraen en paralelo (un cliente HTTP por worker), con
+    timeout y tiempos por tabla. Una tabla que falla usa su CSV local sin
+    descartar las demás.
+    
+    Args:
+        since: Pedidos desde esta fecha (default: últimos 12 meses)
+        raw_dir: Directorio de salida de los Parquet
+    
+    Returns:
+        Tupla (dict tabla → DataFrame, reporte de extracción por tabla)
     """
     logging.info("\n============================================================")
     logging.info("📊 EXTRAYENDO DATOS DE SUPABASE")
     logging.info("============================================================")
     
-    try:
-        from supabase import create_client, Client
-        import os
-        
-        # Cargar credenciales
-        SUPABASE_URL = os.getenv("SUPABASE_URL")
-        SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
-        
-        if not SUPABASE_URL or not SUPABASE_KEY:
-            raise ValueError("Variables SUPABASE_URL o SUPABASE_SERVICE_KEY no configuradas")
-        
-        supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        
-        # Extraer tablas (últimos 12 meses para no sobrecargar)
-        twelve_months_ago = (datetime.now() - timedelta(days=365)).strftime("%Y-%m-%d")
-        
-        logging.info("📥 Extrayendo orders...")
-        orders_response = supabase.table("3t_orders").select("*").gte("order_date", twelve_months_ago).execute()
-        orders_df = pd.DataFrame(orders_response.data)
-        logging.info(f"  → {len(orders_df):,} pedidos")
-        
-        logging.info("📥 Extrayendo customers...")
-        customers_response = supabase.table("3t_customers").select("*").execute()
-        customers_df = pd.DataFrame(customers_response.data)
-        logging.info(f"  → {len(customers_df):,} clientes")
-        
-        logging.info("📥 Extrayendo addresses...")
-        addresses_response = supabase.table("3t_addresses").select("*").execute()
-        addresses_df = pd.DataFrame(addresses_response.data)
-        logging.info(f"  → {len(addresses_df):,} direcciones")
-        
-        logging.info("📥 Extrayendo products...")
-        products_response = supabase.table("3t_products").select("*").execute()
-        products_df = pd.DataFrame(products_response.data)
-        logging.info(f"  → {len(products_df):,} productos")
-        
-        return {
-            "orders": orders_df,
-            "customers": customers_df,
-            "addresses": addresses_df,
-            "products": products_df
-        }
+    # Extraer tablas (últimos 12 meses de pedidos para no sobrecargar).
+    # Paginación keyset + columnas proyectadas, escritas a data/raw/*.parquet
+    twelve_months_ago = (datetime.now() - timedelta(days=365)).strftime("%Y-%m-%d")
+    since = since or twelve_months_ago
     
+    try:
+        import supabase  # noqa: F401
     except ImportError:
         logging.warning("⚠️ Módulo 'supabase' no instalado. Usando datos locales existentes.")
-        return load_existing_csvs()
-    except Exception as e:
-        logging.error(f"❌ Error al extraer de Supabase: {e}")
-        logging.warning("⚠️ Usando datos locales existentes como fallback.")
-        return load_existing_csvs()
+        return load_existing_csvs(), {}
+    
+    data, report = extract_tables_concurrent(
+        lambda: get_supabase_client(timeout=DEFAULT_TABLE_TIMEOUT),
+        since=since,
+        raw_dir=raw_dir,
+        fallback=load_existing_csv
+    )
+    
+    failed = [name for name, info in report.items() if info['status'] != 'ok']
+    if failed:
+        logging.warning(f"⚠️ Tablas desde datos locales (fallback): {', '.join(failed)}")
+    
+    return data, report
 
-def load_existing_csvs():
+def load_existing_csv(name):
+    """
+    Fallback de una tabla: cargar su CSV local existente.
+    
+    Args:
+        name: Nombre de la tabla (orders, customers, addresses, products)
+    
+    Returns:
+        DataFrame o None si no existe el CSV
+    """
+    file_name = f"3t_{name}_rows.csv"
+    path = os.path.join(DATA_RAW_DIR, file_name)
+    if not os.path.exists(path):
+        logging.warning(f"  ⚠️ {file_name} no encontrado")
+        return None
+    
+    df = pd.read_csv(path)
+    logging.info(f"  ✓ {file_name}: {len(df):,} registros")
+    return df
+
+def load_existing_csvs(names=None):
     """Fallback: cargar CSVs existentes si Supabase falla"""
     logging.info("\n📂 Cargando CSVs locales existentes...")
     
     data = {}
-    for file_name in ["3t_orders_rows.csv", "3t_customers_rows.csv", "3t_addresses_rows.csv", "3t_products_rows.csv"]:
-        path = os.path.join(DATA_RAW_DIR, file_name)
-        if os.path.exists(path):
-            df = pd.read_csv(path)
-            data[file_name.replace("3t_", "").replace("_rows.csv", "")] = df
-            logging.info(f"  ✓ {file_name}: {len(df):,} registros")
-        else:
-            logging.warning(f"  ⚠️ {file_name} no encontrado")
+    for name in names or list(TABLE_SPECS):
+        df = load_existing_csv(name)
+        if df is not None:
+            data[name] = df
     
     return data
 
-def consolidate_and_engineer_features(data):
+def consolidate_and_engineer_features(data, incremental=False, load_full=None):
     """
     Replica la lógica de consolidate_data.py
     Limpieza, merge, feature engineering
+    
+    Con incremental=True solo se procesan los pedidos nuevos o modificados
+    desde la última consolidación y se reescriben las particiones tocadas;
+    luego se lee el dataset completo (Parquet) para re-entrenar.
+    `load_full` carga las tablas completas si el modo incremental cae a
+    completo y `data` trae solo los pedidos desde el watermark.
     """
     logging.info("\n============================================================")
     logging.info("🧹 LIMPIEZA Y FEATURE ENGINEERING")
@@ -154,18 +207,20 @@ def consolidate_and_engineer_features(data):
     
     # Importar funciones desde consolidate_data.py
     try:
-        import sys
-        sys.path.append(os.path.join(BASE_DIR, "src"))
-        from consolidate_data import clean_data, combine_data, feature_engineering
+        try:
+            from src.consolidate_data import consolidate
+        except ImportError:
+            from consolidate_data import consolidate
         
-        cleaned_data = clean_data(data)
-        df_combined = combine_data(cleaned_data)
-        df_final = feature_engineering(df_combined)
+        # Guardar dataset actualizado (Parquet particionado + copia CSV en modo completo)
+        df_final, output_path, mode = consolidate(data, incremental=incremental, data_dir=DATA_PROCESSED_DIR,
+                                                  load_full=load_full)
+        logging.info(f"✓ Dataset consolidado guardado ({mode}): {output_path}")
         
-        # Guardar dataset actualizado
-        output_path = os.path.join(DATA_PROCESSED_DIR, "dataset_completo.csv")
-        df_final.to_csv(output_path, index=False)
-        logging.info(f"✓ Dataset consolidado guardado: {output_path}")
+        if mode == 'incremental':
+            logging.info(f"  → {len(df_final):,} filas nuevas o modificadas")
+            df_final = read_dataset("dataset_completo", data_dir=DATA_PROCESSED_DIR)
+        logging.info(f"💾 Dataset en memoria: {memory_mb(df_final):,.1f} MB")
         
         return df_final
     except ImportError as e:
@@ -177,15 +232,10 @@ def calculate_rfm(df):
     logging.info("\n📊 Calculando RFM actualizado...")
     
     current_date = df['order_date'].max() + pd.Timedelta(days=1)
-    rfm = df.groupby('customer_id').agg(
-        recency_days=('order_date', lambda date: (current_date - date.max()).days),
-        frequency=('order_id', 'nunique'),
-        monetary=('final_price', 'sum')
-    ).reset_index()
+    rfm = rfm_at(aggregate_customers(df), current_date, monetary_name='monetary').reset_index()
     
     # Guardar RFM actualizado
-    rfm_path = os.path.join(DATA_PROCESSED_DIR, "rfm_segments.csv")
-    rfm.to_csv(rfm_path, index=False)
+    rfm_path = write_dataset(rfm, "rfm_segments", csv_copy=True, data_dir=DATA_PROCESSED_DIR)
     logging.info(f"✓ RFM guardado: {rfm_path}")
     
     return rfm
@@ -214,8 +264,7 @@ def train_model_kmeans(rfm_df):
     
     # Guardar modelo
     model_path = os.path.join(MODELS_DIR, "kmeans_segmentation.pkl")
-    with open(model_path, 'wb') as f:
-        pickle.dump(kmeans, f)
+    save_model(kmeans, model_path)
     logging.info(f"✓ Modelo guardado: {model_path}")
     
     return kmeans
@@ -250,47 +299,56 @@ def train_model_xgboost_churn(df, rfm_df):
     
     # Guardar modelo
     model_path = os.path.join(MODELS_DIR, "xgboost_churn.pkl")
-    with open(model_path, 'wb') as f:
-        pickle.dump(model, f)
+    save_model(model, model_path)
     logging.info(f"✓ Modelo guardado: {model_path}")
     
     return model
 
-def train_model_prophet_demand(df):
-    """Re-entrenar Prophet para demanda"""
-    logging.info("\n3️⃣ Re-entrenando Prophet Demand...")
+def train_model_prophet_orders(df):
+    """Re-entrenar Prophet para demanda (pedidos diarios)"""
+    logging.info("\n3️⃣ Re-entrenando Prophet Demand (pedidos)...")
     
-    # Pedidos
     daily_orders = df.groupby('order_date').agg(
         y=('order_id', 'nunique')
     ).reset_index().rename(columns={'order_date': 'ds'})
     
     if daily_orders.empty:
         logging.error("❌ No hay datos diarios para Prophet")
-        return None, None
+        return None
     
     model_orders = Prophet(daily_seasonality=True, weekly_seasonality=True, yearly_seasonality=True)
     model_orders.fit(daily_orders)
     
     model_orders_path = os.path.join(MODELS_DIR, "prophet_demand.pkl")
-    with open(model_orders_path, 'wb') as f:
-        pickle.dump(model_orders, f)
+    save_model(model_orders, model_orders_path)
     logging.info(f"✓ Prophet Orders guardado: {model_orders_path}")
     
-    # Revenue
+    return model_orders
+
+def train_model_prophet_revenue(df):
+    """Re-entrenar Prophet para revenue diario"""
+    logging.info("\n3️⃣ Re-entrenando Prophet Demand (revenue)...")
+    
     daily_revenue = df.groupby('order_date').agg(
         y=('final_price', 'sum')
     ).reset_index().rename(columns={'order_date': 'ds'})
     
+    if daily_revenue.empty:
+        logging.error("❌ No hay datos diarios para Prophet")
+        return None
+    
     model_revenue = Prophet(daily_seasonality=True, weekly_seasonality=True, yearly_seasonality=True)
     model_revenue.fit(daily_revenue)
     
     model_revenue_path = os.path.join(MODELS_DIR, "prophet_revenue.pkl")
-    with open(model_revenue_path, 'wb') as f:
-        pickle.dump(model_revenue, f)
+    save_model(model_revenue, model_revenue_path)
     logging.info(f"✓ Prophet Revenue guardado: {model_revenue_path}")
     
-    return model_orders, model_revenue
+    return model_revenue
+
+def train_model_prophet_demand(df):
+    """Re-entrenar Prophet para demanda (pedidos y revenue, en orden)"""
+    return train_model_prophet_orders(df), train_model_prophet_revenue(df)
 
 def train_model_random_forest_routes(df):
     """Re-entrenar Random Forest para rutas"""
@@ -328,8 +386,7 @@ def train_model_random_forest_routes(df):
     
     # Guardar modelo
     model_path = os.path.join(MODELS_DIR, "random_forest_routes.pkl")
-    with open(model_path, 'wb') as f:
-        pickle.dump(model, f)
+    save_model(model, model_path)
     logging.info(f"✓ Modelo guardado: {model_path}")
     
     return model
@@ -380,16 +437,98 @@ def train_model_ridge_pricing(df, rfm_df):
     model_path = os.path.join(MODELS_DIR, "ridge_pricing.pkl")
     scaler_path = os.path.join(MODELS_DIR, "ridge_pricing_scaler_X.pkl")
     
-    with open(model_path, 'wb') as f:
-        pickle.dump(model, f)
-    with open(scaler_path, 'wb') as f:
-        pickle.dump(scaler_X, f)
+    save_model(model, model_path)
+    save_model(scaler_X, scaler_path)
     
     logging.info(f"✓ Modelo guardado: {model_path}")
     
     return model
 
-def generate_retrain_report(backup_path, metrics):
+# Columnas que usa cada modelo (cada proceso recibe solo lo necesario)
+PROPHET_COLUMNS = ['order_date', 'order_id', 'final_price']
+ROUTES_COLUMNS = ['latitude', 'longitude', 'distance_from_center', 'customer_type_customer', 'quantity']
+PRICING_COLUMNS = ['customer_id', 'final_price', 'customer_type_customer', 'quantity']
+COMMUNE_COLUMNS = ['order_date', 'order_id', 'delivery_commune']
+
+# Nombre del job → (etiqueta en el reporte, métrica)
+MODEL_LABELS = {
+    'kmeans': ("KMeans Segmentation", "Silhouette Score actualizado"),
+    'xgboost_churn': ("XGBoost Churn", "Accuracy actualizado"),
+    'prophet_orders': ("Prophet Demand", "MAE actualizado"),
+    'prophet_revenue': ("Prophet Revenue", "MAE actualizado"),
+    'random_forest_routes': ("Random Forest Routes", "R² actualizado"),
+    'ridge_pricing': ("Ridge Pricing", "MAE actualizado"),
+    'prophet_communes': ("Prophet por Comuna", "Forecast por comuna reconciliado"),
+}
+
+def _project(df, columns):
+    """Subconjunto de columnas presentes (el resto lo reporta el propio modelo)."""
+    return df[[column for column in columns if column in df.columns]]
+
+def train_models(df, rfm_df, max_workers=DEFAULT_TRAINING_WORKERS, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+    """
+    Re-entrenar todos los modelos con el scheduler de procesos.
+    
+    Los dos Prophet (los más lentos) van primero y en procesos separados.
+    
+    Returns:
+        dict: job → resultado del scheduler (status, seconds, peak_rss_mb, rss_delta_mb | error)
+    """
+    prophet_df = _project(df, PROPHET_COLUMNS)
+    routes_df = _project(df, ROUTES_COLUMNS)
+    pricing_df = _project(df, PRICING_COLUMNS)
+    
+    jobs = [
+        TrainingJob('prophet_orders', train_model_prophet_orders, (prophet_df,),
+                    memory_mb=estimate_memory_mb(prophet_df, base_mb=400), priority=10),
+        TrainingJob('prophet_revenue', train_model_prophet_revenue, (prophet_df,),
+                    memory_mb=estimate_memory_mb(prophet_df, base_mb=400), priority=10),
+        TrainingJob('random_forest_routes', train_model_random_forest_routes, (routes_df,),
+                    memory_mb=estimate_memory_mb(routes_df, factor=6), priority=5),
+        TrainingJob('ridge_pricing', train_model_ridge_pricing, (pricing_df, rfm_df),
+                    memory_mb=estimate_memory_mb(pricing_df, rfm_df, factor=4), priority=3),
+        TrainingJob('xgboost_churn', train_model_xgboost_churn, (None, rfm_df),
+                    memory_mb=estimate_memory_mb(rfm_df), priority=2),
+        TrainingJob('kmeans', train_model_kmeans, (rfm_df,),
+                    memory_mb=estimate_memory_mb(rfm_df), priority=1),
+    ]
+    
+    logging.info("\n============================================================")
+    logging.info("🏋️ RE-ENTRENANDO MODELOS")
+    logging.info("============================================================")
+    return TrainingScheduler(max_workers=max_workers, memory_budget_mb=memory_budget_mb).run(jobs)
+
+def train_communes(df, training, max_workers=DEFAULT_TRAINING_WORKERS, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+    """
+    Forecast por comuna (un Prophet por comuna en paralelo), reconciliado con el
+    Prophet global recién entrenado.
+    
+    Returns:
+        dict: Resultado en el formato del scheduler (para el reporte)
+    """
+    if training.get('prophet_orders', {}).get('status') != 'ok':
+        logging.warning("⚠️ Forecast por comuna omitido: Prophet Demand no se entrenó")
+        return {'status': 'empty'}
+    
+    logging.info("\n============================================================")
+    logging.info("🏘️ FORECAST POR COMUNA")
+    logging.info("============================================================")
+    try:
+        return train_commune_forecasts(_project(df, COMMUNE_COLUMNS), models_dir=MODELS_DIR,
+                                       max_workers=max_workers, memory_budget_mb=memory_budget_mb)
+    except Exception as e:
+        logging.error(f"❌ Forecast por comuna: {e}")
+        return {'status': 'failed', 'error': str(e)}
+
+def build_metrics(results):
+    """Métricas del reporte para los modelos entrenados con éxito."""
+    return {
+        MODEL_LABELS[name][0]: MODEL_LABELS[name][1]
+        for name, info in results.items()
+        if info['status'] == 'ok'
+    }
+
+def generate_retrain_report(backup_path, metrics, extraction=None, training=None):
     """Generar reporte de re-entrenamiento"""
     logging.info("\n============================================================")
     logging.info("📄 GENERANDO REPORTE")
@@ -401,6 +540,24 @@ def generate_retrain_report(backup_path, metrics):
         f.write("# Reporte de Re-entrenamiento\n\n")
         f.write(f"**Fecha:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
         f.write(f"**Backup creado:** `{backup_path}`\n\n")
+        
+        if extraction:
+            f.write("## Extracción de Datos\n\n")
+            f.write("| Tabla | Estado | Filas | Tiempo (s) |\n")
+            f.write("|-------|--------|-------|------------|\n")
+            for table, info in extraction.items():
+                f.write(f"| {table} | {info['status']} | {info['rows']:,} | {info['seconds']} |\n")
+            f.write("\n")
+        
+        if training:
+            f.write("## Entrenamiento\n\n")
+            f.write("| Modelo | Estado | Tiempo (s) | Memoria pico (MB) |\n")
+            f.write("|--------|--------|------------|-------------------|\n")
+            for name, info in training.items():
+                f.write(f"| {name} | {info['status']} | {info.get('seconds', '-')} | "
+                        f"{info.get('peak_rss_mb', info.get('error', '-'))} |\n")
+            f.write("\n")
+        
         f.write("## Modelos Actualizados\n\n")
         
         for model_name, metric in metrics.items():
@@ -408,14 +565,14 @@ def generate_retrain_report(backup_path, metrics):
             f.write(f"- Métrica: {metric}\n\n")
         
         f.write("\n## Próximos Pasos\n\n")
-        f.write("1. Reiniciar API ML: `cd /opt/cane/3t/ml && ./START_API.sh`\n")
+        f.write("1. La API ML recarga los modelos en caliente (verificar `/health` → `last_model_reload`)\n")
         f.write("2. Verificar predicciones en dashboard: http://localhost:3000/ml-insights\n")
         f.write("3. Monitorear logs de la API\n\n")
     
     logging.info(f"✓ Reporte guardado: {report_path}")
     return report_path
 
-def main():
+def main(incremental=False):
     """Pipeline principal de re-entrenamiento"""
     logging.info("\n╔==========================================================╗")
     logging.info("║         PIPELINE DE RE-ENTRENAMIENTO AUTOMÁTICO         ║")
@@ -426,40 +583,29 @@ def main():
         # 1. Backup de modelos actuales
         backup_path = backup_models()
         
-        # 2. Extraer datos actualizados
-        raw_data = extract_data_from_supabase()
+        # 2. Extraer datos actualizados (incremental: solo pedidos desde el watermark,
+        #    en data/raw/incremental para no pisar las tablas completas)
+        since = incremental_since(DATA_PROCESSED_DIR) if incremental else None
+        load_full = None
+        if since:
+            raw_data, extraction = extract_data_from_supabase(since, raw_dir=os.path.join(DATA_RAW_DIR, "incremental"))
+            load_full = lambda: extract_data_from_supabase()[0]
+        else:
+            raw_data, extraction = extract_data_from_supabase()
         
         # 3. Consolidar y feature engineering
-        df_consolidated = consolidate_and_engineer_features(raw_data)
+        df_consolidated = consolidate_and_engineer_features(raw_data, incremental=incremental, load_full=load_full)
         
         # 4. Calcular RFM actualizado
         rfm_df = calculate_rfm(df_consolidated)
         
-        # 5. Re-entrenar modelos
-        metrics = {}
-        
-        kmeans_model = train_model_kmeans(rfm_df)
-        if kmeans_model:
-            metrics["KMeans Segmentation"] = "Silhouette Score actualizado"
-        
-        xgboost_model = train_model_xgboost_churn(df_consolidated, rfm_df)
-        if xgboost_model:
-            metrics["XGBoost Churn"] = "Accuracy actualizado"
-        
-        prophet_orders, prophet_revenue = train_model_prophet_demand(df_consolidated)
-        if prophet_orders and prophet_revenue:
-            metrics["Prophet Demand"] = "MAE actualizado"
-        
-        rf_model = train_model_random_forest_routes(df_consolidated)
-        if rf_model:
-            metrics["Random Forest Routes"] = "R² actualizado"
-        
-        ridge_model = train_model_ridge_pricing(df_consolidated, rfm_df)
-        if ridge_model:
-            metrics["Ridge Pricing"] = "MAE actualizado"
+        # 5. Re-entrenar modelos (independientes entre sí → pool de procesos)
+        training = train_models(df_consolidated, rfm_df)
+        training['prophet_communes'] = train_communes(df_consolidated, training)
+        metrics = build_metrics(training)
         
         # 6. Generar reporte
-        report_path = generate_retrain_report(backup_path, metrics)
+        report_path = generate_retrain_report(backup_path, metrics, extraction, training)
         
         logging.info("\n============================================================")
         logging.info("✅ RE-ENTRENAMIENTO COMPLETADO EXITOSAMENTE")
@@ -467,8 +613,9 @@ def main():
         logging.info(f"\n📊 Modelos actualizados: {len(metrics)}")
         logging.info(f"📄 Reporte: {report_path}")
         logging.info(f"💾 Backup: {backup_path}")
-        logging.info("\n🚀 Reinicia la API ML para usar los nuevos modelos:")
-        logging.info("   cd /opt/cane/3t/ml && ./START_API.sh")
+        
+        # 7. Recarga en caliente de la API (sin reinicio)
+        notify_api_reload()
         
         return True
     
@@ -478,5 +625,10 @@ def main():
         raise
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    parser = argparse.ArgumentParser(description="Re-entrenamiento automático de modelos ML")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Consolidar solo pedidos nuevos o modificados desde la última corrida")
+    args = parser.parse_args()
+    main(incremental=args.incremental)
 
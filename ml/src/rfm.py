@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================
+RFM POR CLIENTE (VECTORIZADO)
+Sistema ML Agua Tres Torres
+============================================
+Cálculo único de Recency, Frequency y Monetary que usan la consolidación,
+el re-entrenamiento y el EDA:
+
+- Agregados por cliente con reducciones nativas de groupby
+  (max de order_date, nunique de order_id, sum de final_price)
+- Recency como resta vectorizada contra la fecha de corte (sin lambdas
+  por cliente)
+- Actualización incremental de los agregados:
+    * merge_new_orders: pedidos nuevos (append) → O(pedidos nuevos)
+    * replace_customers: historial completo de clientes afectados
+      (cubre pedidos modificados o eliminados)
+
+Uso:
+    >>> aggregates = aggregate_customers(orders)
+    >>> rfm = rfm_at(aggregates, reference_date=orders['order_date'].max())
+    >>> orders = join_rfm(orders, aggregates)   # RFM por fila, una sola fecha de corte
+    >>> aggregates = merge_new_orders(aggregates, new_orders)
+
+Benchmark (lambda vs vectorizado, 10k/100k/1M pedidos):
+    python src/rfm.py --benchmark
+"""
+
+import time
+import argparse
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Columnas de los agregados por cliente (independientes de la fecha de corte)
+AGGREGATE_COLUMNS = ['last_order_date', 'frequency', 'monetary_total']
+BENCHMARK_SIZES = [10_000, 100_000, 1_000_000]
+
+
+def aggregate_customers(orders: pd.DataFrame,
+                        customer_column: str = 'customer_id',
+                        date_column: str = 'order_date',
+                        order_column: str = 'order_id',
+                        amount_column: str = 'final_price') -> pd.DataFrame:
+    """
+    Agregados RFM por cliente (sin recency, que depende de la fecha de corte).
+
+    Args:
+        orders: Pedidos (una o más filas por pedido)
+        customer_column: Columna de cliente
+        date_column: Columna de fecha del pedido
+        order_column: Columna de id de pedido (frequency = pedidos distintos)
+        amount_column: Columna de monto
+
+    Returns:
+        DataFrame indexado por cliente con last_order_date, frequency y monetary_total
+    """
+    grouped = orders.groupby(customer_column)
+    aggregates = pd.DataFrame({
+        'last_order_date': grouped[date_column].max(),
+        'frequency': grouped[order_column].nunique(),
+        'monetary_total': grouped[amount_column].sum(),
+    })
+    aggregates.index.name = customer_column
+    return aggregates
+
+
+def rfm_at(aggregates: pd.DataFrame,
+           reference_date,
+           monetary_name: str = 'monetary_total') -> pd.DataFrame:
+    """
+    Columnas RFM a una fecha de corte.
+
+    Args:
+        aggregates: Resultado de aggregate_customers
+        reference_date: Fecha de corte para recency
+        monetary_name: Nombre de la columna monetaria en la salida
+
+    Returns:
+        DataFrame indexado por cliente con recency_days, frequency y <monetary_name>
+    """
+    recency = (pd.Timestamp(reference_date) - aggregates['last_order_date']).dt.days
+    return pd.DataFrame({
+        'recency_days': recency,
+        'frequency': aggregates['frequency'],
+        monetary_name: aggregates['monetary_total'],
+    }, index=aggregates.index)
+
+
+def join_rfm(orders: pd.DataFrame,
+             aggregates: pd.DataFrame,
+             reference_date=None,
+             monetary_name: str = 'monetary_total') -> pd.DataFrame:
+    """
+    Agregar las columnas RFM de cada cliente a sus filas de pedidos.
+
+    Todas las filas usan la misma fecha de corte, así un cliente tiene los
+    mismos valores RFM en todos sus pedidos.
+
+    Args:
+        orders: Pedidos con customer_id
+        aggregates: Resultado de aggregate_customers (indexado por customer_id)
+        reference_date: Fecha de corte (default: última compra registrada)
+        monetary_name: Nombre de la columna monetaria en la salida
+
+    Returns:
+        DataFrame `orders` con recency_days, frequency y <monetary_name>
+    """
+    if reference_date is None:
+        reference_date = aggregates['last_order_date'].max()
+    rfm = rfm_at(aggregates, reference_date, monetary_name)
+    return orders.merge(rfm, on='customer_id', how='left', suffixes=('', '_rfm'))
+
+
+def calculate_rfm(orders: pd.DataFrame,
+                  reference_date=None,
+                  monetary_name: str = 'monetary_total') -> pd.DataFrame:
+    """
+    RFM por cliente en un paso.
+
+    Args:
+        orders: Pedidos con customer_id, order_id, order_date y final_price
+        reference_date: Fecha de corte (default: último order_date)
+        monetary_name: Nombre de la columna monetaria en la salida
+
+    Returns:
+        DataFrame indexado por customer_id con recency_days, frequency y monetario
+    """
+    if reference_date is None:
+        reference_date = orders['order_date'].max()
+    return rfm_at(aggregate_customers(orders), reference_date, monetary_name)
+
+
+def merge_new_orders(aggregates: pd.DataFrame, new_orders: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sumar pedidos NUEVOS a los agregados existentes (append-only).
+
+    Solo procesa `new_orders`: last_order_date = max, frequency y
+    monetary_total se suman. Los pedidos no deben estar ya contados en
+    `aggregates` (para pedidos modificados usar replace_customers).
+
+    Args:
+        aggregates: Agregados actuales (indexados por customer_id)
+        new_orders: Pedidos nuevos
+
+    Returns:
+        DataFrame con los agregados actualizados
+    """
+    delta = aggregate_customers(new_orders)
+    combined = aggregates.reindex(aggregates.index.union(delta.index))
+    current = combined.loc[delta.index]
+    combined.loc[delta.index, 'last_order_date'] = np.maximum(
+        current['last_order_date'].fillna(delta['last_order_date']), delta['last_order_date']
+    )
+    combined.loc[delta.index, 'frequency'] = current['frequency'].fillna(0) + delta['frequency']
+    combined.loc[delta.index, 'monetary_total'] = current['monetary_total'].fillna(0) + delta['monetary_total']
+    return combined.astype({'frequency': aggregates['frequency'].dtype})
+
+
+def replace_customers(aggregates: pd.DataFrame, customer_orders: pd.DataFrame,
+                      customers: Optional[List] = None) -> pd.DataFrame:
+    """
+    Recalcular los agregados de los clientes presentes en `customer_orders`.
+
+    `customer_orders` debe traer el historial COMPLETO de esos clientes; el
+    resto de los clientes conserva sus agregados.
+
+    Args:
+        aggregates: Agregados actuales (indexados por customer_id)
+        customer_orders: Historial completo de los clientes afectados
+        customers: Clientes afectados (default: los de customer_orders). Los
+            que ya no tienen pedidos (ej: un pedido que cambió de cliente)
+            salen de los agregados
+
+    Returns:
+        DataFrame con los agregados actualizados
+    """
+    refreshed = aggregate_customers(customer_orders)
+    replaced = refreshed.index.union(pd.Index(customers if customers is not None else []))
+    kept = aggregates[~aggregates.index.isin(replaced)]
+    return pd.concat([kept, refreshed])
+
+
+# ============================================
+# BENCHMARK
+# ============================================
+
+def _synthetic_orders(n_orders: int, seed: int = 42) -> pd.DataFrame:
+    """Pedidos sintéticos (≈10 pedidos por cliente en 2 años)."""
+    rng = np.random.default_rng(seed)
+    n_customers = max(1, n_orders // 10)
+    return pd.DataFrame({
+        'order_id': np.arange(n_orders),
+        'customer_id': rng.integers(0, n_customers, n_orders).astype(str),
+        'order_date': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 730, n_orders), unit='D'),
+        'final_price': rng.integers(2_000, 60_000, n_orders).astype(float),
+    })
+
+
+def _lambda_rfm(orders: pd.DataFrame, reference_date) -> pd.DataFrame:
+    """Implementación anterior (lambda por cliente), solo para comparar."""
+    return orders.groupby('customer_id').agg(
+        recency_days=('order_date', lambda date: (reference_date - date.max()).days),
+        frequency=('order_id', 'nunique'),
+        monetary_total=('final_price', 'sum')
+    )
+
+
+def _timeit(func, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark(sizes: Optional[List[int]] = None) -> pd.DataFrame:
+    """
+    Comparar lambda vs vectorizado (y la actualización incremental).
+
+    La actualización incremental agrega el último 1% de los pedidos a los
+    agregados del 99% restante.
+
+    Args:
+        sizes: Cantidades de pedidos (default: 10k, 100k, 1M)
+
+    Returns:
+        DataFrame con tiempos (segundos) y speedup por tamaño
+    """
+    rows = []
+    for n_orders in sizes or BENCHMARK_SIZES:
+        orders = _synthetic_orders(n_orders)
+        reference_date = orders['order_date'].max()
+
+        # Mismos resultados con ambas implementaciones
+        expected = _lambda_rfm(orders, reference_date)
+        result = calculate_rfm(orders, reference_date)
+        pd.testing.assert_frame_equal(expected, result[expected.columns], check_dtype=False)
+
+        split = int(n_orders * 0.99)
+        base = aggregate_customers(orders.iloc[:split])
+        new_orders = orders.iloc[split:]
+        pd.testing.assert_frame_equal(
+            merge_new_orders(base, new_orders).sort_index(), aggregate_customers(orders), check_dtype=False
+        )
+
+        lambda_s = _timeit(lambda: _lambda_rfm(orders, reference_date))
+        vectorized_s = _timeit(lambda: calculate_rfm(orders, reference_date))
+        incremental_s = _timeit(lambda: merge_new_orders(base, new_orders))
+        rows.append({
+            'orders': n_orders,
+            'customers': len(result),
+            'lambda_s': round(lambda_s, 4),
+            'vectorized_s': round(vectorized_s, 4),
+            'speedup': round(lambda_s / vectorized_s, 1),
+            'incremental_1pct_s': round(incremental_s, 4),
+        })
+        print(f"✓ {n_orders:>9,} pedidos: lambda {lambda_s:.3f}s | vectorizado {vectorized_s:.3f}s "
+              f"({lambda_s / vectorized_s:.1f}x) | incremental 1% {incremental_s:.3f}s")
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RFM vectorizado por cliente")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Comparar lambda vs vectorizado con pedidos sintéticos")
+    parser.add_argument("--sizes", type=int, nargs="+", default=BENCHMARK_SIZES,
+                        help="Cantidades de pedidos del benchmark")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print("\n" + "="*60)
+        print("⏱️ BENCHMARK RFM (lambda vs vectorizado)")
+        print("="*60)
+        print("\n" + benchmark(args.sizes).to_string(index=False))
+    else:
+        parser.print_help()
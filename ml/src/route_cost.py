@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================
+COSTO DE ENTREGA POR PARADA (VECTORIZADO)
+Sistema ML Agua Tres Torres
+============================================
+Features y scoring del modelo Random Forest de rutas para N paradas
+a la vez: un solo DataFrame de features y un solo `model.predict`.
+
+Lo usan /predict/route-cost (1 parada) y /predict/route-cost/batch
+(el día completo), así ambos endpoints calculan lo mismo.
+
+Uso:
+    >>> X = route_features(lats, lons, quantities, customer_types)
+    >>> scored = score_stops(model, X)
+"""
+
+from typing import Any, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Centro de referencia (Santiago) y conversión aproximada grados → km
+CENTER_LAT = -33.45
+CENTER_LON = -70.65
+KM_PER_DEGREE = 111
+
+AVG_SPEED_KMH = 40          # velocidad promedio de reparto
+MIN_DELIVERY_HOURS = 0.5    # tiempo mínimo de entrega
+
+# Prioridad por distancia al centro: < 10 km alta, < 30 km media, resto baja
+PRIORITY_LEVELS = ((10, "alta"), (30, "media"))
+DEFAULT_PRIORITY = "baja"
+
+FEATURE_COLUMNS = ['latitude', 'longitude', 'quantity', 'customer_type_encoded', 'distance_from_center']
+
+
+def route_features(latitude: Sequence[float], longitude: Sequence[float],
+                   quantity: Sequence[int], customer_type: Sequence[str]) -> pd.DataFrame:
+    """
+    Features del modelo de rutas para N paradas.
+
+    Args:
+        latitude: Latitud de cada parada
+        longitude: Longitud de cada parada
+        quantity: Unidades por parada
+        customer_type: 'Hogar' o 'Empresa' por parada
+
+    Returns:
+        DataFrame con FEATURE_COLUMNS (distance_from_center en grados)
+    """
+    lat = np.asarray(latitude, dtype=float)
+    lon = np.asarray(longitude, dtype=float)
+    return pd.DataFrame({
+        'latitude': lat,
+        'longitude': lon,
+        'quantity': np.asarray(quantity),
+        'customer_type_encoded': (np.asarray(customer_type, dtype=object) == "Empresa").astype(int),
+        'distance_from_center': np.sqrt((lat - CENTER_LAT) ** 2 + (lon - CENTER_LON) ** 2),
+    })
+
+
+def score_stops(model: Any, features: pd.DataFrame) -> pd.DataFrame:
+    """
+    Costo, distancia, tiempo estimado y prioridad de cada parada.
+
+    Args:
+        model: RandomForestRegressor de rutas
+        features: Resultado de route_features
+
+    Returns:
+        DataFrame con estimated_cost, distance_from_center_km,
+        delivery_time_estimate_hours y priority_level (una fila por parada)
+    """
+    columns = list(getattr(model, 'feature_names_in_', FEATURE_COLUMNS))
+    cost = model.predict(features[columns]) if len(features) else np.empty(0)
+
+    distance_km = features['distance_from_center'].to_numpy() * KM_PER_DEGREE
+    priority = np.select(
+        [distance_km < limit for limit, _ in PRIORITY_LEVELS],
+        [level for _, level in PRIORITY_LEVELS],
+        default=DEFAULT_PRIORITY
+    )
+    return pd.DataFrame({
+        'estimated_cost': np.asarray(cost, dtype=float),
+        'distance_from_center_km': distance_km,
+        'delivery_time_estimate_hours': np.maximum(MIN_DELIVERY_HOURS, distance_km / AVG_SPEED_KMH),
+        'priority_level': priority,
+    })
@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================
+OPTIMIZACIÓN DE RUTAS DE REPARTO
+Sistema ML Agua Tres Torres
+============================================
+Planificación de las entregas del día por camión:
+
+1. haversine_matrix: distancias reales (km) entre depósito y paradas,
+   vectorizado con NumPy (sin loops por par)
+2. nearest_neighbor_routes: rutas iniciales por vecino más cercano con
+   capacidad de camión (cada ruta es un viaje desde y hacia el depósito)
+3. Mejora local:
+   - two_opt: invierte tramos que se cruzan dentro de una ruta
+   - or_opt: mueve tramos de 1-3 paradas a otra posición de la ruta
+   - relocate: mueve paradas a otra ruta con capacidad disponible
+4. Viajes asignados a camiones (el camión menos cargado toma el viaje
+   más largo) y ETA por parada desde la salida del camión en la mañana
+   (viajes anteriores del camión + recarga en el depósito + manejo a
+   velocidad promedio + tiempo de servicio)
+
+Las paradas del día salen de dataset_completo (pedidos con las
+coordenadas de 3t_addresses) o se reciben directamente.
+
+Uso:
+    >>> stops, skipped = day_orders('2025-06-10')
+    >>> plan = plan_routes(stops, capacity=100, vehicles=3)
+    python src/route_optimizer.py --date 2025-06-10 --capacity 100 --vehicles 3
+    python src/route_optimizer.py --benchmark --sizes 50 200 1000
+"""
+
+import os
+import sys
+import time
+import argparse
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from src.route_cost import AVG_SPEED_KMH, CENTER_LAT, CENTER_LON
+except ImportError:
+    from route_cost import AVG_SPEED_KMH, CENTER_LAT, CENTER_LON
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Configuración por variables de entorno
+DEPOT_LAT = float(os.getenv("ROUTE_DEPOT_LAT", str(CENTER_LAT)))
+DEPOT_LON = float(os.getenv("ROUTE_DEPOT_LON", str(CENTER_LON)))
+DEFAULT_VEHICLE_CAPACITY = int(os.getenv("ROUTE_VEHICLE_CAPACITY", "100"))   # unidades por viaje
+SERVICE_MINUTES = float(os.getenv("ROUTE_SERVICE_MINUTES", "5"))             # tiempo por parada
+RELOAD_MINUTES = float(os.getenv("ROUTE_RELOAD_MINUTES", "15"))              # recarga entre viajes
+DEFAULT_TIME_LIMIT_SECONDS = float(os.getenv("ROUTE_TIME_LIMIT_SECONDS", "10"))
+
+BENCHMARK_SIZES = [50, 200, 1000]
+
+# Mejoras menores a esto (km) se ignoran (evita ciclos por redondeo)
+_EPS = 1e-9
+
+
+def haversine_matrix(latitude: Sequence[float], longitude: Sequence[float]) -> np.ndarray:
+    """
+    Matriz de distancias haversine (km) entre todos los puntos.
+
+    Args:
+        latitude: Latitudes en grados
+        longitude: Longitudes en grados
+
+    Returns:
+        np.ndarray (n, n) simétrica con diagonal 0
+    """
+    lat = np.radians(np.asarray(latitude, dtype=float))
+    lon = np.radians(np.asarray(longitude, dtype=float))
+    dlat = lat[:, None] - lat[None, :]
+    dlon = lon[:, None] - lon[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def route_distance(route: Sequence[int], dist: np.ndarray) -> float:
+    """Distancia total (km) de una ruta de nodos (incluye el depósito en los extremos)."""
+    nodes = np.asarray(route)
+    return float(dist[nodes[:-1], nodes[1:]].sum())
+
+
+def nearest_neighbor_routes(dist: np.ndarray, demand: np.ndarray, capacity: float) -> List[List[int]]:
+    """
+    Rutas iniciales por vecino más cercano con capacidad.
+
+    El nodo 0 es el depósito. Cada ruta sale del depósito, visita la parada
+    más cercana que aún cabe en el camión y vuelve cuando no cabe ninguna.
+
+    Args:
+        dist: Matriz de distancias (nodo 0 = depósito)
+        demand: Unidades por nodo (demand[0] = 0)
+        capacity: Capacidad por viaje
+
+    Returns:
+        Lista de rutas [0, ..., 0]
+
+    Raises:
+        ValueError: Si una parada sola excede la capacidad
+    """
+    if (demand[1:] > capacity).any():
+        raise ValueError(f"Hay paradas con más de {capacity:g} unidades (capacidad del camión)")
+
+    unvisited = np.ones(len(demand), dtype=bool)
+    unvisited[0] = False
+    routes = []
+    while unvisited.any():
+        route, load, current = [0], 0.0, 0
+        while True:
+            feasible = unvisited & (demand <= capacity - load)
+            if not feasible.any():
+                break
+            current = int(np.where(feasible, dist[current], np.inf).argmin())
+            route.append(current)
+            unvisited[current] = False
+            load += demand[current]
+        routes.append(route + [0])
+    return routes
+
+
+def two_opt(route: List[int], dist: np.ndarray, deadline: float = np.inf) -> Tuple[List[int], bool]:
+    """
+    2-opt dentro de una ruta: para cada arista, la mejor inversión de tramo
+    (deltas de todos los cortes calculados como array).
+
+    Returns:
+        Tupla (ruta mejorada, hubo mejora)
+    """
+    r = np.asarray(route)
+    improved_any = False
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(1, len(r) - 2):
+            a, b = r[i - 1], r[i]
+            c, e = r[i + 1:-1], r[i + 2:]
+            delta = dist[a, c] + dist[b, e] - dist[a, b] - dist[c, e]
+            k = int(delta.argmin())
+            if delta[k] < -_EPS:
+                j = i + 1 + k
+                r[i:j + 1] = r[i:j + 1][::-1].copy()
+                improved = improved_any = True
+    return r.tolist(), improved_any
+
+
+def or_opt(route: List[int], dist: np.ndarray, max_segment: int = 3,
+           deadline: float = np.inf) -> Tuple[List[int], bool]:
+    """
+    Or-opt dentro de una ruta: mover tramos de 1..max_segment paradas (en
+    cualquier sentido) a la posición más barata de la misma ruta.
+
+    Returns:
+        Tupla (ruta mejorada, hubo mejora)
+    """
+    r = np.asarray(route)
+    improved_any = False
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for length in range(1, max_segment + 1):
+            i = 1
+            while i + length <= len(r) - 1:
+                segment = r[i:i + length]
+                p, s0, s1, nx = r[i - 1], segment[0], segment[-1], r[i + length]
+                gain = dist[p, s0] + dist[s1, nx] - dist[p, nx]
+                rest = np.concatenate([r[:i], r[i + length:]])
+                u, v = rest[:-1], rest[1:]
+                forward = dist[u, s0] + dist[s1, v] - dist[u, v]
+                backward = dist[u, s1] + dist[s0, v] - dist[u, v]
+                forward[i - 1] = backward[i - 1] = np.inf   # posición original
+                k_fwd, k_bwd = int(forward.argmin()), int(backward.argmin())
+                if min(forward[k_fwd], backward[k_bwd]) < gain - _EPS:
+                    if forward[k_fwd] <= backward[k_bwd]:
+                        k, moved = k_fwd, segment
+                    else:
+                        k, moved = k_bwd, segment[::-1]
+                    r = np.concatenate([rest[:k + 1], moved, rest[k + 1:]])
+                    improved = improved_any = True
+                else:
+                    i += 1
+    return r.tolist(), improved_any
+
+
+def relocate(routes: List[List[int]], dist: np.ndarray, demand: np.ndarray, capacity: float,
+             deadline: float = np.inf) -> Tuple[List[List[int]], bool]:
+    """
+    Mover paradas individuales a otra ruta con capacidad disponible, en la
+    posición más barata (inserción evaluada sobre todas las aristas a la vez).
+
+    Las rutas que quedan vacías se eliminan (un viaje menos).
+
+    Returns:
+        Tupla (rutas, hubo mejora)
+    """
+    routes = [list(route) for route in routes]
+    loads = [float(demand[route].sum()) for route in routes]
+    improved_any = False
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        # Aristas de todas las rutas: (u, v, ruta, posición de inserción)
+        edges = [(route[k], route[k + 1], ri, k + 1) for ri, route in enumerate(routes) for k in range(len(route) - 1)]
+        u, v, owner, position = (np.array(column) for column in zip(*edges))
+        for ri in range(len(routes)):
+            k = 1
+            while k < len(routes[ri]) - 1:
+                route = routes[ri]
+                p, s, nx = route[k - 1], route[k], route[k + 1]
+                gain = dist[p, s] + dist[s, nx] - dist[p, nx]
+                spare = np.array(loads)[owner] + demand[s] <= capacity
+                cost = np.where(spare & (owner != ri), dist[u, s] + dist[s, v] - dist[u, v], np.inf)
+                best = int(cost.argmin())
+                if cost[best] < gain - _EPS:
+                    target = int(owner[best])
+                    routes[target].insert(int(position[best]), route.pop(k))
+                    loads[target] += demand[s]
+                    loads[ri] -= demand[s]
+                    improved = improved_any = True
+                    break
+                k += 1
+            if improved:
+                break
+    return [route for route in routes if len(route) > 2], improved_any
+
+
+def improve_routes(routes: List[List[int]], dist: np.ndarray, demand: np.ndarray, capacity: float,
+                   time_limit: float = DEFAULT_TIME_LIMIT_SECONDS) -> List[List[int]]:
+    """
+    Búsqueda local hasta no encontrar mejoras o agotar el tiempo:
+    2-opt y or-opt por ruta, luego relocate entre rutas.
+
+    Args:
+        routes: Rutas iniciales (nearest_neighbor_routes)
+        dist: Matriz de distancias
+        demand: Unidades por nodo
+        capacity: Capacidad por viaje
+        time_limit: Segundos máximos
+
+    Returns:
+        Rutas mejoradas (misma capacidad respetada)
+    """
+    deadline = time.perf_counter() + time_limit
+    dirty = set(range(len(routes)))
+    while time.perf_counter() < deadline:
+        for ri in sorted(dirty):
+            routes[ri], _ = two_opt(routes[ri], dist, deadline)
+            routes[ri], _ = or_opt(routes[ri], dist, deadline=deadline)
+        before = [list(route) for route in routes]
+        routes, moved = relocate(routes, dist, demand, capacity, deadline)
+        if not moved:
+            break
+        previous = {tuple(route) for route in before}
+        dirty = {ri for ri, route in enumerate(routes) if tuple(route) not in previous}
+    return routes
+
+
+def assign_vehicles(durations: Sequence[float], vehicles: Optional[int],
+                    reload_minutes: float = RELOAD_MINUTES) -> List[Tuple[int, int, float]]:
+    """
+    Asignar viajes a camiones: el viaje más largo al camión menos ocupado.
+
+    Cada camión lleva un reloj: sus viajes se ejecutan en el orden en que
+    se le asignan (trip 1, 2, ...) y cada uno sale cuando termina el
+    anterior más la recarga en el depósito.
+
+    Args:
+        durations: Minutos de cada viaje
+        vehicles: Camiones disponibles (None = un camión por viaje)
+        reload_minutes: Minutos en el depósito entre dos viajes del mismo camión
+
+    Returns:
+        Lista (camión, número de viaje del camión, minuto de salida) por
+        viaje; camión y viaje desde 1, salida desde el inicio de la jornada
+    """
+    if not vehicles:
+        return [(i + 1, 1, 0.0) for i in range(len(durations))]
+    clock = np.zeros(vehicles)
+    trips = np.zeros(vehicles, dtype=int)
+    assignment: List[Tuple[int, int, float]] = [(0, 0, 0.0)] * len(durations)
+    for index in np.argsort(durations, kind='stable')[::-1]:
+        vehicle = int(clock.argmin())
+        trips[vehicle] += 1
+        assignment[index] = (vehicle + 1, int(trips[vehicle]), float(clock[vehicle]))
+        clock[vehicle] += durations[index] + reload_minutes
+    return assignment
+
+
+def plan_routes(stops: pd.DataFrame,
+                depot: Tuple[float, float] = (DEPOT_LAT, DEPOT_LON),
+                capacity: float = DEFAULT_VEHICLE_CAPACITY,
+                vehicles: Optional[int] = None,
+                improve: bool = True,
+                time_limit: float = DEFAULT_TIME_LIMIT_SECONDS) -> Dict[str, Any]:
+    """
+    Planificar las rutas del día.
+
+    Args:
+        stops: Paradas con latitude, longitude, quantity (y stop_id u otras
+            columnas, que se devuelven tal cual)
+        depot: (lat, lon) del depósito
+        capacity: Unidades por viaje
+        vehicles: Camiones disponibles (los viajes se reparten entre ellos;
+            None = un camión por viaje)
+        improve: Aplicar 2-opt / or-opt / relocate sobre el vecino más cercano
+        time_limit: Segundos máximos de mejora
+
+    Returns:
+        dict con 'routes' (por viaje: camión, número de viaje, minuto de
+        salida y regreso, paradas ordenadas con km y arrival_minutes) y
+        'summary' (distancias, viajes, mejora vs vecino más cercano, tiempos).
+        arrival_minutes y start/end_minutes se cuentan desde la salida del
+        camión en la mañana, incluyendo sus viajes anteriores y recargas.
+    """
+    start = time.perf_counter()
+    stops = stops.reset_index(drop=True)
+    dist = haversine_matrix(
+        np.concatenate([[depot[0]], stops['latitude'].to_numpy(dtype=float)]),
+        np.concatenate([[depot[1]], stops['longitude'].to_numpy(dtype=float)])
+    )
+    demand = np.concatenate([[0.0], stops['quantity'].to_numpy(dtype=float)])
+    matrix_ms = (time.perf_counter() - start) * 1000
+
+    routes = nearest_neighbor_routes(dist, demand, capacity)
+    initial_km = sum(route_distance(route, dist) for route in routes)
+    if improve and len(stops) > 1:
+        routes = improve_routes(routes, dist, demand, capacity, time_limit)
+
+    trips = []
+    for route in routes:
+        nodes = np.asarray(route)
+        legs = dist[nodes[:-1], nodes[1:]]
+        cumulative = np.cumsum(legs)
+        # ETA dentro del viaje: manejo acumulado + servicio en las paradas anteriores
+        arrival = cumulative[:-1] / AVG_SPEED_KMH * 60 + SERVICE_MINUTES * np.arange(len(nodes) - 2)
+        duration = cumulative[-1] / AVG_SPEED_KMH * 60 + SERVICE_MINUTES * (len(nodes) - 2)
+        trips.append((nodes, legs, cumulative, arrival, duration))
+
+    durations = [trip[4] for trip in trips]
+    plans = []
+    for (nodes, legs, cumulative, arrival, duration), (vehicle, trip, departure) in zip(
+            trips, assign_vehicles(durations, vehicles)):
+        ordered = stops.iloc[nodes[1:-1] - 1].assign(
+            sequence=np.arange(1, len(nodes) - 1),
+            leg_km=np.round(legs[:-1], 2),
+            cumulative_km=np.round(cumulative[:-1], 2),
+            arrival_minutes=np.round(departure + arrival, 1),
+        )
+        plans.append({
+            'vehicle': vehicle,
+            'trip': trip,
+            'stops': ordered.to_dict(orient='records'),
+            'load': float(demand[nodes].sum()),
+            'distance_km': round(float(cumulative[-1]), 2),
+            'duration_minutes': round(float(duration), 1),
+            'start_minutes': round(departure, 1),
+            'end_minutes': round(departure + float(duration), 1),
+        })
+    plans.sort(key=lambda plan: (plan['vehicle'], plan['trip']))
+
+    total_km = sum(plan['distance_km'] for plan in plans)
+    return {
+        'routes': plans,
+        'summary': {
+            'stops': int(len(stops)),
+            'trips': len(plans),
+            'vehicles_used': len({plan['vehicle'] for plan in plans}),
+            'capacity': capacity,
+            'total_distance_km': round(total_km, 2),
+            'initial_distance_km': round(initial_km, 2),
+            'improvement_percent': round((1 - total_km / initial_km) * 100, 1) if initial_km else 0.0,
+            'total_duration_minutes': round(float(sum(durations)), 1),
+            'makespan_minutes': max((plan['end_minutes'] for plan in plans), default=0.0),
+            'matrix_ms': round(matrix_ms, 1),
+            'solve_ms': round((time.perf_counter() - start) * 1000, 1),
+        },
+    }
+
+
+def day_orders(date, data_dir: Optional[str] = None) -> Tuple[pd.DataFrame, int]:
+    """
+    Pedidos de un día como paradas (coordenadas de la dirección de despacho).
+
+    Args:
+        date: Fecha de los pedidos (order_date)
+        data_dir: Directorio de datasets (default: data/processed)
+
+    Returns:
+        Tupla (paradas con stop_id, latitude, longitude, quantity, customer_type
+        y delivery_commune; pedidos omitidos por no tener coordenadas)
+    """
+    try:
+        from src.dataset_store import read_dataset
+    except ImportError:
+        from dataset_store import read_dataset
+
+    columns = ['order_id', 'order_date', 'latitude', 'longitude', 'quantity', 'customer_type', 'delivery_commune']
+    df = read_dataset('dataset_completo', columns=columns, start_date=date, end_date=date, data_dir=data_dir)
+    orders = df.groupby('order_id', sort=False, observed=True).agg(
+        latitude=('latitude', 'first'),
+        longitude=('longitude', 'first'),
+        quantity=('quantity', 'sum'),
+        customer_type=('customer_type', 'first'),
+        delivery_commune=('delivery_commune', 'first'),
+    ).reset_index().rename(columns={'order_id': 'stop_id'})
+    located = orders['latitude'].notna() & orders['longitude'].notna()
+    stops = orders[located].astype({'stop_id': str, 'customer_type': object, 'delivery_commune': object})
+    return stops.reset_index(drop=True), int((~located).sum())
+
+
+def _synthetic_stops(n_stops: int, seed: int = 42) -> pd.DataFrame:
+    """Paradas aleatorias en el Gran Santiago (cantidades de 1 a 20 unidades)."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'stop_id': [f"s{i}" for i in range(n_stops)],
+        'latitude': rng.uniform(-33.65, -33.30, n_stops),
+        'longitude': rng.uniform(-70.80, -70.50, n_stops),
+        'quantity': rng.integers(1, 21, n_stops),
+    })
+
+
+def benchmark(sizes: Optional[List[int]] = None, capacity: float = DEFAULT_VEHICLE_CAPACITY,
+              time_limit: float = DEFAULT_TIME_LIMIT_SECONDS) -> pd.DataFrame:
+    """
+    Tiempo y calidad del planificador con paradas sintéticas.
+
+    Args:
+        sizes: Cantidades de paradas (default: 50, 200, 1000)
+        capacity: Unidades por viaje
+        time_limit: Segundos máximos de mejora
+
+    Returns:
+        DataFrame con viajes, km del vecino más cercano, km mejorados y tiempos por tamaño
+    """
+    rows = []
+    for n_stops in sizes or BENCHMARK_SIZES:
+        stops = _synthetic_stops(n_stops)
+        start = time.perf_counter()
+        baseline = plan_routes(stops, capacity=capacity, improve=False)['summary']
+        nn_s = time.perf_counter() - start
+        plan = plan_routes(stops, capacity=capacity, time_limit=time_limit)
+        summary = plan['summary']
+
+        # Cada parada exactamente una vez y ningún viaje sobre la capacidad
+        visited = [stop['stop_id'] for route in plan['routes'] for stop in route['stops']]
+        assert sorted(visited) == sorted(stops['stop_id']), "paradas faltantes o repetidas"
+        assert all(route['load'] <= capacity for route in plan['routes']), "capacidad excedida"
+
+        rows.append({
+            'stops': n_stops,
+            'trips': summary['trips'],
+            'matrix_ms': summary['matrix_ms'],
+            'nearest_neighbor_km': baseline['total_distance_km'],
+            'nearest_neighbor_s': round(nn_s, 3),
+            'optimized_km': summary['total_distance_km'],
+            'improvement_percent': summary['improvement_percent'],
+            'optimized_s': round(summary['solve_ms'] / 1000, 3),
+        })
+        print(f"✓ {n_stops:>5,} paradas: {summary['trips']} viajes | vecino más cercano "
+              f"{baseline['total_distance_km']:,.1f} km ({nn_s:.2f}s) → optimizado "
+              f"{summary['total_distance_km']:,.1f} km (-{summary['improvement_percent']}%, "
+              f"{summary['solve_ms'] / 1000:.2f}s)")
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Optimización de rutas de reparto")
+    parser.add_argument("--date", help="Planificar los pedidos de esta fecha (YYYY-MM-DD)")
+    parser.add_argument("--capacity", type=float, default=DEFAULT_VEHICLE_CAPACITY, help="Unidades por viaje")
+    parser.add_argument("--vehicles", type=int, default=None, help="Camiones disponibles")
+    parser.add_argument("--time-limit", type=float, default=DEFAULT_TIME_LIMIT_SECONDS,
+                        help="Segundos máximos de mejora")
+    parser.add_argument("--benchmark", action="store_true", help="Benchmark con paradas sintéticas")
+    parser.add_argument("--sizes", type=int, nargs="+", default=BENCHMARK_SIZES,
+                        help="Cantidades de paradas del benchmark")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print("\n" + "="*60)
+        print("⏱️ BENCHMARK RUTAS (vecino más cercano vs 2-opt/or-opt)")
+        print("="*60)
+        print("\n" + benchmark(args.sizes, args.capacity, args.time_limit).to_string(index=False))
+    elif args.date:
+        stops, skipped = day_orders(args.date)
+        print(f"\n🚚 {len(stops)} pedidos el {args.date} ({skipped} sin coordenadas)")
+        if stops.empty:
+            sys.exit(0)
+        result = plan_routes(stops, capacity=args.capacity, vehicles=args.vehicles, time_limit=args.time_limit)
+        for route in result['routes']:
+            print(f"  Camión {route['vehicle']} viaje {route['trip']}: {len(route['stops'])} paradas, "
+                  f"{route['load']:.0f} unidades, {route['distance_km']} km, "
+                  f"min {route['start_minutes']:.0f} → {route['end_minutes']:.0f}")
+        s = result['summary']
+        print(f"\n✅ {s['total_distance_km']} km en {s['trips']} viajes "
+              f"(-{s['improvement_percent']}% vs vecino más cercano, {s['solve_ms']:.0f} ms)")
+    else:
+        parser.print_help()
@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================
+EXTRACCIÓN PAGINADA DE TABLAS SUPABASE
+Sistema ML Agua Tres Torres
+============================================
+Módulo único de extracción de las tablas base (orders, customers,
+addresses, products) vía PostgREST:
+
+- Paginación keyset por clave primaria (`key > último valor`), sin
+  OFFSET ni un único response JSON gigante; no se trunca en 10k filas
+  ni en el límite max-rows del servidor
+- Proyección de columnas: solo se piden las que usa el pipeline
+- Cada página se tipa (fechas, numéricos) y se escribe directo como
+  row group de un Parquet en data/raw/<tabla>.parquet (escritura atómica)
+- Filtro opcional por fecha (`since`/`until`) en tablas con columna de fecha
+- Extracción concurrente de tablas independientes (un cliente HTTP con pool
+  por thread), timeout y tiempos por tabla, fallback por tabla
+
+Uso:
+    >>> client = get_supabase_client()
+    >>> path, rows = extract_table(client, 'orders', since='2025-01-01')
+    >>> data = extract_tables(client)          # dict nombre → DataFrame
+    >>> data, report = extract_tables_concurrent(get_supabase_client, timeout=120,
+    ...                                          fallback=load_local_table)
+    $ python src/supabase_extract.py --since 2025-01-01
+"""
+
+import os
+import sys
+import time
+import logging
+import shutil
+import argparse
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_ENABLED = True
+except ImportError:
+    PARQUET_ENABLED = False
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_RAW_DIR = os.path.join(BASE_DIR, "data", "raw")
+
+# Filas por página (PostgREST suele limitar max-rows a 1000)
+DEFAULT_PAGE_SIZE = int(os.getenv("SUPABASE_PAGE_SIZE", "1000"))
+
+# Extracción concurrente: threads y timeout por tabla (segundos)
+DEFAULT_EXTRACT_WORKERS = int(os.getenv("SUPABASE_EXTRACT_WORKERS", "4"))
+DEFAULT_TABLE_TIMEOUT = int(os.getenv("SUPABASE_TABLE_TIMEOUT_SECONDS", "300"))
+
+
+@dataclass(frozen=True)
+class TableSpec:
+    """Definición de una tabla a extraer."""
+    table: str
+    key: str
+    columns: Tuple[str, ...]
+    dtypes: Dict[str, str] = field(default_factory=dict)
+    date_column: Optional[str] = None
+
+    @property
+    def filename(self) -> str:
+        """Archivo Parquet de salida (ej: 3t_orders.parquet)."""
+        return f"{self.table}.parquet"
+
+
+# Tablas del pipeline: solo las columnas que usan consolidate_data y los modelos.
+# Columnas sin dtype explícito se guardan como string.
+TABLE_SPECS: Dict[str, TableSpec] = {
+    'orders': TableSpec(
+        table="3t_orders",
+        key="order_id",
+        columns=(
+            'order_id', 'customer_id', 'delivery_address_id', 'product_type',
+            'quantity', 'final_price', 'order_date', 'delivered_date', 'payment_date',
+            'invoice_date', 'delivery_datetime', 'status', 'payment_status',
+            'payment_type', 'order_type',
+        ),
+        dtypes={
+            'quantity': 'Int64',
+            'final_price': 'float64',
+            'order_date': 'datetime64[ns]',
+            'delivered_date': 'datetime64[ns]',
+            'payment_date': 'datetime64[ns]',
+            'invoice_date': 'datetime64[ns]',
+            'delivery_datetime': 'datetime64[ns, UTC]',
+        },
+        date_column='order_date',
+    ),
+    'customers': TableSpec(
+        table="3t_customers",
+        key="customer_id",
+        columns=('customer_id', 'name', 'customer_type', 'commune', 'business_name', 'email', 'phone'),
+    ),
+    'addresses': TableSpec(
+        table="3t_addresses",
+        key="address_id",
+        columns=('address_id', 'customer_id', 'commune', 'region', 'latitude', 'longitude'),
+        dtypes={'latitude': 'float64', 'longitude': 'float64'},
+    ),
+    'products': TableSpec(
+        table="3t_products",
+        key="product_id",
+        columns=('product_id', 'name', 'category', 'price_neto', 'pv_iva_inc'),
+        dtypes={'price_neto': 'float64', 'pv_iva_inc': 'float64'},
+    ),
+}
+
+
+def get_supabase_client(timeout: Optional[int] = None):
+    """
+    Crear cliente de Supabase desde variables de entorno.
+
+    Usa SUPABASE_SERVICE_KEY si existe, si no SUPABASE_ANON_KEY.
+
+    Args:
+        timeout: Timeout HTTP de PostgREST en segundos (None = default del cliente)
+
+    Raises:
+        ValueError: Si faltan SUPABASE_URL o la key
+    """
+    from supabase import create_client
+
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_SERVICE_KEY") or os.getenv("SUPABASE_ANON_KEY")
+    if not url or not key:
+        raise ValueError("Variables SUPABASE_URL y SUPABASE_SERVICE_KEY (o SUPABASE_ANON_KEY) no configuradas")
+    if timeout is None:
+        return create_client(url, key)
+
+    from supabase.lib.client_options import ClientOptions
+    return create_client(url, key, options=ClientOptions(postgrest_client_timeout=timeout))
+
+
+def to_frame(rows: List[Dict[str, Any]], spec: TableSpec) -> pd.DataFrame:
+    """
+    Convertir filas JSON de PostgREST a un DataFrame tipado según la spec.
+
+    El tipado por página mantiene el mismo schema en todos los row groups
+    (una página con solo nulos no cambia el tipo de la columna).
+    """
+    return apply_dtypes(pd.DataFrame(rows, columns=list(spec.columns)), spec)
+
+
+def apply_dtypes(df: pd.DataFrame, spec: TableSpec) -> pd.DataFrame:
+    """Tipar las columnas de un DataFrame según spec.dtypes (default: string)."""
+    for column in spec.columns:
+        dtype = spec.dtypes.get(column, 'string')
+        if dtype.startswith('datetime64'):
+            df[column] = pd.to_datetime(df[column], errors='coerce', utc='UTC' in dtype)
+            if 'UTC' not in dtype:
+                df[column] = df[column].astype('datetime64[ns]')
+        elif dtype == 'string':
+            df[column] = df[column].astype('string')
+        else:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype(dtype)
+    return df
+
+
+def iter_table_pages(client, spec: TableSpec,
+                     since: Optional[str] = None,
+                     until: Optional[str] = None,
+                     page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Recorrer una tabla por páginas con keyset sobre la clave primaria.
+
+    Cada página se pide con `key > último key recibido`, ordenada por key.
+    Se detiene con la primera página vacía (no con una página incompleta:
+    el servidor puede limitar max-rows por debajo de page_size).
+
+    Args:
+        client: Cliente Supabase
+        spec: Tabla a recorrer
+        since: Fecha mínima (inclusive) en spec.date_column
+        until: Fecha máxima (inclusive) en spec.date_column
+        page_size: Filas por página
+
+    Yields:
+        list: Filas (dicts) de cada página
+    """
+    last_key = None
+    while True:
+        query = client.table(spec.table).select(",".join(spec.columns))
+        if spec.date_column and since:
+            query = query.gte(spec.date_column, since)
+        if spec.date_column and until:
+            query = query.lte(spec.date_column, until)
+        if last_key is not None:
+            query = query.gt(spec.key, last_key)
+
+        rows = query.order(spec.key).limit(page_size).execute().data
+        if not rows:
+            break
+        yield rows
+        last_key = rows[-1][spec.key]
+
+
+class ParquetChunkWriter:
+    """
+    Escribe DataFrames por chunks (un row group por chunk) en un Parquet.
+
+    Se escribe en un archivo temporal que reemplaza al destino al cerrar;
+    si ocurre un error dentro del `with`, el destino anterior queda intacto.
+    """
+
+    def __init__(self, path: str, schema: Optional["pa.Schema"] = None):
+        if not PARQUET_ENABLED:
+            raise ImportError("pyarrow no instalado: pip install pyarrow")
+        self.path = path
+        self.tmp_path = f"{path}.tmp-{os.getpid()}"
+        self.schema = schema
+        self.rows = 0
+        self._writer = None
+
+    def write(self, df: pd.DataFrame):
+        """Agregar un chunk (DataFrame) como row group."""
+        self.write_table(pa.Table.from_pandas(df, schema=self.schema, preserve_index=False))
+
+    def write_table(self, table: "pa.Table"):
+        """Agregar un chunk (tabla Arrow) como row group."""
+        if self.schema is not None and not table.schema.equals(self.schema):
+            table = table.select(self.schema.names).cast(self.schema)
+        if self._writer is None:
+            self.schema = table.schema
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._writer = pq.ParquetWriter(self.tmp_path, self.schema, compression='snappy')
+        self._writer.write_table(table)
+        self.rows += table.num_rows
+
+    def close(self, empty: Optional[pd.DataFrame] = None) -> int:
+        """
+        Cerrar y publicar el archivo.
+
+        Args:
+            empty: DataFrame vacío tipado a escribir si no hubo chunks
+                (así el archivo existe con el schema correcto)
+
+        Returns:
+            int: Filas escritas
+        """
+        if self._writer is None:
+            if empty is None:
+                return 0
+            self.write(empty)
+        self._writer.close()
+        os.replace(self.tmp_path, self.path)
+        return self.rows
+
+    def abort(self):
+        """Descartar el archivo temporal."""
+        if self._writer is not None:
+            self._writer.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+        return False
+
+
+class ExtractionCancelled(RuntimeError):
+    """La extracción de una tabla se canceló (ej: superó su timeout)."""
+
+
+def extract_table(client, name: str,
+                  since: Optional[str] = None,
+                  until: Optional[str] = None,
+                  raw_dir: str = DATA_RAW_DIR,
+                  page_size: int = DEFAULT_PAGE_SIZE,
+                  cancel: Optional[threading.Event] = None) -> Tuple[str, int]:
+    """
+    Extraer una tabla completa a Parquet página por página.
+
+    Args:
+        client: Cliente Supabase
+        name: Nombre lógico de la tabla (clave de TABLE_SPECS)
+        since: Fecha mínima (solo tablas con columna de fecha)
+        until: Fecha máxima (solo tablas con columna de fecha)
+        raw_dir: Directorio de salida
+        page_size: Filas por página
+        cancel: Evento que detiene la extracción entre páginas; el archivo
+            temporal se descarta y el destino anterior queda intacto
+
+    Returns:
+        Tupla (ruta del Parquet, filas extraídas)
+
+    Raises:
+        ExtractionCancelled: Si `cancel` se activó
+    """
+    spec = TABLE_SPECS[name]
+    path = os.path.join(raw_dir, spec.filename)
+    start = time.perf_counter()
+    pages = 0
+
+    with ParquetChunkWriter(path) as writer:
+        for rows in iter_table_pages(client, spec, since=since, until=until, page_size=page_size):
+            if cancel is not None and cancel.is_set():
+                raise ExtractionCancelled(f"{spec.table}: extracción cancelada")
+            writer.write(to_frame(rows, spec))
+            pages += 1
+        total = writer.close(empty=to_frame([], spec))
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"✓ {spec.table}: {total:,} filas en {pages} páginas ({elapsed:.1f}s) → {path}")
+    return path, total
+
+
+def read_table(name: str, raw_dir: str = DATA_RAW_DIR,
+               columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Leer una tabla extraída (data/raw/<tabla>.parquet)."""
+    return pd.read_parquet(os.path.join(raw_dir, TABLE_SPECS[name].filename), columns=columns)
+
+
+def extract_tables(client, names: Optional[List[str]] = None,
+                   since: Optional[str] = None,
+                   until: Optional[str] = None,
+                   raw_dir: str = DATA_RAW_DIR,
+                   page_size: int = DEFAULT_PAGE_SIZE) -> Dict[str, pd.DataFrame]:
+    """
+    Extraer varias tablas a Parquet y devolverlas como DataFrames.
+
+    Args:
+        client: Cliente Supabase
+        names: Tablas a extraer (None = todas las de TABLE_SPECS)
+        since: Fecha mínima para tablas con columna de fecha (orders)
+        until: Fecha máxima para tablas con columna de fecha
+        raw_dir: Directorio de salida
+        page_size: Filas por página
+
+    Returns:
+        dict: nombre → DataFrame tipado
+    """
+    data = {}
+    for name in names or list(TABLE_SPECS):
+        extract_table(client, name, since=since, until=until, raw_dir=raw_dir, page_size=page_size)
+        data[name] = read_table(name, raw_dir)
+    return data
+
+
+def extract_tables_concurrent(client_factory: Callable[[], Any],
+                              names: Optional[List[str]] = None,
+                              since: Optional[str] = None,
+                              until: Optional[str] = None,
+                              raw_dir: str = DATA_RAW_DIR,
+                              page_size: int = DEFAULT_PAGE_SIZE,
+                              max_workers: int = DEFAULT_EXTRACT_WORKERS,
+                              timeout: Optional[float] = DEFAULT_TABLE_TIMEOUT,
+                              fallback: Optional[Callable[[str], Optional[pd.DataFrame]]] = None
+                              ) -> Tuple[Dict[str, pd.DataFrame], Dict[str, Dict[str, Any]]]:
+    """
+    Extraer tablas independientes en paralelo.
+
+    Cada thread crea su propio cliente (`client_factory`) una sola vez y lo
+    reutiliza para todas sus tablas: un pool HTTP por worker. Una tabla que
+    falla o supera `timeout` segundos (contados desde que empezó a
+    extraerse) usa `fallback(nombre)` sin afectar a las demás.
+
+    Los workers escriben en un directorio temporal de la corrida y solo las
+    tablas con status 'ok' se mueven a `raw_dir`. Un thread que superó su
+    timeout no se puede interrumpir: se le avisa con un evento (se detiene
+    en la próxima página) y su archivo nunca reemplaza al de `raw_dir`.
+
+    Args:
+        client_factory: Función que crea un cliente Supabase
+        names: Tablas a extraer (None = todas las de TABLE_SPECS)
+        since: Fecha mínima para tablas con columna de fecha (orders)
+        until: Fecha máxima para tablas con columna de fecha
+        raw_dir: Directorio de salida
+        page_size: Filas por página
+        max_workers: Threads concurrentes
+        timeout: Segundos máximos por tabla (None = sin límite)
+        fallback: Función nombre → DataFrame local (o None) para tablas fallidas
+
+    Returns:
+        Tupla (dict nombre → DataFrame, reporte por tabla con status,
+        rows, seconds y error). status: 'ok', 'fallback' o 'failed'.
+    """
+    names = names or list(TABLE_SPECS)
+    local = threading.local()
+    started_at: Dict[str, float] = {}
+    cancel = {name: threading.Event() for name in names}
+    staging_dir = os.path.join(raw_dir, f".extract-{os.getpid()}-{int(time.time() * 1000)}")
+
+    def _extract(name: str) -> pd.DataFrame:
+        started_at[name] = time.monotonic()
+        if getattr(local, 'client', None) is None:
+            local.client = client_factory()
+        extract_table(local.client, name, since=since, until=until, raw_dir=staging_dir,
+                      page_size=page_size, cancel=cancel[name])
+        return read_table(name, staging_dir)
+
+    data: Dict[str, pd.DataFrame] = {}
+    report: Dict[str, Dict[str, Any]] = {}
+
+    def _finish(name: str, df: Optional[pd.DataFrame], error: Optional[str] = None):
+        elapsed = time.monotonic() - started_at.get(name, time.monotonic())
+        if error is None:
+            filename = TABLE_SPECS[name].filename
+            os.replace(os.path.join(staging_dir, filename), os.path.join(raw_dir, filename))
+            data[name] = df
+            report[name] = {'status': 'ok', 'rows': len(df), 'seconds': round(elapsed, 2)}
+            return
+        logger.error(f"❌ {name}: {error}")
+        local_df = fallback(name) if fallback else None
+        if local_df is not None:
+            data[name] = local_df
+        report[name] = {
+            'status': 'fallback' if local_df is not None else 'failed',
+            'rows': len(local_df) if local_df is not None else 0,
+            'seconds': round(elapsed, 2),
+            'error': error,
+        }
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="extract")
+    pending = {executor.submit(_extract, name): name for name in names}
+    try:
+        while pending:
+            done, _ = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    _finish(name, future.result())
+                except Exception as e:
+                    _finish(name, None, str(e))
+
+            if timeout is None:
+                continue
+            now = time.monotonic()
+            for future, name in list(pending.items()):
+                # Solo cuentan las tablas que ya empezaron (no las que esperan un worker)
+                if name in started_at and now - started_at[name] > timeout:
+                    pending.pop(future)
+                    cancel[name].set()
+                    _finish(name, None, f"timeout ({timeout}s)")
+    finally:
+        # No esperar threads colgados: el timeout HTTP del cliente los termina y el
+        # evento de cancelación los detiene antes de escribir otra página
+        for event in cancel.values():
+            event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    for name in names:
+        info = report[name]
+        logger.info(f"  {name:<10} {info['status']:<8} {info['rows']:>10,} filas  {info['seconds']:>7.2f}s")
+    return data, report
+
+
+def main():
+    """CLI: extraer tablas base a data/raw/*.parquet."""
+    parser = argparse.ArgumentParser(description='Extraer tablas de Supabase a Parquet (paginación keyset)')
+    parser.add_argument('--tables', nargs='+', choices=list(TABLE_SPECS), help='Tablas a extraer (default: todas)')
+    parser.add_argument('--since', type=str, help='Pedidos desde esta fecha (YYYY-MM-DD)')
+    parser.add_argument('--until', type=str, help='Pedidos hasta esta fecha (YYYY-MM-DD)')
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE, help='Filas por página')
+    parser.add_argument('--output-dir', type=str, default=DATA_RAW_DIR, help='Directorio de salida')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    try:
+        client = get_supabase_client()
+        for name in args.tables or list(TABLE_SPECS):
+            extract_table(client, name, since=args.since, until=args.until,
+                          raw_dir=args.output_dir, page_size=args.page_size)
+        return 0
+    except Exception as e:
+        logger.error(f"❌ Error en extracción: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,24 +8,30 @@ Sistema ML Agua Tres Torres
 Script para descargar datos históricos de clima desde Open-Meteo
 y guardarlos en Supabase.
 
+Las descargas (grupo de comunas × tramo de fechas, varias comunas por
+llamada multi-location) se hacen en paralelo con un límite de concurrencia, un rate limiter token bucket compartido y
+reintentos con backoff exponencial ante errores transitorios.
+
 Uso:
     python src/sync_historical_weather.py --start-date 2024-01-01 --end-date 2025-11-10
     python src/sync_historical_weather.py --days 365  # Último año
+    python src/sync_historical_weather.py --days 1095 --concurrency 8 --rate-limit 5
+    python src/sync_historical_weather.py --days 30 --incremental  # Solo huecos faltantes
 """
 
 import os
 import sys
 import argparse
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from typing import List
+from typing import Dict, Iterable, List, Tuple
 from tqdm import tqdm
-import time
 
 # Agregar path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.weather_service import OpenMeteoClient, WeatherDBService
+from src.weather_service import OpenMeteoClient, WeatherDBService, TokenBucket
 from src.communes_constants import VALID_COMMUNES
 
 # Configurar Supabase
@@ -53,11 +59,117 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Descarga concurrente (Open-Meteo: uso justo, sin límite estricto)
+DEFAULT_CONCURRENCY = int(os.getenv("WEATHER_SYNC_CONCURRENCY", "8"))
+DEFAULT_RATE_LIMIT = float(os.getenv("WEATHER_SYNC_RATE_LIMIT", "5"))
+DEFAULT_CHUNK_DAYS = int(os.getenv("WEATHER_SYNC_CHUNK_DAYS", "366"))
+DEFAULT_COMMUNES_PER_CALL = int(os.getenv("WEATHER_SYNC_COMMUNES_PER_CALL", "10"))
+
+
+def split_date_range(start_date: str, end_date: str, chunk_days: int) -> List[Tuple[str, str]]:
+    """
+    Dividir un rango de fechas en tramos de hasta `chunk_days` días.
+    
+    Args:
+        start_date: Fecha inicio (YYYY-MM-DD)
+        end_date: Fecha fin (YYYY-MM-DD)
+        chunk_days: Días máximos por tramo
+    
+    Returns:
+        list: Tuplas (inicio, fin) en formato YYYY-MM-DD
+    """
+    start_dt = datetime.strptime(start_date, "%Y-%m-%d")
+    end_dt = datetime.strptime(end_date, "%Y-%m-%d")
+    ranges = []
+    while start_dt <= end_dt:
+        chunk_end = min(start_dt + timedelta(days=chunk_days - 1), end_dt)
+        ranges.append((start_dt.strftime("%Y-%m-%d"), chunk_end.strftime("%Y-%m-%d")))
+        start_dt = chunk_end + timedelta(days=1)
+    return ranges
+
+
+def coalesce_missing_ranges(missing: Iterable[Tuple[str, str]]) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    Agrupar pares (fecha, comuna) faltantes en rangos contiguos por comuna.
+    
+    Args:
+        missing: Tuplas (fecha YYYY-MM-DD, comuna), en cualquier orden
+    
+    Returns:
+        dict: comuna → lista de rangos (inicio, fin) ordenados
+    
+    Ejemplo:
+        >>> coalesce_missing_ranges([("2025-01-01", "Renca"), ("2025-01-02", "Renca"), ("2025-01-05", "Renca")])
+        {'Renca': [('2025-01-01', '2025-01-02'), ('2025-01-05', '2025-01-05')]}
+    """
+    dates_by_commune: Dict[str, set] = {}
+    for date, commune in missing:
+        dates_by_commune.setdefault(commune, set()).add(datetime.strptime(date, "%Y-%m-%d"))
+    
+    ranges = {}
+    for commune, dates in dates_by_commune.items():
+        dates = sorted(dates)
+        commune_ranges = []
+        range_start = prev = dates[0]
+        for date in dates[1:]:
+            if date - prev > timedelta(days=1):
+                commune_ranges.append((range_start.strftime("%Y-%m-%d"), prev.strftime("%Y-%m-%d")))
+                range_start = date
+            prev = date
+        commune_ranges.append((range_start.strftime("%Y-%m-%d"), prev.strftime("%Y-%m-%d")))
+        ranges[commune] = commune_ranges
+    return ranges
+
+
+def build_tasks(ranges_by_commune: Dict[str, List[Tuple[str, str]]],
+                chunk_days: int, communes_per_call: int) -> List[Tuple[List[str], str, str]]:
+    """
+    Armar llamadas (grupo de comunas, inicio, fin).
+    
+    Las comunas con el mismo rango se piden juntas (multi-location) y los
+    rangos largos se dividen en tramos de `chunk_days`.
+    
+    Args:
+        ranges_by_commune: comuna → rangos (inicio, fin) a descargar
+        chunk_days: Días máximos por llamada
+        communes_per_call: Comunas máximas por llamada
+    
+    Returns:
+        list: Tuplas (comunas, inicio, fin)
+    """
+    communes_by_range: Dict[Tuple[str, str], List[str]] = {}
+    for commune, ranges in ranges_by_commune.items():
+        for date_range in ranges:
+            communes_by_range.setdefault(date_range, []).append(commune)
+    
+    communes_per_call = max(1, communes_per_call)
+    tasks = []
+    for (range_start, range_end), range_communes in sorted(communes_by_range.items()):
+        for chunk_start, chunk_end in split_date_range(range_start, range_end, chunk_days):
+            for i in range(0, len(range_communes), communes_per_call):
+                tasks.append((range_communes[i:i + communes_per_call], chunk_start, chunk_end))
+    return tasks
+
+
+def fetch_communes_range(client: OpenMeteoClient, communes: List[str],
+                         start_date: str, end_date: str) -> List[dict]:
+    """Descargar (una llamada multi-location) y parsear el histórico de un grupo de comunas."""
+    data = client.get_historical_many(communes, start_date, end_date)
+    records = []
+    for commune, commune_data in data.items():
+        records.extend(client.parse_daily_data(commune_data, commune))
+    return records
+
 
 def sync_historical_weather(start_date: str, end_date: str, 
                            communes: List[str] = None,
                            batch_size: int = 100,
-                           auto_confirm: bool = False):
+                           auto_confirm: bool = False,
+                           concurrency: int = DEFAULT_CONCURRENCY,
+                           rate_limit: float = DEFAULT_RATE_LIMIT,
+                           chunk_days: int = DEFAULT_CHUNK_DAYS,
+                           communes_per_call: int = DEFAULT_COMMUNES_PER_CALL,
+                           incremental: bool = False):
     """
     Sincronizar datos históricos de clima.
     
@@ -66,6 +178,11 @@ def sync_historical_weather(start_date: str, end_date: str,
         end_date: Fecha fin (YYYY-MM-DD)
         communes: Lista de comunas (None = todas)
         batch_size: Tamaño de batch para insertar
+        concurrency: Descargas simultáneas (1 = secuencial)
+        rate_limit: Llamadas por segundo a Open-Meteo (token bucket)
+        chunk_days: Días por llamada (rangos largos se dividen en tramos)
+        communes_per_call: Comunas por llamada multi-location
+        incremental: Descargar solo los pares (fecha, comuna) que faltan en BD
     """
     print("\n" + "="*70)
     print(" "*15 + "🌤️  SINCRONIZACIÓN HISTÓRICA DE CLIMA")
@@ -81,15 +198,49 @@ def sync_historical_weather(start_date: str, end_date: str,
     print(f"  Comunas: {len(communes)}")
     print(f"  Fuente: Open-Meteo API (gratuita)")
     print(f"  Destino: Supabase tabla 3t_weather_data")
+    print(f"  Modo: {'incremental (solo faltantes)' if incremental else 'completo'}")
+    
+    # Inicializar servicios
+    print("\n🔧 Inicializando servicios...")
+    client = OpenMeteoClient(rate_limiter=TokenBucket(rate_limit, capacity=concurrency))
+    
+    try:
+        supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        db_service = WeatherDBService(supabase)
+        print("✓ Servicios inicializados")
+    except Exception as e:
+        logger.error(f"Error inicializando Supabase: {e}")
+        print("⚠️ Continuando en modo test (sin guardar en BD)")
+        db_service = None
     
     # Calcular días
     start_dt = datetime.strptime(start_date, "%Y-%m-%d")
     end_dt = datetime.strptime(end_date, "%Y-%m-%d")
     days_count = (end_dt - start_dt).days + 1
-    total_records = len(communes) * days_count
+    
+    if incremental and db_service:
+        # Solo los huecos (fecha, comuna) que faltan, agrupados en rangos contiguos
+        missing = db_service.get_missing_dates(start_date, end_date, communes)
+        ranges_by_commune = coalesce_missing_ranges(missing)
+        total_records = len(missing)
+        print(f"  Faltantes en BD: {total_records:,} registros "
+              f"({sum(len(r) for r in ranges_by_commune.values())} rangos, {len(ranges_by_commune)} comunas)")
+    else:
+        if incremental:
+            print("⚠️ Sin BD no se pueden detectar faltantes: se descarga el rango completo")
+        ranges_by_commune = {commune: [(start_date, end_date)] for commune in communes}
+        total_records = len(communes) * days_count
+    
+    tasks = build_tasks(ranges_by_commune, chunk_days, communes_per_call)
     
     print(f"  Total registros a sincronizar: {total_records:,}")
     print(f"  Batch size: {batch_size}")
+    print(f"  Concurrencia: {concurrency} | Rate limit: {rate_limit}/s | Llamadas: {len(tasks)}")
+    
+    if not tasks:
+        print("\n✓ No hay datos faltantes, nada que sincronizar")
+        logger.info("Sincronización incremental: sin faltantes")
+        return
     
     # Confirmar (skip si --yes flag)
     if not auto_confirm:
@@ -104,59 +255,50 @@ def sync_historical_weather(start_date: str, end_date: str,
     else:
         print("\n✓ Auto-confirmado (--yes flag)")
     
-    # Inicializar servicios
-    print("\n🔧 Inicializando servicios...")
-    client = OpenMeteoClient()
-    
-    try:
-        supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        db_service = WeatherDBService(supabase)
-        print("✓ Servicios inicializados")
-    except Exception as e:
-        logger.error(f"Error inicializando Supabase: {e}")
-        print("⚠️ Continuando en modo test (sin guardar en BD)")
-        db_service = None
-    
     # Sincronizar por comuna
     print(f"\n📥 Descargando datos históricos...")
     print(f"  Límite Open-Meteo: 10,000 calls/día")
-    print(f"  Uso estimado: {len(communes)} calls")
+    print(f"  Uso estimado: {len(tasks)} calls")
     
     all_records = []
     success_count = 0
     error_count = 0
+    fetched_count = 0
+    failed_communes = set()
+    start_time = datetime.now()
     
-    # Progress bar
-    with tqdm(total=len(communes), desc="Comunas procesadas", unit="comuna") as pbar:
-        for commune in communes:
+    # Descargas en paralelo; el guardado en BD queda en el thread principal
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="weather-sync") as pool, \
+            tqdm(total=len(tasks), desc="Descargas", unit="call") as pbar:
+        futures = {
+            pool.submit(fetch_communes_range, client, group, chunk_start, chunk_end): (group, chunk_start, chunk_end)
+            for group, chunk_start, chunk_end in tasks
+        }
+        
+        for future in as_completed(futures):
+            group, chunk_start, chunk_end = futures[future]
             try:
-                # Obtener datos históricos
-                data = client.get_historical_for_commune(commune, start_date, end_date)
-                
-                # Parsear a formato estándar
-                records = client.parse_daily_data(data, commune)
+                records = future.result()
                 all_records.extend(records)
-                
+                fetched_count += len(records)
                 success_count += 1
-                pbar.update(1)
-                pbar.set_postfix({"✓": success_count, "✗": error_count, "registros": len(all_records)})
-                
-                # Guardar en batches
-                if len(all_records) >= batch_size and db_service:
-                    result = db_service.save_weather_data(all_records)
-                    if result.get('success'):
-                        all_records = []  # Limpiar batch
-                    else:
-                        logger.error(f"Error guardando batch: {result.get('error')}")
-                
-                # Rate limiting (cortesía, Open-Meteo no tiene límite estricto)
-                time.sleep(0.1)
-                
             except Exception as e:
                 error_count += 1
-                logger.error(f"Error procesando {commune}: {e}")
-                pbar.update(1)
-                pbar.set_postfix({"✓": success_count, "✗": error_count})
+                failed_communes.update(group)
+                logger.error(f"Error procesando {', '.join(group)} ({chunk_start} → {chunk_end}): {e}")
+            
+            pbar.update(1)
+            pbar.set_postfix({"✓": success_count, "✗": error_count, "registros": fetched_count})
+            
+            # Guardar en batches
+            if len(all_records) >= batch_size and db_service:
+                result = db_service.save_weather_data(all_records)
+                if result.get('success'):
+                    all_records = []  # Limpiar batch
+                else:
+                    logger.error(f"Error guardando batch: {result.get('error')}")
+    
+    elapsed = (datetime.now() - start_time).total_seconds()
     
     # Guardar registros restantes
     if all_records and db_service:
@@ -171,10 +313,11 @@ def sync_historical_weather(start_date: str, end_date: str,
     print("\n" + "="*70)
     print("📊 RESUMEN DE SINCRONIZACIÓN")
     print("="*70)
-    print(f"  Comunas procesadas: {success_count}/{len(communes)}")
-    print(f"  Errores: {error_count}")
-    print(f"  Registros totales: {success_count * days_count:,}")
+    print(f"  Comunas procesadas: {len(ranges_by_commune) - len(failed_communes)}/{len(ranges_by_commune)}")
+    print(f"  Llamadas: {success_count}/{len(tasks)} ({error_count} errores)")
+    print(f"  Registros totales: {fetched_count:,}")
     print(f"  Rango: {start_date} → {end_date} ({days_count} días)")
+    print(f"  Tiempo de descarga: {elapsed:.1f}s")
     
     if db_service:
         print(f"  ✓ Datos guardados en Supabase: 3t_weather_data")
@@ -184,7 +327,7 @@ def sync_historical_weather(start_date: str, end_date: str,
     print("="*70)
     
     # Log final
-    logger.info(f"Sincronización completada: {success_count} comunas, {error_count} errores")
+    logger.info(f"Sincronización completada: {success_count} llamadas, {error_count} errores, {elapsed:.1f}s")
 
 
 def main():
@@ -228,6 +371,40 @@ def main():
         help='Tamaño de batch para insertar (default: 100)'
     )
     
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help=f'Descargas simultáneas, 1 = secuencial (default: {DEFAULT_CONCURRENCY})'
+    )
+    
+    parser.add_argument(
+        '--rate-limit',
+        type=float,
+        default=DEFAULT_RATE_LIMIT,
+        help=f'Llamadas por segundo a Open-Meteo (default: {DEFAULT_RATE_LIMIT})'
+    )
+    
+    parser.add_argument(
+        '--chunk-days',
+        type=int,
+        default=DEFAULT_CHUNK_DAYS,
+        help=f'Días por llamada; rangos largos se dividen en tramos (default: {DEFAULT_CHUNK_DAYS})'
+    )
+    
+    parser.add_argument(
+        '--communes-per-call',
+        type=int,
+        default=DEFAULT_COMMUNES_PER_CALL,
+        help=f'Comunas por llamada multi-location (default: {DEFAULT_COMMUNES_PER_CALL})'
+    )
+    
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Descargar solo las fechas/comunas que faltan en BD'
+    )
+    
     parser.add_argument(
         '--yes', '-y',
         action='store_true',
@@ -252,7 +429,12 @@ def main():
         end_date=end_date_str,
         communes=args.communes,
         batch_size=args.batch_size,
-        auto_confirm=args.yes
+        auto_confirm=args.yes,
+        concurrency=args.concurrency,
+        rate_limit=args.rate_limit,
+        chunk_days=args.chunk_days,
+        communes_per_call=args.communes_per_call,
+        incremental=args.incremental
     )
 
 
@@ -33,6 +33,17 @@ from sklearn.metrics import silhouette_score, classification_report, mean_absolu
 import xgboost as xgb
 from prophet import Prophet
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from src.prophet_forecast import predict_future
+    from src.dataset_store import read_dataset
+    from src.consolidate_data import read_consolidated
+except ImportError:
+    from prophet_forecast import predict_future
+    from dataset_store import read_dataset
+    from consolidate_data import read_consolidated
+
 warnings.filterwarnings('ignore')
 
 # Rutas
@@ -51,8 +62,8 @@ print("="*70)
 # ============================================
 
 print("\n📂 Cargando datasets...")
-df = pd.read_csv(os.path.join(DATA_DIR, "dataset_completo.csv"), parse_dates=['order_date', 'delivered_date'])
-rfm = pd.read_csv(os.path.join(DATA_DIR, "rfm_segments.csv"))
+df = read_consolidated(data_dir=DATA_DIR)   # pedidos + RFM por cliente (rfm_customers)
+rfm = read_dataset('rfm_segments', data_dir=DATA_DIR)
 print(f"✓ Dataset: {len(df):,} registros")
 print(f"✓ RFM: {len(rfm):,} clientes")
 
@@ -177,12 +188,10 @@ prophet_pedidos = Prophet(
 )
 prophet_pedidos.fit(df_prophet[['ds', 'pedidos']].rename(columns={'pedidos': 'y'}))
 
-# Predicción 30 días
-future = prophet_pedidos.make_future_dataframe(periods=30)
-forecast_pedidos = prophet_pedidos.predict(future)
+# Predicción 30 días (solo fechas futuras)
+next_30 = predict_future(prophet_pedidos, 30)
 
 print(f"\n📈 PREDICCIÓN PRÓXIMOS 30 DÍAS:")
-next_30 = forecast_pedidos.tail(30)
 print(f"   • Pedidos promedio diarios: {next_30['yhat'].mean():.1f}")
 print(f"   • Total estimado 30 días: {next_30['yhat'].sum():.0f} pedidos")
 print(f"   • Rango: {next_30['yhat_lower'].mean():.1f} - {next_30['yhat_upper'].mean():.1f}")
@@ -203,8 +212,7 @@ prophet_revenue = Prophet(
 )
 prophet_revenue.fit(df_prophet[['ds', 'revenue']].rename(columns={'revenue': 'y'}))
 
-forecast_revenue = prophet_revenue.predict(future)
-next_30_revenue = forecast_revenue.tail(30)
+next_30_revenue = predict_future(prophet_revenue, 30)
 print(f"\n💰 PREDICCIÓN REVENUE 30 DÍAS:")
 print(f"   • Revenue promedio diario: ${next_30_revenue['yhat'].mean():,.0f}")
 print(f"   • Total estimado 30 días: ${next_30_revenue['yhat'].sum():,.0f}")
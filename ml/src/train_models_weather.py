@@ -28,20 +28,21 @@ warnings.filterwarnings('ignore')
 # Agregar path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from src.dataset_store import dataset_exists, read_dataset
+
 
 def load_weather_dataset():
     """Cargar dataset consolidado con clima."""
     print("\n📂 Cargando dataset con clima...")
     
-    dataset_path = "data/processed/dataset_weather.csv"
-    if not os.path.exists(dataset_path):
-        print(f"\n❌ Dataset no encontrado: {dataset_path}")
+    if not dataset_exists('dataset_weather'):
+        print(f"\n❌ Dataset no encontrado: dataset_weather")
         print("\n💡 Ejecutar primero:")
         print("   1. python src/sync_historical_weather.py --days 365")
         print("   2. python src/consolidate_data_weather.py")
-        raise FileNotFoundError(dataset_path)
+        raise FileNotFoundError('dataset_weather')
     
-    df = pd.read_csv(dataset_path, parse_dates=['order_date'])
+    df = read_dataset('dataset_weather')
     print(f"  ✓ Dataset cargado: {len(df):,} registros")
     print(f"  Rango: {df['order_date'].min()} → {df['order_date'].max()}")
     
@@ -69,7 +70,7 @@ def prepare_prophet_data(df):
         'temp_max_c': 'mean',
         'temp_min_c': 'mean',
         'humidity': 'mean',
-        'precip_mm': 'sum',
+        'precip_mm': 'mean',  # clima del día (no suma por pedido): mismo valor que sirve la API
         'is_hot_day': 'max',
         'is_rainy_day': 'max'
     }).reset_index()
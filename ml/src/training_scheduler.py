@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================
+SCHEDULER DE ENTRENAMIENTO EN PROCESOS
+Sistema ML Agua Tres Torres
+============================================
+Entrena modelos independientes en paralelo con un pool de procesos:
+
+- Número de workers configurable (TRAINING_WORKERS)
+- Presupuesto de memoria (TRAINING_MEMORY_BUDGET_MB): un job solo se
+  lanza si la suma de las estimaciones de los jobs en curso más la suya
+  cabe en el presupuesto (un job que no cabe solo corre sin compañía)
+- Jobs más lentos primero (prioridad), así el tiempo total tiende al
+  del modelo más lento
+- Un job que falla (o un worker que muere) no detiene a los demás
+- Con 1 worker se entrena en el mismo proceso, en orden
+
+Uso:
+    >>> jobs = [TrainingJob('kmeans', train_model_kmeans, (rfm_df,), memory_mb=200),
+    ...         TrainingJob('prophet_orders', train_model_prophet_orders, (df,), priority=10)]
+    >>> results = TrainingScheduler(max_workers=4, memory_budget_mb=4096).run(jobs)
+    >>> results['kmeans']['status']     # 'ok', 'empty' o 'failed'
+"""
+
+import os
+import time
+import logging
+import resource
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Configuración por variables de entorno
+DEFAULT_TRAINING_WORKERS = int(os.getenv("TRAINING_WORKERS", str(min(4, os.cpu_count() or 1))))
+DEFAULT_MEMORY_BUDGET_MB = int(os.getenv("TRAINING_MEMORY_BUDGET_MB", "4096"))
+# forkserver: los workers salen de un proceso servidor limpio, sin los threads
+# del padre (ej: extracciones con timeout que siguen vivas con locks de
+# httpx/logging); 'fork' los heredaría y un lock tomado deja colgado al worker.
+# Las librerías pesadas se importan una vez en el servidor (FORKSERVER_PRELOAD)
+DEFAULT_START_METHOD = os.getenv(
+    "TRAINING_START_METHOD",
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+FORKSERVER_PRELOAD = [
+    name.strip() for name in
+    os.getenv("TRAINING_PRELOAD_MODULES", "numpy,pandas,sklearn,xgboost,prophet").split(",")
+    if name.strip()
+]
+
+
+@dataclass(frozen=True)
+class TrainingJob:
+    """Un modelo a entrenar: función top-level + argumentos (picklables)."""
+    name: str
+    func: Callable[..., Any]
+    args: Tuple[Any, ...] = ()
+    memory_mb: float = 256
+    priority: int = 0
+
+
+def estimate_memory_mb(*frames: pd.DataFrame, factor: float = 3.0, base_mb: float = 150) -> float:
+    """
+    Estimar la memoria de un job a partir de sus DataFrames de entrada.
+
+    Args:
+        frames: DataFrames que recibe el job
+        factor: Multiplicador por copias intermedias (features, splits, escalado)
+        base_mb: Memoria fija del proceso (imports, modelo)
+
+    Returns:
+        float: MB estimados
+    """
+    input_mb = sum(frame.memory_usage(deep=True).sum() for frame in frames) / 1024 / 1024
+    return base_mb + input_mb * factor
+
+
+def _status_kb(field: str) -> Optional[int]:
+    """Valor (kB) de un campo de /proc/self/status (None fuera de Linux)."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss() -> bool:
+    """
+    Reiniciar el pico de RSS del proceso (VmHWM) al RSS actual.
+
+    Los workers del pool se reutilizan: sin reiniciar, el pico de un job
+    chico incluiría el de un job grande anterior. Requiere Linux ≥ 4.0.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _run_job(func: Callable[..., Any], args: Tuple[Any, ...]) -> Dict[str, Any]:
+    """
+    Ejecutar un job en el worker y devolver un resumen (no el modelo).
+
+    peak_rss_mb es el pico de RSS del proceso durante ESTE job (incluye
+    lo que el worker ya tenía al empezar, ej: módulos importados) y
+    rss_delta_mb lo que el job sumó por sobre el RSS inicial. Sin
+    /proc/self/clear_refs se usa el crecimiento de ru_maxrss (cota inferior).
+    """
+    reset = _reset_peak_rss()
+    rss_start_kb = _status_kb('VmRSS')
+    # ru_maxrss está en KB en Linux
+    maxrss_start_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if rss_start_kb is None:
+        rss_start_kb = maxrss_start_kb
+    start = time.perf_counter()
+    result = func(*args)
+    if isinstance(result, tuple):
+        ok = all(item is not None for item in result)
+    else:
+        ok = result is not None
+    peak_kb = _status_kb('VmHWM') if reset else None
+    if peak_kb is None:
+        peak_kb = rss_start_kb + max(0, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - maxrss_start_kb)
+    return {
+        'status': 'ok' if ok else 'empty',
+        'seconds': round(time.perf_counter() - start, 2),
+        'peak_rss_mb': round(peak_kb / 1024, 1),
+        'rss_delta_mb': round(max(0, peak_kb - rss_start_kb) / 1024, 1),
+    }
+
+
+class TrainingScheduler:
+    """Pool de procesos con límite de workers y presupuesto de memoria."""
+
+    def __init__(self, max_workers: int = DEFAULT_TRAINING_WORKERS,
+                 memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB,
+                 start_method: str = DEFAULT_START_METHOD):
+        """
+        Inicializar scheduler.
+
+        Args:
+            max_workers: Procesos concurrentes (1 = en el mismo proceso)
+            memory_budget_mb: Memoria total estimada permitida en paralelo
+            start_method: Método de multiprocessing ('spawn', 'forkserver', 'fork')
+        """
+        self.max_workers = max(1, max_workers)
+        self.memory_budget_mb = memory_budget_mb
+        self.start_method = start_method
+
+    def _run_inline(self, jobs: List[TrainingJob]) -> Dict[str, Dict[str, Any]]:
+        """Entrenar en orden en el proceso actual."""
+        results = {}
+        for job in jobs:
+            try:
+                results[job.name] = _run_job(job.func, job.args)
+            except Exception as e:
+                logger.error(f"❌ {job.name}: {e}")
+                results[job.name] = {'status': 'failed', 'error': str(e)}
+        return results
+
+    def _executor(self, jobs: List[TrainingJob]) -> ProcessPoolExecutor:
+        context = multiprocessing.get_context(self.start_method)
+        if self.start_method == 'forkserver':
+            # Solo tiene efecto si el servidor aún no arrancó (uno por proceso);
+            # los módulos que no se pueden importar se ignoran
+            modules = [job.func.__module__ for job in jobs if job.func.__module__ != '__main__']
+            context.set_forkserver_preload(list(dict.fromkeys(FORKSERVER_PRELOAD + modules)))
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+
+    def run(self, jobs: List[TrainingJob]) -> Dict[str, Dict[str, Any]]:
+        """
+        Entrenar los jobs respetando workers y presupuesto de memoria.
+
+        Args:
+            jobs: Jobs a entrenar
+
+        Returns:
+            dict: nombre → {status, seconds, peak_rss_mb, rss_delta_mb | error}
+        """
+        start = time.perf_counter()
+        pending = sorted(jobs, key=lambda job: job.priority, reverse=True)
+
+        if self.max_workers == 1:
+            results = self._run_inline(pending)
+        else:
+            results = self._run_pool(pending)
+
+        elapsed = time.perf_counter() - start
+        logger.info(f"\n⏱️ Entrenamiento: {elapsed:.1f}s ({self.max_workers} workers, "
+                    f"presupuesto {self.memory_budget_mb:,.0f} MB)")
+        for job in jobs:
+            info = results[job.name]
+            detail = f"{info.get('seconds', 0):>7.1f}s  {info.get('peak_rss_mb', 0):>7.0f} MB " \
+                     f"(+{info.get('rss_delta_mb', 0):,.0f} MB)" \
+                if info['status'] != 'failed' else info.get('error', '')
+            logger.info(f"  {job.name:<18} {info['status']:<7} {detail}")
+        return results
+
+    def _run_pool(self, pending: List[TrainingJob]) -> Dict[str, Dict[str, Any]]:
+        """Loop de admisión: lanzar jobs mientras haya workers y memoria."""
+        results: Dict[str, Dict[str, Any]] = {}
+        running: Dict[Any, TrainingJob] = {}
+        executor = self._executor(pending)
+
+        def fits(job: TrainingJob) -> bool:
+            if len(running) >= self.max_workers:
+                return False
+            used = sum(j.memory_mb for j in running.values())
+            # Un job más grande que el presupuesto corre solo
+            return not running or used + job.memory_mb <= self.memory_budget_mb
+
+        try:
+            while pending or running:
+                for job in list(pending):
+                    if fits(job):
+                        pending.remove(job)
+                        logger.info(f"▶️ {job.name} (≈{job.memory_mb:,.0f} MB)")
+                        running[executor.submit(_run_job, job.func, job.args)] = job
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    job = running.pop(future)
+                    try:
+                        results[job.name] = future.result()
+                    except BrokenProcessPool as e:
+                        broken = True
+                        logger.error(f"❌ {job.name}: worker terminado ({e})")
+                        results[job.name] = {'status': 'failed', 'error': f"worker terminado: {e}"}
+                    except Exception as e:
+                        logger.error(f"❌ {job.name}: {e}")
+                        results[job.name] = {'status': 'failed', 'error': str(e)}
+
+                if broken:
+                    # Un worker murió (ej: OOM): los jobs en curso se pierden, el resto sigue en un pool nuevo
+                    for future, job in running.items():
+                        results[job.name] = {'status': 'failed', 'error': 'pool reiniciado tras caída de un worker'}
+                    running.clear()
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    executor = self._executor(pending)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        return results
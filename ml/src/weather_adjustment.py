@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================
+AJUSTE DE DEMANDA POR CLIMA (VECTORIZADO)
+Sistema ML Agua Tres Torres
+============================================
+Etapa de ajuste climático de /predict/demand-weather con arrays NumPy:
+
+1. forecast_array: un array comuna × día × variable con el forecast
+   (NaN donde falta el dato)
+2. aggregate_weather: promedio (opcionalmente ponderado por el volumen
+   histórico de pedidos de cada comuna) sobre el eje de comunas
+3. adjustment_factors: factores de temperatura y lluvia como operaciones
+   de arrays (np.select), aplicados al forecast base de pedidos e ingresos
+
+El costo por request no crece con loops Python por día y comuna: pedir
+las 30 comunas solo agranda el primer eje del array.
+
+Uso:
+    >>> communes, dates, values = forecast_array(weather_forecasts)
+    >>> weather = aggregate_weather(values, commune_weights(communes, volumes))
+    >>> factors = adjustment_factors(weather)
+    >>> adjusted = np.maximum(yhat, 0) * factors['orders']
+"""
+
+import os
+import sys
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from src.dataset_store import read_dataset
+except ImportError:
+    from dataset_store import read_dataset
+
+WEATHER_FIELDS = ('temp_max_c', 'temp_min_c', 'humidity', 'precip_mm')
+# Valores por defecto de un día sin dato en ninguna comuna
+DEFAULT_WEATHER = {'temp_max_c': 20.0, 'temp_min_c': 10.0, 'humidity': 50.0, 'precip_mm': 0.0}
+
+# Umbrales y factores de ajuste
+HOT_DAY_TEMP_C = 28       # temp máx > 28 → día caluroso
+RAINY_DAY_PRECIP_MM = 5   # precipitación > 5 mm → día lluvioso
+WARM_TEMP_C = 25          # temp promedio > 25 → día cálido
+COLD_TEMP_C = 15          # temp promedio < 15 → día frío
+HOT_FACTOR = 1.15         # +15% en días calurosos
+WARM_FACTOR = 1.08        # +8% en días cálidos
+COLD_FACTOR = 0.95        # -5% en días fríos
+RAIN_FACTOR = 0.90        # -10% en días lluviosos
+
+
+def forecast_array(weather_forecasts: Mapping[str, List[Dict]],
+                   dates: Optional[List[str]] = None) -> Tuple[List[str], List[str], np.ndarray]:
+    """
+    Forecast por comuna → array comuna × día × variable.
+
+    Args:
+        weather_forecasts: comuna → registros diarios (formato parse_daily_data)
+        dates: Fechas (YYYY-MM-DD) del eje de días (default: las de la primera comuna)
+
+    Returns:
+        Tupla (comunas, fechas, array float de forma (comunas, días, len(WEATHER_FIELDS)))
+        con NaN donde falta el dato
+    """
+    communes = list(weather_forecasts)
+    if dates is None:
+        dates = [record['date'] for record in weather_forecasts[communes[0]]] if communes else []
+    day_index = {date: i for i, date in enumerate(dates)}
+
+    values = np.full((len(communes), len(dates), len(WEATHER_FIELDS)), np.nan)
+    for c, commune in enumerate(communes):
+        records = [r for r in weather_forecasts[commune] if r['date'] in day_index]
+        if not records:
+            continue
+        days = [day_index[r['date']] for r in records]
+        values[c, days] = [[np.nan if r.get(f) is None else r[f] for f in WEATHER_FIELDS] for r in records]
+    return communes, dates, values
+
+
+def commune_weights(communes: List[str], volumes: Optional[Mapping[str, float]] = None) -> np.ndarray:
+    """
+    Pesos relativos por comuna (sin normalizar: con pesos iguales el promedio
+    ponderado es exactamente la media simple).
+
+    Args:
+        communes: Comunas del eje 0 del array
+        volumes: comuna → pedidos históricos (None = pesos iguales). Una comuna
+            sin historial recibe peso 0; si ninguna tiene, pesos iguales.
+
+    Returns:
+        np.ndarray de forma (comunas,)
+    """
+    if volumes is None:
+        weights = np.ones(len(communes))
+    else:
+        weights = np.array([float(volumes.get(c, 0)) for c in communes])
+        if weights.sum() <= 0:
+            weights = np.ones(len(communes))
+    return weights
+
+
+def aggregate_weather(values: np.ndarray, weights: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """
+    Reducir el array sobre el eje de comunas (promedio ponderado ignorando NaN).
+
+    Args:
+        values: Array (comunas, días, variables) de forecast_array
+        weights: Pesos por comuna (default: iguales)
+
+    Returns:
+        dict: variable → array por día, más temp_c, is_hot_day e is_rainy_day
+    """
+    if weights is None:
+        weights = np.ones(values.shape[0])
+    present = ~np.isnan(values)
+    w = weights[:, None, None] * present
+    total = w.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (np.where(present, values, 0.0) * w).sum(axis=0) / total
+
+    weather = {}
+    for i, field in enumerate(WEATHER_FIELDS):
+        weather[field] = np.where(total[:, i] > 0, mean[:, i], DEFAULT_WEATHER[field])
+    weather['temp_c'] = (weather['temp_max_c'] + weather['temp_min_c']) / 2
+    weather['is_hot_day'] = weather['temp_max_c'] > HOT_DAY_TEMP_C
+    weather['is_rainy_day'] = weather['precip_mm'] > RAINY_DAY_PRECIP_MM
+    return weather
+
+
+def round_values(values: np.ndarray, digits: int) -> list:
+    """Redondeo decimal de Python (round) por día; np.round difiere en casos como 0.855."""
+    return [round(value, digits) for value in values.tolist()]
+
+
+def align_days(weather: Mapping[str, np.ndarray], n_days: int) -> Dict[str, np.ndarray]:
+    """
+    Ajustar el clima diario al largo del forecast de demanda.
+
+    Los días sin pronóstico climático quedan en NaN/False (factor 1.0).
+
+    Args:
+        weather: Resultado de aggregate_weather
+        n_days: Días del forecast de demanda
+
+    Returns:
+        dict con los mismos arrays de largo n_days, más 'covered' (días con clima)
+    """
+    available = len(weather['temp_max_c'])
+    keep = min(available, n_days)
+    aligned = {}
+    for key, values in weather.items():
+        is_bool = values.dtype == bool
+        padded = np.full(n_days, False if is_bool else np.nan, dtype=bool if is_bool else float)
+        padded[:keep] = values[:keep]
+        aligned[key] = padded
+    aligned['covered'] = np.arange(n_days) < available
+    return aligned
+
+
+def weather_columns(day_weather: Mapping[str, np.ndarray]) -> Dict[str, list]:
+    """
+    Columnas de clima para la respuesta JSON (None en días sin pronóstico).
+
+    Temperaturas y precipitación con 1 decimal, humedad entera.
+    """
+    covered = day_weather['covered']
+
+    def column(values, cast):
+        return [cast(v) if ok else None for v, ok in zip(values, covered.tolist())]
+
+    return {
+        'temp_max_c': column(round_values(day_weather['temp_max_c'], 1), float),
+        'temp_min_c': column(round_values(day_weather['temp_min_c'], 1), float),
+        'humidity': column(day_weather['humidity'].tolist(), int),
+        'precip_mm': column(round_values(day_weather['precip_mm'], 1), float),
+        'is_hot_day': day_weather['is_hot_day'].tolist(),
+        'is_rainy_day': day_weather['is_rainy_day'].tolist(),
+    }
+
+
+def adjustment_factors(weather: Mapping[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Factores de ajuste por día.
+
+    - Pedidos: caluroso ×1.15, cálido ×1.08, frío ×0.95; lluvioso ×0.90
+    - Ingresos: solo caluroso ×1.15 y lluvioso ×0.90
+
+    Args:
+        weather: Resultado de aggregate_weather
+
+    Returns:
+        dict con arrays 'orders' y 'revenue'
+    """
+    temp_c = np.array(round_values(weather['temp_c'], 1))
+    temp_factor = np.select(
+        [weather['is_hot_day'], temp_c > WARM_TEMP_C, temp_c < COLD_TEMP_C],
+        [HOT_FACTOR, WARM_FACTOR, COLD_FACTOR],
+        default=1.0
+    )
+    rain_factor = np.where(weather['is_rainy_day'], RAIN_FACTOR, 1.0)
+    return {
+        'orders': temp_factor * rain_factor,
+        'revenue': np.where(weather['is_hot_day'], HOT_FACTOR, 1.0) * rain_factor,
+    }
+
+
+def commune_order_volumes(data_dir: Optional[str] = None) -> Dict[str, int]:
+    """
+    Pedidos históricos por comuna de despacho (para ponderar el clima).
+
+    Lee solo la columna delivery_commune de dataset_completo.
+
+    Returns:
+        dict: comuna → cantidad de pedidos
+    """
+    df = read_dataset('dataset_completo', columns=['delivery_commune'], data_dir=data_dir)
+    counts = df['delivery_commune'].value_counts()
+    return {str(commune): int(count) for commune, count in counts.items() if count > 0}
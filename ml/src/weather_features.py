@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================
+FEATURES ROLLING DE CLIMA POR COMUNA
+Sistema ML Agua Tres Torres
+============================================
+Ventanas temporales (3, 7 y 14 días) por comuna en una pasada vectorizada:
+
+- groupby('commune').rolling sobre todas las columnas de cada ventana
+  (sin loop Python por comuna ni copias/concat por comuna)
+- temp_diff con groupby().diff()
+- Modo incremental: con el estado final de cada comuna (últimos 14 días)
+  se calculan features solo para las fechas nuevas
+
+Las ventanas son por filas (días con dato) dentro de cada comuna, ordenadas
+por fecha, con min_periods=1.
+
+Uso:
+    >>> df = compute_rolling_features(weather_df)
+    >>> state = rolling_state(df)
+    >>> df_new = append_rolling_features(state, weather_nuevo)
+"""
+
+from typing import Dict, Iterable, Tuple
+
+import pandas as pd
+
+ROLLING_WINDOWS = (3, 7, 14)
+
+# columna cruda → (prefijo, agregación, sufijo) de la feature
+ROLLING_SPECS: Dict[str, Tuple[str, str, str]] = {
+    'temp_max_c': ('temp_max', 'mean', 'avg'),
+    'humidity': ('humidity', 'mean', 'avg'),
+    'precip_mm': ('precip', 'sum', 'sum'),
+}
+
+GROUP_COLUMN = 'commune'
+DATE_COLUMN = 'date'
+
+
+def rolling_feature_names(windows: Iterable[int] = ROLLING_WINDOWS) -> list:
+    """Nombres de las features rolling (más temp_diff)."""
+    names = [f"{prefix}_{window}d_{suffix}"
+             for window in windows
+             for prefix, _, suffix in ROLLING_SPECS.values()]
+    return names + ['temp_diff']
+
+
+def compute_rolling_features(weather_df: pd.DataFrame,
+                             windows: Iterable[int] = ROLLING_WINDOWS) -> pd.DataFrame:
+    """
+    Agregar features rolling por comuna a los datos de clima.
+
+    Args:
+        weather_df: Clima diario con commune, date, temp_max_c, humidity y precip_mm
+        windows: Tamaños de ventana (días con dato)
+
+    Returns:
+        DataFrame ordenado por comuna y fecha con las features agregadas
+    """
+    df = weather_df.sort_values([GROUP_COLUMN, DATE_COLUMN]).reset_index(drop=True)
+    grouped = df.groupby(GROUP_COLUMN, sort=False, observed=True)
+
+    by_agg: Dict[str, list] = {}
+    for column, (_, agg, _) in ROLLING_SPECS.items():
+        by_agg.setdefault(agg, []).append(column)
+
+    features = {}
+    for window in windows:
+        for agg, columns in by_agg.items():
+            # Una llamada por ventana y agregación cubre todas las comunas y columnas
+            rolled = getattr(grouped[columns].rolling(window=window, min_periods=1), agg)()
+            rolled = rolled.reset_index(level=0, drop=True)
+            for column in columns:
+                prefix, _, suffix = ROLLING_SPECS[column]
+                features[f"{prefix}_{window}d_{suffix}"] = rolled[column]
+
+    features['temp_diff'] = grouped['temp_max_c'].diff()
+    ordered = [name for name in rolling_feature_names(windows) if name in features]
+    return df.drop(columns=ordered, errors='ignore').join(pd.DataFrame(features)[ordered])
+
+
+def rolling_state(weather_df: pd.DataFrame,
+                  windows: Iterable[int] = ROLLING_WINDOWS) -> pd.DataFrame:
+    """
+    Estado para el modo incremental: últimos max(windows) días de cada comuna.
+
+    Args:
+        weather_df: Clima (con o sin features) ya procesado
+        windows: Tamaños de ventana
+
+    Returns:
+        DataFrame con las filas finales de cada comuna (solo columnas crudas)
+    """
+    columns = [GROUP_COLUMN, DATE_COLUMN] + list(ROLLING_SPECS)
+    return (weather_df.sort_values([GROUP_COLUMN, DATE_COLUMN])
+            .groupby(GROUP_COLUMN, sort=False, observed=True)
+            .tail(max(windows))[columns]
+            .reset_index(drop=True))
+
+
+def append_rolling_features(state: pd.DataFrame,
+                            new_weather: pd.DataFrame,
+                            windows: Iterable[int] = ROLLING_WINDOWS) -> pd.DataFrame:
+    """
+    Calcular features rolling solo para fechas nuevas.
+
+    Las fechas nuevas deben ser posteriores al estado de su comuna; si una
+    (comuna, fecha) ya está en el estado, gana la fila nueva.
+
+    Args:
+        state: Resultado de rolling_state sobre los datos ya procesados
+        new_weather: Clima de las fechas nuevas
+        windows: Tamaños de ventana
+
+    Returns:
+        DataFrame con solo las filas de new_weather y sus features
+    """
+    if new_weather.empty:
+        return compute_rolling_features(new_weather, windows)
+
+    new_keys = pd.MultiIndex.from_frame(new_weather[[GROUP_COLUMN, DATE_COLUMN]])
+    state_keys = pd.MultiIndex.from_frame(state[[GROUP_COLUMN, DATE_COLUMN]])
+    history = state[~state_keys.isin(new_keys)].assign(_is_new=False)
+
+    combined = pd.concat([history, new_weather.assign(_is_new=True)], ignore_index=True)
+    enriched = compute_rolling_features(combined, windows)
+    return enriched[enriched['_is_new']].drop(columns='_is_new').reset_index(drop=True)
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================
+FORECAST CON MODELOS PROPHET + CLIMA
+Sistema ML Agua Tres Torres
+============================================
+Sirve los modelos entrenados por train_models_weather.py
+(prophet_demand_weather.pkl / prophet_revenue_weather.pkl):
+
+1. regressor_frame: DataFrame futuro (ds + regressors) armado con el
+   clima diario de aggregate_weather (pronóstico Open-Meteo en cache)
+2. RegressorForecastCache.predict_many: demanda y revenue sobre el mismo
+   frame, sin muestreo de incertidumbre, con cache LRU por contenido del
+   frame (el pronóstico en cache cambia solo con el prefetch)
+
+Si falta un modelo o un regressor, el endpoint vuelve al método de
+factores (src/weather_adjustment.py).
+
+Uso:
+    >>> frame = regressor_frame(dates, weather, days=14)
+    >>> yhat = cache.predict_many({'demand': model_d, 'revenue': model_r}, frame)
+"""
+
+import os
+import sys
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from src.prophet_forecast import predict_future
+except ImportError:
+    from prophet_forecast import predict_future
+
+logger = logging.getLogger(__name__)
+
+# Máximo de forecasts guardados (desalojo LRU)
+DEFAULT_MAX_ENTRIES = int(os.getenv("WEATHER_MODEL_CACHE_MAX_ENTRIES", "256"))
+
+
+def regressor_frame(dates: List[str], weather: Mapping[str, np.ndarray], days: int) -> pd.DataFrame:
+    """
+    DataFrame futuro para Prophet con los regressors climáticos.
+
+    Mismas columnas que prepare_prophet_data de train_models_weather.py
+    (flags como 0/1).
+
+    Args:
+        dates: Fechas (YYYY-MM-DD) del eje de días de aggregate_weather
+        weather: Resultado de aggregate_weather
+        days: Días a predecir
+
+    Returns:
+        DataFrame con ds y una columna por regressor
+
+    Raises:
+        ValueError: Si el pronóstico climático no cubre los días pedidos
+    """
+    if len(dates) < days:
+        raise ValueError(f"El pronóstico climático cubre {len(dates)} días (se piden {days})")
+    return pd.DataFrame({
+        'ds': pd.to_datetime(dates[:days]),
+        'temp_max_c': weather['temp_max_c'][:days],
+        'temp_min_c': weather['temp_min_c'][:days],
+        'temp_avg_c': weather['temp_c'][:days],
+        'humidity': weather['humidity'][:days],
+        'precip_mm': weather['precip_mm'][:days],
+        'is_hot_day': weather['is_hot_day'][:days].astype(int),
+        'is_rainy_day': weather['is_rainy_day'][:days].astype(int),
+    })
+
+
+def model_regressors(model: Any) -> List[str]:
+    """Regressors externos con los que se entrenó el modelo."""
+    return list(getattr(model, 'extra_regressors', {}))
+
+
+class RegressorForecastCache:
+    """
+    Cache LRU de forecasts de modelos con regressors.
+
+    La clave es (nombre, identidad del modelo, contenido del frame): un
+    modelo recargado o un pronóstico climático nuevo generan otra entrada.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        Inicializar cache.
+
+        Args:
+            max_entries: Máximo de forecasts guardados
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def frame_key(frame: pd.DataFrame) -> tuple:
+        """Clave por contenido del frame (fechas y valores como bytes)."""
+        values = frame.drop(columns='ds').to_numpy(dtype=float)
+        return (tuple(frame.columns), frame['ds'].to_numpy().tobytes(), values.tobytes())
+
+    def predict(self, name: str, model: Any, frame: pd.DataFrame, frame_key: Optional[tuple] = None) -> np.ndarray:
+        """
+        yhat del modelo para las fechas del frame (desde cache si existe).
+
+        Args:
+            name: Nombre del modelo (ej: 'demand')
+            model: Modelo Prophet con regressors
+            frame: Resultado de regressor_frame
+            frame_key: frame_key(frame) ya calculada (predict_many la comparte)
+
+        Returns:
+            np.ndarray con yhat por día
+
+        Raises:
+            ValueError: Si el frame no trae un regressor del modelo o tiene NaN
+        """
+        key = (name, id(model), frame_key or self.frame_key(frame))
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached
+
+        regressors = model_regressors(model)
+        missing = [r for r in regressors if r not in frame.columns]
+        if missing:
+            raise ValueError(f"Regressors faltantes para '{name}': {missing}")
+        future = frame[['ds'] + regressors]
+        if future[regressors].isna().to_numpy().any():
+            raise ValueError(f"Regressors con NaN para '{name}'")
+
+        # Sin intervalos: la respuesta solo usa yhat y el muestreo domina el costo
+        yhat = predict_future(model, len(future), uncertainty_samples=0, future=future)['yhat'].to_numpy()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = yhat
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return yhat
+
+    def predict_many(self, models: Dict[str, Any], frame: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """
+        Predecir varios modelos sobre el mismo frame de regressors.
+
+        Args:
+            models: nombre → modelo Prophet con regressors
+            frame: Resultado de regressor_frame
+
+        Returns:
+            dict: nombre → yhat por día
+        """
+        key = self.frame_key(frame)
+        return {name: self.predict(name, model, frame, key) for name, model in models.items()}
+
+    def clear(self):
+        """Vaciar el cache (ej: tras recargar modelos)."""
+        with self._lock:
+            self._entries.clear()
+
+    def status(self) -> Dict[str, Any]:
+        """Estado del cache para health checks."""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
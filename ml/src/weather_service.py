@@ -12,15 +12,27 @@ Open-Meteo API:
 - Histórico: https://archive-api.open-meteo.com/v1/archive
 - Forecast: https://api.open-meteo.com/v1/forecast
 - Documentación: https://open-meteo.com/en/docs
+
+WeatherForecastCache: cache local de forecasts (comuna, fecha) con TTL,
+desalojo LRU y persistencia opcional en SQLite, compartido por los
+endpoints de la API. Un prefetcher en segundo plano lo mantiene al día
+para que los requests no esperen a Open-Meteo.
 """
 
 import os
 import sys
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
 import requests
 import logging
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple
+from zoneinfo import ZoneInfo
+from typing import Any, Iterator, List, Dict, Optional, Tuple
 import pandas as pd
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
 
 # Agregar path al módulo
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -37,6 +49,76 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Reintentos ante errores transitorios de Open-Meteo
+RETRY_ATTEMPTS = int(os.getenv("OPEN_METEO_RETRY_ATTEMPTS", "4"))
+
+# Cache de forecasts (los pronósticos cambian pocas veces al día)
+WEATHER_TIMEZONE = ZoneInfo("America/Santiago")
+DEFAULT_CACHE_TTL_SECONDS = int(os.getenv("WEATHER_CACHE_TTL_SECONDS", str(3 * 3600)))
+DEFAULT_CACHE_MAX_ENTRIES = int(os.getenv("WEATHER_CACHE_MAX_ENTRIES", "2000"))
+DEFAULT_CACHE_DB = os.getenv("WEATHER_CACHE_DB") or None
+# Refresco en segundo plano (menor que el TTL para que nunca venza; 0 = desactivado)
+DEFAULT_PREFETCH_INTERVAL = int(os.getenv("WEATHER_PREFETCH_INTERVAL_SECONDS", str(2 * 3600)))
+FORECAST_MAX_DAYS = 16
+
+# Lecturas de 3t_weather_data: columnas por defecto y tipos de cada columna
+WEATHER_COLUMNS = ['date', 'commune', 'temp_c', 'temp_max_c', 'temp_min_c',
+                   'humidity', 'precip_mm', 'is_hot_day', 'is_rainy_day']
+WEATHER_DTYPES = {
+    'temp_c': 'float32',
+    'temp_max_c': 'float32',
+    'temp_min_c': 'float32',
+    'humidity': 'Int16',
+    'precip_mm': 'float32',
+    'is_hot_day': 'boolean',
+    'is_rainy_day': 'boolean',
+}
+# Filas por página (PostgREST de Supabase corta en 1000 por defecto)
+DEFAULT_PAGE_SIZE = int(os.getenv("WEATHER_DB_PAGE_SIZE", "1000"))
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    """Errores transitorios: conexión, timeout, 429 y 5xx."""
+    if isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    if isinstance(exc, requests.exceptions.HTTPError) and exc.response is not None:
+        return exc.response.status_code == 429 or exc.response.status_code >= 500
+    return False
+
+
+class TokenBucket:
+    """
+    Rate limiter token bucket thread-safe.
+    
+    Permite ráfagas de hasta `capacity` llamadas y un promedio de
+    `rate` llamadas por segundo.
+    """
+    
+    def __init__(self, rate: float, capacity: Optional[int] = None):
+        """
+        Args:
+            rate: Tokens (llamadas) por segundo
+            capacity: Tamaño máximo de ráfaga (default: max(1, rate))
+        """
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Bloquear hasta obtener un token."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
 
 class OpenMeteoClient:
     """
@@ -50,15 +132,54 @@ class OpenMeteoClient:
     
     BASE_URL_FORECAST = "https://api.open-meteo.com/v1/forecast"
     BASE_URL_ARCHIVE = "https://archive-api.open-meteo.com/v1/archive"
+    DAILY_VARIABLES = "temperature_2m_max,temperature_2m_min,precipitation_sum,relative_humidity_2m_mean"
+    
+    # Ubicaciones por llamada multi-location (lat/lon separados por coma)
+    MAX_LOCATIONS_PER_CALL = 50
     
-    def __init__(self):
-        """Inicializar cliente Open-Meteo (no requiere API key)."""
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Agua3T-ML-System/1.0'
-        })
+    def __init__(self, rate_limiter: Optional[TokenBucket] = None):
+        """
+        Inicializar cliente Open-Meteo (no requiere API key).
+        
+        Args:
+            rate_limiter: Token bucket compartido (opcional) para limitar
+                llamadas por segundo cuando se usa desde varios threads
+        """
+        self.rate_limiter = rate_limiter
+        self._local = threading.local()
         logger.info("OpenMeteoClient inicializado (sin API key requerida)")
     
+    @property
+    def session(self) -> requests.Session:
+        """Sesión HTTP por thread (requests.Session no es thread-safe)."""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update({
+                'User-Agent': 'Agua3T-ML-System/1.0'
+            })
+            self._local.session = session
+        return session
+    
+    @retry(
+        retry=retry_if_exception(_is_retryable),
+        stop=stop_after_attempt(RETRY_ATTEMPTS),
+        wait=wait_exponential(multiplier=0.5, max=10),
+        reraise=True
+    )
+    def _get(self, url: str, params: Dict) -> Any:
+        """
+        GET con rate limiting y reintentos con backoff exponencial.
+        
+        Returns:
+            dict (una ubicación) o list de dicts (varias ubicaciones)
+        """
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+        response = self.session.get(url, params=params, timeout=30)
+        response.raise_for_status()
+        return response.json()
+    
     def get_historical(self, lat: float, lon: float, start_date: str, end_date: str) -> Dict:
         """
         Obtener datos históricos de clima.
@@ -82,15 +203,13 @@ class OpenMeteoClient:
             "longitude": lon,
             "start_date": start_date,
             "end_date": end_date,
-            "daily": "temperature_2m_max,temperature_2m_min,precipitation_sum,relative_humidity_2m_mean",
+            "daily": self.DAILY_VARIABLES,
             "timezone": "America/Santiago"
         }
         
         try:
             logger.info(f"Obteniendo histórico para lat={lat}, lon={lon}, rango={start_date} a {end_date}")
-            response = self.session.get(self.BASE_URL_ARCHIVE, params=params, timeout=30)
-            response.raise_for_status()
-            data = response.json()
+            data = self._get(self.BASE_URL_ARCHIVE, params)
             logger.info(f"✓ Histórico obtenido: {len(data.get('daily', {}).get('time', []))} días")
             return data
         except requests.exceptions.RequestException as e:
@@ -116,16 +235,14 @@ class OpenMeteoClient:
         params = {
             "latitude": lat,
             "longitude": lon,
-            "daily": "temperature_2m_max,temperature_2m_min,precipitation_sum,relative_humidity_2m_mean",
+            "daily": self.DAILY_VARIABLES,
             "forecast_days": days,
             "timezone": "America/Santiago"
         }
         
         try:
             logger.info(f"Obteniendo forecast para lat={lat}, lon={lon}, {days} días")
-            response = self.session.get(self.BASE_URL_FORECAST, params=params, timeout=30)
-            response.raise_for_status()
-            data = response.json()
+            data = self._get(self.BASE_URL_FORECAST, params)
             logger.info(f"✓ Forecast obtenido: {len(data.get('daily', {}).get('time', []))} días")
             return data
         except requests.exceptions.RequestException as e:
@@ -170,6 +287,104 @@ class OpenMeteoClient:
         coords = get_commune_coords(commune)
         return self.get_forecast(coords['lat'], coords['lon'], days)
     
+    def _get_many(self, url: str, communes: List[str], params: Dict) -> Dict[str, Dict]:
+        """
+        Consultar varias comunas con llamadas multi-location.
+        
+        Open-Meteo acepta latitude/longitude separados por coma y devuelve
+        una lista de respuestas en el mismo orden.
+        
+        Args:
+            url: Endpoint de Open-Meteo
+            communes: Comunas a consultar
+            params: Parámetros comunes (sin latitude/longitude)
+        
+        Returns:
+            dict: comuna → respuesta JSON de esa comuna
+        
+        Raises:
+            ValueError: Si alguna comuna no es válida
+        """
+        communes = list(dict.fromkeys(communes))
+        invalid = [c for c in communes if not is_valid_commune(c)]
+        if invalid:
+            raise ValueError(f"Comunas inválidas: {invalid}. Deben estar en VALID_COMMUNES")
+        
+        results = {}
+        for i in range(0, len(communes), self.MAX_LOCATIONS_PER_CALL):
+            batch = communes[i:i + self.MAX_LOCATIONS_PER_CALL]
+            coords = [get_commune_coords(c) for c in batch]
+            data = self._get(url, {
+                **params,
+                "latitude": ",".join(str(c['lat']) for c in coords),
+                "longitude": ",".join(str(c['lon']) for c in coords),
+            })
+            # Con una sola ubicación Open-Meteo devuelve un objeto, no una lista
+            if isinstance(data, dict):
+                data = [data]
+            if len(data) != len(batch):
+                raise ValueError(f"Open-Meteo devolvió {len(data)} ubicaciones, se esperaban {len(batch)}")
+            results.update(zip(batch, data))
+        return results
+    
+    def get_forecast_many(self, communes: List[str], days: int = 16) -> Dict[str, Dict]:
+        """
+        Obtener forecast de varias comunas en una sola llamada HTTP.
+        
+        Args:
+            communes: Lista de comunas
+            days: Días de pronóstico (máx 16)
+        
+        Returns:
+            dict: comuna → pronóstico climático (mismo formato que get_forecast)
+        
+        Ejemplo:
+            >>> forecasts = client.get_forecast_many(["Santiago", "Renca"], days=7)
+            >>> records = client.parse_daily_data(forecasts["Renca"], "Renca")
+        """
+        if days > 16:
+            logger.warning(f"Open-Meteo máximo 16 días de forecast. Ajustando de {days} a 16")
+            days = 16
+        
+        params = {
+            "daily": self.DAILY_VARIABLES,
+            "forecast_days": days,
+            "timezone": "America/Santiago"
+        }
+        
+        try:
+            logger.info(f"Obteniendo forecast para {len(communes)} comunas, {days} días")
+            return self._get_many(self.BASE_URL_FORECAST, communes, params)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error obteniendo forecast: {e}")
+            raise
+    
+    def get_historical_many(self, communes: List[str], start_date: str, end_date: str) -> Dict[str, Dict]:
+        """
+        Obtener histórico de varias comunas en una sola llamada HTTP.
+        
+        Args:
+            communes: Lista de comunas
+            start_date: Fecha inicio (YYYY-MM-DD)
+            end_date: Fecha fin (YYYY-MM-DD)
+        
+        Returns:
+            dict: comuna → datos climáticos históricos
+        """
+        params = {
+            "start_date": start_date,
+            "end_date": end_date,
+            "daily": self.DAILY_VARIABLES,
+            "timezone": "America/Santiago"
+        }
+        
+        try:
+            logger.info(f"Obteniendo histórico para {len(communes)} comunas, rango={start_date} a {end_date}")
+            return self._get_many(self.BASE_URL_ARCHIVE, communes, params)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error obteniendo histórico: {e}")
+            raise
+    
     def parse_daily_data(self, api_response: Dict, commune: str) -> List[Dict]:
         """
         Parsear respuesta de Open-Meteo a formato estándar.
@@ -206,6 +421,325 @@ class OpenMeteoClient:
         return records
 
 
+class WeatherForecastCache:
+    """
+    Cache local de forecasts de Open-Meteo por (comuna, fecha).
+    
+    - TTL configurable: una entrada vencida se vuelve a pedir a Open-Meteo
+    - Desalojo LRU al superar `max_entries`
+    - Persistencia opcional en SQLite (sobrevive reinicios de la API)
+    - Las comunas faltantes se piden juntas en una sola llamada
+      multi-location, siempre con el horizonte completo (16 días)
+    - Si Open-Meteo falla, se sirven entradas vencidas si existen
+    """
+    
+    def __init__(self, client: OpenMeteoClient,
+                 ttl_seconds: int = DEFAULT_CACHE_TTL_SECONDS,
+                 max_entries: int = DEFAULT_CACHE_MAX_ENTRIES,
+                 db_path: Optional[str] = DEFAULT_CACHE_DB):
+        """
+        Inicializar cache.
+        
+        Args:
+            client: Cliente Open-Meteo
+            ttl_seconds: Segundos de validez de cada entrada
+            max_entries: Máximo de entradas (comuna, fecha) en memoria
+            db_path: Archivo SQLite para persistir el cache (None = solo memoria)
+        """
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Dict, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.stats = {'hits': 0, 'misses': 0, 'api_calls': 0, 'stale_served': 0}
+        self.last_fetch_at: Optional[float] = None
+        self._prefetcher: Optional[threading.Thread] = None
+        self._prefetcher_stop = threading.Event()
+        self.prefetch_interval: Optional[int] = None
+        self.last_prefetch: Optional[Dict] = None
+        
+        if db_path:
+            self._open_db(db_path)
+    
+    def _open_db(self, db_path: str):
+        """Abrir (o crear) el SQLite y cargar las entradas vigentes."""
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS weather_forecast_cache (
+                    commune TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    record TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (commune, date)
+                )
+            """)
+            self._db.execute(
+                "DELETE FROM weather_forecast_cache WHERE fetched_at < ?",
+                (time.time() - self.ttl_seconds,)
+            )
+            self._db.commit()
+            
+            rows = self._db.execute(
+                "SELECT commune, date, record, fetched_at FROM weather_forecast_cache ORDER BY fetched_at"
+            ).fetchall()
+            for commune, date, record, fetched_at in rows:
+                self._entries[(commune, date)] = (json.loads(record), fetched_at)
+            self._evict()
+            logger.info(f"✓ Cache de clima: {len(rows)} entradas cargadas desde {db_path}")
+        except sqlite3.Error as e:
+            logger.error(f"Error abriendo cache de clima {db_path}: {e}. Se usará solo memoria")
+            self._db = None
+    
+    def _evict(self):
+        """Desalojar las entradas menos usadas (LRU) sobre el máximo."""
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def _store(self, forecasts: Dict[str, List[Dict]]):
+        """Guardar forecasts parseados en memoria y en SQLite."""
+        fetched_at = time.time()
+        with self._lock:
+            for commune, records in forecasts.items():
+                for record in records:
+                    key = (commune, record['date'])
+                    self._entries[key] = (record, fetched_at)
+                    self._entries.move_to_end(key)
+            self._evict()
+            self.last_fetch_at = fetched_at
+            
+            if self._db is not None:
+                try:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO weather_forecast_cache VALUES (?, ?, ?, ?)",
+                        [(commune, r['date'], json.dumps(r), fetched_at)
+                         for commune, records in forecasts.items() for r in records]
+                    )
+                    self._db.execute(
+                        "DELETE FROM weather_forecast_cache WHERE fetched_at < ?",
+                        (fetched_at - self.ttl_seconds,)
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.error(f"Error persistiendo cache de clima: {e}")
+    
+    def _lookup(self, commune: str, dates: List[str], allow_stale: bool = False) -> Optional[List[Dict]]:
+        """Registros de una comuna para todas las fechas (None si falta o venció alguna)."""
+        now = time.time()
+        records = []
+        with self._lock:
+            for date in dates:
+                entry = self._entries.get((commune, date))
+                if entry is None:
+                    return None
+                record, fetched_at = entry
+                if not allow_stale and now - fetched_at >= self.ttl_seconds:
+                    return None
+                self._entries.move_to_end((commune, date))
+                records.append(record)
+        return records
+    
+    def get_forecast(self, communes: List[str], days: int = 7) -> Dict[str, List[Dict]]:
+        """
+        Forecast diario por comuna (desde hoy), servido desde cache.
+        
+        Args:
+            communes: Comunas a consultar
+            days: Días de pronóstico (máx 16)
+        
+        Returns:
+            dict: comuna → lista de registros (formato parse_daily_data)
+        
+        Raises:
+            requests.exceptions.RequestException: Si Open-Meteo falla y no hay
+                datos (ni vencidos) en cache para alguna comuna
+        """
+        days = min(days, FORECAST_MAX_DAYS)
+        today = datetime.now(WEATHER_TIMEZONE).date()
+        dates = [(today + timedelta(days=i)).isoformat() for i in range(days)]
+        communes = list(dict.fromkeys(communes))
+        
+        result = {}
+        for commune in communes:
+            records = self._lookup(commune, dates)
+            if records is not None:
+                result[commune] = records
+        
+        missing = [c for c in communes if c not in result]
+        self.stats['hits'] += len(result)
+        if not missing:
+            return result
+        self.stats['misses'] += len(missing)
+        
+        # Un solo fetch concurrente: el resto espera y reutiliza el resultado
+        with self._fetch_lock:
+            still_missing = []
+            for commune in missing:
+                records = self._lookup(commune, dates)
+                if records is not None:
+                    result[commune] = records
+                else:
+                    still_missing.append(commune)
+            
+            if still_missing:
+                try:
+                    self.stats['api_calls'] += 1
+                    data = self.client.get_forecast_many(still_missing, FORECAST_MAX_DAYS)
+                    forecasts = {
+                        commune: self.client.parse_daily_data(commune_data, commune)
+                        for commune, commune_data in data.items()
+                    }
+                    self._store(forecasts)
+                    for commune, records in forecasts.items():
+                        by_date = {r['date']: r for r in records}
+                        result[commune] = [by_date[d] for d in dates if d in by_date]
+                except Exception as e:
+                    stale = {c: self._lookup(c, dates, allow_stale=True) for c in still_missing}
+                    if any(records is None for records in stale.values()):
+                        raise
+                    logger.warning(f"Open-Meteo no disponible ({e}); sirviendo forecast vencido de cache")
+                    self.stats['stale_served'] += len(stale)
+                    result.update(stale)
+        
+        return {commune: result[commune] for commune in communes if commune in result}
+    
+    def fetched_at(self, communes: List[str]) -> Optional[str]:
+        """
+        Hora de descarga del pronóstico de hoy más antiguo entre las comunas.
+        
+        Args:
+            communes: Comunas consultadas
+        
+        Returns:
+            str ISO o None si alguna comuna no está en cache
+        """
+        today = datetime.now(WEATHER_TIMEZONE).date().isoformat()
+        with self._lock:
+            entries = [self._entries.get((commune, today)) for commune in communes]
+        if not entries or any(entry is None for entry in entries):
+            return None
+        return datetime.fromtimestamp(min(entry[1] for entry in entries)).isoformat()
+    
+    def refresh(self, communes: List[str]) -> Dict[str, int]:
+        """
+        Descargar el pronóstico completo (16 días) de las comunas, sin mirar el TTL.
+        
+        Args:
+            communes: Comunas a refrescar
+        
+        Returns:
+            dict: comuna → días guardados
+        """
+        with self._fetch_lock:
+            self.stats['api_calls'] += 1
+            data = self.client.get_forecast_many(communes, FORECAST_MAX_DAYS)
+            forecasts = {
+                commune: self.client.parse_daily_data(commune_data, commune)
+                for commune, commune_data in data.items()
+            }
+            self._store(forecasts)
+        return {commune: len(records) for commune, records in forecasts.items()}
+    
+    def _prefetch_loop(self, communes: List[str], interval: int):
+        """Loop del prefetcher: refresca al iniciar y luego cada `interval` segundos."""
+        while True:
+            started = time.perf_counter()
+            try:
+                refreshed = self.refresh(communes)
+                self.last_prefetch = {
+                    'at': datetime.now().isoformat(),
+                    'communes': len(refreshed),
+                    'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+                }
+                logger.info(f"🌤️ Prefetch de clima: {len(refreshed)} comunas actualizadas")
+            except Exception as e:
+                self.last_prefetch = {'at': datetime.now().isoformat(), 'error': str(e)}
+                logger.error(f"Error en prefetch de clima: {e}")
+            if self._prefetcher_stop.wait(interval):
+                break
+    
+    def start_prefetcher(self, communes: List[str], interval: int = DEFAULT_PREFETCH_INTERVAL) -> bool:
+        """
+        Iniciar refresco periódico del pronóstico en un thread daemon.
+        
+        Args:
+            communes: Comunas a mantener en cache (ej: VALID_COMMUNES)
+            interval: Segundos entre refrescos (0 = no iniciar)
+        
+        Returns:
+            bool: True si el prefetcher quedó corriendo
+        """
+        if interval <= 0 or self.prefetching:
+            return self.prefetching
+        
+        self.prefetch_interval = interval
+        self._prefetcher_stop.clear()
+        self._prefetcher = threading.Thread(
+            target=self._prefetch_loop,
+            args=(list(communes), interval),
+            name="weather-prefetch",
+            daemon=True
+        )
+        self._prefetcher.start()
+        return True
+    
+    def stop_prefetcher(self):
+        """Detener prefetcher."""
+        self._prefetcher_stop.set()
+    
+    @property
+    def prefetching(self) -> bool:
+        """True si el prefetcher está corriendo."""
+        return bool(self._prefetcher and self._prefetcher.is_alive())
+    
+    def invalidate(self, commune: Optional[str] = None):
+        """
+        Invalidar entradas de una comuna (o todas si commune es None).
+        
+        Args:
+            commune: Comuna a invalidar
+        """
+        with self._lock:
+            if commune is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == commune]:
+                    del self._entries[key]
+            if self._db is not None:
+                if commune is None:
+                    self._db.execute("DELETE FROM weather_forecast_cache")
+                else:
+                    self._db.execute("DELETE FROM weather_forecast_cache WHERE commune = ?", (commune,))
+                self._db.commit()
+    
+    def status(self) -> Dict:
+        """
+        Estado del cache para health checks.
+        
+        Returns:
+            dict con tamaño, TTL, persistencia y contadores
+        """
+        with self._lock:
+            size = len(self._entries)
+            communes = len({commune for commune, _ in self._entries})
+        return {
+            'entries': size,
+            'communes': communes,
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'persistent': self._db is not None,
+            'last_fetch_at': datetime.fromtimestamp(self.last_fetch_at).isoformat() if self.last_fetch_at else None,
+            'prefetcher': self.prefetching,
+            'prefetch_interval_seconds': self.prefetch_interval,
+            'last_prefetch': self.last_prefetch,
+            **self.stats,
+        }
+
+
 class WeatherDBService:
     """
     Servicio para guardar y consultar datos climáticos en Supabase.
@@ -254,6 +788,64 @@ class WeatherDBService:
             logger.error(f"Error guardando datos: {e}")
             return {"success": False, "error": str(e)}
     
+    @staticmethod
+    def _to_frame(rows: List[Dict], columns: List[str]) -> pd.DataFrame:
+        """Convertir una página de filas a DataFrame con tipos fijos."""
+        df = pd.DataFrame(rows, columns=columns)
+        if 'date' in df.columns:
+            df['date'] = pd.to_datetime(df['date'])
+        for column, dtype in WEATHER_DTYPES.items():
+            if column in df.columns:
+                df[column] = pd.to_numeric(df[column]).astype(dtype) if dtype != 'boolean' else df[column].astype(dtype)
+        return df
+    
+    def iter_weather_range(self, start_date: str, end_date: str,
+                           communes: Optional[List[str]] = None,
+                           columns: Optional[List[str]] = None,
+                           page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[pd.DataFrame]:
+        """
+        Leer un rango de fechas por páginas (keyset sobre date, commune).
+        
+        Cada página se pide después de la última fila recibida, así una
+        lectura grande no queda truncada por el límite de filas de PostgREST
+        y nunca se materializa la tabla completa como lista de dicts.
+        
+        Args:
+            start_date: Fecha inicio (YYYY-MM-DD)
+            end_date: Fecha fin (YYYY-MM-DD)
+            communes: Comunas a leer (None = todas)
+            columns: Columnas a traer (default: WEATHER_COLUMNS; date y commune siempre se incluyen)
+            page_size: Filas por página
+        
+        Yields:
+            DataFrame tipado por página (date datetime64, temperaturas float32, ...)
+        """
+        columns = list(columns or WEATHER_COLUMNS)
+        columns = ['date', 'commune'] + [c for c in columns if c not in ('date', 'commune')]
+        last = None
+        
+        while True:
+            query = self.supabase.table(self.table_name)\
+                .select(",".join(columns))\
+                .gte("date", start_date)\
+                .lte("date", end_date)
+            
+            if communes:
+                query = query.in_("commune", communes)
+            
+            if last is not None:
+                # Keyset: (date, commune) > (última fecha, última comuna)
+                query = query.or_(
+                    f'date.gt.{last["date"]},and(date.eq.{last["date"]},commune.gt."{last["commune"]}")'
+                )
+            
+            rows = query.order("date").order("commune").limit(page_size).execute().data
+            if not rows:
+                break
+            
+            yield self._to_frame(rows, columns)
+            last = rows[-1]
+    
     def get_weather_by_date(self, date: str, commune: Optional[str] = None) -> List[Dict]:
         """
         Obtener datos climáticos por fecha.
@@ -279,31 +871,27 @@ class WeatherDBService:
             return []
     
     def get_weather_range(self, start_date: str, end_date: str, 
-                         commune: Optional[str] = None) -> pd.DataFrame:
+                         commune: Optional[str] = None,
+                         columns: Optional[List[str]] = None) -> pd.DataFrame:
         """
-        Obtener datos climáticos en un rango de fechas.
+        Obtener datos climáticos en un rango de fechas (lectura paginada).
         
         Args:
             start_date: Fecha inicio
             end_date: Fecha fin
             commune: Comuna (opcional)
+            columns: Columnas a traer (default: WEATHER_COLUMNS)
         
         Returns:
-            DataFrame: Datos climáticos
+            DataFrame: Datos climáticos tipados, ordenados por fecha y comuna
         """
         try:
-            query = self.supabase.table(self.table_name)\
-                .select("*")\
-                .gte("date", start_date)\
-                .lte("date", end_date)
-            
-            if commune:
-                query = query.eq("commune", commune)
-            
-            query = query.order("date", desc=False)
-            
-            response = query.execute()
-            df = pd.DataFrame(response.data)
+            chunks = list(self.iter_weather_range(
+                start_date, end_date,
+                communes=[commune] if commune else None,
+                columns=columns
+            ))
+            df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
             
             logger.info(f"✓ Obtenidos {len(df)} registros de {start_date} a {end_date}")
             return df
@@ -326,8 +914,15 @@ class WeatherDBService:
             list: Lista de tuplas (fecha, comuna) faltantes
         """
         try:
-            # Obtener todos los datos existentes
-            df = self.get_weather_range(start_date, end_date)
+            missing = self._missing_dates_rpc(start_date, end_date, communes)
+            if missing is not None:
+                logger.info(f"Detectadas {len(missing)} combinaciones fecha/comuna faltantes (servidor)")
+                return missing
+            
+            # Fallback: leer solo (date, commune) existentes y comparar en Python
+            chunks = list(self.iter_weather_range(start_date, end_date, communes=communes,
+                                                  columns=['date', 'commune']))
+            df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
             
             if df.empty:
                 logger.warning("No hay datos en el rango especificado")
@@ -338,7 +933,7 @@ class WeatherDBService:
                 return missing
             
             # Crear set de combinaciones existentes
-            existing = set(zip(df['date'].astype(str), df['commune']))
+            existing = set(zip(df['date'].dt.strftime('%Y-%m-%d'), df['commune']))
             
             # Crear set de combinaciones esperadas
             date_range = pd.date_range(start=start_date, end=end_date, freq='D')
@@ -358,6 +953,36 @@ class WeatherDBService:
         except Exception as e:
             logger.error(f"Error detectando fechas faltantes: {e}")
             return []
+    
+    def _missing_dates_rpc(self, start_date: str, end_date: str, communes: List[str],
+                           page_size: int = DEFAULT_PAGE_SIZE) -> Optional[List[Tuple[str, str]]]:
+        """
+        Calcular faltantes en Postgres con la función weather_missing_dates
+        (migración 007), paginando por keyset.
+        
+        Returns:
+            list de (fecha, comuna) o None si la función no está disponible
+        """
+        missing = []
+        after_date, after_commune = None, None
+        try:
+            while True:
+                rows = self.supabase.rpc("weather_missing_dates", {
+                    "p_start_date": start_date,
+                    "p_end_date": end_date,
+                    "p_communes": communes,
+                    "p_after_date": after_date,
+                    "p_after_commune": after_commune,
+                    "p_limit": page_size,
+                }).execute().data
+                if not rows:
+                    break
+                missing.extend((row['date'], row['commune']) for row in rows)
+                after_date, after_commune = rows[-1]['date'], rows[-1]['commune']
+        except Exception as e:
+            logger.warning(f"Función weather_missing_dates no disponible ({e}); calculando faltantes en Python")
+            return None
+        return missing
 
 
 # Test básico